@@ -0,0 +1,48 @@
+# app/middleware.py
+from core.models import Company, CompanyUser
+
+
+class ActiveCompanyMiddleware:
+    """
+    Resolve uma única vez por requisição a empresa ativa do usuário e o seu
+    papel nela, expondo-os como `request.company` e `request.company_role`
+    para views, formulários e mixins.
+
+    O vínculo ativo fica guardado na sessão junto com `User.company_version`;
+    como o usuário já é carregado pela AuthenticationMiddleware, comparar a
+    versão não custa consultas, e qualquer alteração em CompanyUser (que
+    incrementa a versão) força uma nova resolução.
+    """
+    session_key = 'active_company'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.company, request.company_role = self.resolve(request)
+        return self.get_response(request)
+
+    def resolve(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return None, None
+
+        cached = request.session.get(self.session_key)
+        if not cached or cached.get('version') != user.company_version:
+            link = (
+                CompanyUser.objects.filter(user=user, active=True)
+                .order_by('pk')
+                .values('company_id', 'role')
+                .first()
+            )
+            cached = {
+                'company_id': link['company_id'] if link else None,
+                'role': link['role'] if link else None,
+                'version': user.company_version,
+            }
+            request.session[self.session_key] = cached
+
+        if cached['company_id'] is None:
+            return None, None
+        company = Company.objects.filter(pk=cached['company_id']).first()
+        return company, cached['role'] if company else None
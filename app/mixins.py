@@ -1,8 +1,17 @@
+import base64
+import json
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Q
+from django.http import Http404
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.contrib import messages
 
+from core import cache as company_cache
+
 class CompanyFilteredMixin:
     """
     Mixin para filtrar o queryset de uma view para mostrar apenas
@@ -12,12 +21,12 @@ class CompanyFilteredMixin:
         # Acede ao queryset base do modelo
         queryset = super().get_queryset()
         
-        # Obtém a empresa do usuário logado usando a relação de muitos para muitos
-        company_user = self.request.user.company_links.filter(active=True).first()
+        # Empresa ativa resolvida uma vez por requisição pelo ActiveCompanyMiddleware
+        company = self.request.company
         
         # Filtra o queryset com base na empresa se existir
-        if company_user:
-            return queryset.filter(company=company_user.company)
+        if company:
+            return queryset.filter(company=company)
             
         # Se o usuário não tiver uma empresa ativa, retorna um queryset vazio
         return self.model.objects.none()
@@ -29,10 +38,145 @@ class CompanyAssignMixin:
     ao objeto antes de salvar no CreateView.
     """
     def form_valid(self, form):
-        company_user = self.request.user.company_links.filter(active=True).first()
-        if company_user:
-            form.instance.company = company_user.company
+        if self.request.company:
+            form.instance.company = self.request.company
         else:
             messages.error(self.request, "Nenhuma empresa ativa associada a este usuário.")
             return redirect('home')
         return super().form_valid(form)
+
+
+class KeysetPage:
+    """
+    Página obtida por cursor. Expõe a mesma interface da Page do Django usada
+    pelos templates (has_next, has_previous, iteração) mais as querystrings
+    dos links e o total aproximado, quando calculado.
+    """
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_querystring = ''
+        self.previous_querystring = ''
+        self.count = None
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """
+    Paginação por cursor para ListView. Ordena por (`keyset_field`, pk) e lê a
+    página seguinte com WHERE (campo, pk) > (último valor, último pk), sem
+    OFFSET nem COUNT: qualquer página custa o mesmo que a primeira.
+
+    `keyset_field` aceita o prefixo '-' para ordem decrescente. Com
+    `approximate_count` o total é contado uma vez e guardado no cache da
+    empresa por `count_timeout` segundos. Se get_keyset_field() retornar None
+    (ex.: busca ordenada por relevância), usa a paginação por número de página.
+    """
+    paginate_by = 20
+    keyset_field = 'name'
+    approximate_count = False
+    count_timeout = 60
+    cursor_params = ('after', 'before', 'page')
+
+    def get_keyset_field(self):
+        return self.keyset_field
+
+    def paginate_queryset(self, queryset, page_size):
+        params = self.request.GET.copy()
+        for param in self.cursor_params:
+            params.pop(param, None)
+        base = params.urlencode()
+
+        field = self.get_keyset_field()
+        if field is None:
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            page.next_querystring = self._querystring(base, page=page.next_page_number()) if page.has_next() else ''
+            page.previous_querystring = self._querystring(base, page=page.previous_page_number()) if page.has_previous() else ''
+            page.count = paginator.count
+            return paginator, page, object_list, is_paginated
+
+        name = field.lstrip('-')
+        rows, cursor, backwards = self.keyset_queryset(queryset, field)
+
+        # Uma linha a mais indica se existe outra página na mesma direção
+        rows = list(rows[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None and bool(rows)
+
+        page = KeysetPage(rows, has_next, has_previous)
+        if has_next:
+            page.next_querystring = self._querystring(base, after=self._encode_cursor(rows[-1], name))
+        if has_previous:
+            page.previous_querystring = self._querystring(base, before=self._encode_cursor(rows[0], name))
+        if self.approximate_count and self.request.company:
+            page.count = company_cache.get_or_set(
+                self.request.company, 'list_count', queryset.count,
+                queryset.model._meta.label, base, timeout=self.count_timeout,
+            )
+        return None, page, rows, page.has_other_pages()
+
+    def keyset_queryset(self, queryset, field):
+        """
+        Aplica o cursor da requisição (after/before) e a ordem de `field` ao
+        queryset, sem limitar. Retorna (queryset, cursor, backwards).
+        """
+        name = field.lstrip('-')
+        after = self._decode_cursor(queryset.model, name, self.request.GET.get('after'))
+        before = self._decode_cursor(queryset.model, name, self.request.GET.get('before'))
+        backwards = after is None and before is not None
+        cursor = before if backwards else after
+
+        # Ao voltar uma página, percorre a ordem inversa e desfaz a inversão no fim
+        reverse = field.startswith('-') != backwards
+        rows = queryset
+        if cursor is not None:
+            value, pk = cursor
+            lookup = 'lt' if reverse else 'gt'
+            # O primeiro termo (campo >= valor) limita a busca a um intervalo do
+            # índice (company, campo, id); sem ele o OR obriga a ordenar o resto da tabela
+            rows = rows.filter(
+                Q(**{f'{name}__{lookup}e': value}),
+                Q(**{f'{name}__{lookup}': value}) | Q(**{name: value, f'pk__{lookup}': pk}),
+            )
+        rows = rows.order_by(f'-{name}', '-pk') if reverse else rows.order_by(name, 'pk')
+        return rows, cursor, backwards
+
+    @staticmethod
+    def _querystring(base, **params):
+        extra = urlencode(params)
+        return f'{base}&{extra}' if base else extra
+
+    @staticmethod
+    def _encode_cursor(obj, name):
+        raw = json.dumps([getattr(obj, name), obj.pk], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(model, name, token):
+        if not token:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            return model._meta.get_field(name).to_python(value), model._meta.pk.to_python(pk)
+        except (ValueError, TypeError, ValidationError):
+            raise Http404("Cursor de paginação inválido.")
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.ActiveCompanyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
@@ -95,6 +96,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transações de escrita concorrentes (ex.: vários PDVs vendendo o mesmo
+            # produto) aguardam o bloqueio em vez de falhar imediatamente
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+    }
+}
+
+
+# Cache
+# Os dados de cada empresa ficam em um namespace próprio, versionado (ver core/cache.py).
+# A memória local atende um único processo; com vários workers use um backend
+# compartilhado, como arquivo ou banco de dados (este exige `python manage.py createcachetable`):
+# 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache',
+# 'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'erp_cache',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'erp-default',
+        'TIMEOUT': 300,
     }
 }
 
@@ -0,0 +1,97 @@
+# core/cache.py
+"""
+Cache com namespace por empresa. Cada empresa tem contadores de versão por
+grupo de dados, que fazem parte das chaves do cache: gravações nos cadastros
+incrementam o contador do catálogo e movimentações de estoque o do estoque
+(ver core.signals), e as entradas antigas simplesmente deixam de ser lidas até
+expirarem. Assim uma empresa nunca lê dados de outra nem dados anteriores à
+última alteração, e uma venda não descarta as listas do catálogo.
+
+Resultados do estoque dependem também do catálogo (a exclusão de um produto
+remove seus movimentos), por isso suas chaves levam as duas versões.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'company:{company_id}:{group}:version'
+
+CATALOG = 'catalog'
+STOCK = 'stock'
+
+# Versões que compõem as chaves de cada grupo
+DEPENDENCIES = {
+    CATALOG: (CATALOG,),
+    STOCK: (CATALOG, STOCK),
+}
+
+
+def _initial_version():
+    # Se o contador for perdido (despejo ou reinício do cache), recomeça de um
+    # valor baseado no relógio, maior que qualquer versão já usada, para que
+    # entradas antigas que ainda estejam no cache não voltem a ser lidas
+    return time.time_ns() // 1000
+
+
+def _company_id(company):
+    return getattr(company, 'pk', company)
+
+
+def _version_key(company, group):
+    if group not in DEPENDENCIES:
+        raise ValueError(f"Grupo de cache desconhecido: {group}")
+    return VERSION_KEY.format(company_id=_company_id(company), group=group)
+
+
+def company_version(company, group=CATALOG):
+    """Versão atual do grupo `group` da empresa (criada na primeira leitura)."""
+    key = _version_key(company, group)
+    version = cache.get(key)
+    if version is None:
+        initial = _initial_version()
+        cache.add(key, initial, timeout=None)
+        version = cache.get(key, initial)
+    return version
+
+
+def bump_company_version(company, group=CATALOG):
+    """
+    Invalida o cache do grupo `group` da empresa (e, para o catálogo, também o
+    do estoque, que depende dele). Dentro de uma transação, o incremento só
+    acontece após o commit, para que nenhuma requisição grave em cache, com a
+    nova versão, dados que ainda não foram confirmados.
+    """
+    key = _version_key(company, group)
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def company_key(company, name, *parts, group=CATALOG):
+    """Chave de cache no namespace e nas versões atuais do grupo da empresa."""
+    suffix = ':'.join(str(part) for part in parts)
+    version = '.'.join(str(company_version(company, dependency)) for dependency in DEPENDENCIES[group])
+    return f'company:{_company_id(company)}:{group}:v{version}:{name}:{suffix}'
+
+
+def get_or_set(company, name, compute, *parts, timeout=None, group=CATALOG):
+    """
+    Lê `name` (com os parâmetros `parts`) do cache do grupo `group` da empresa
+    ou calcula com `compute()` e grava. `timeout` None usa o TIMEOUT do backend.
+    """
+    key = company_key(company, name, *parts, group=group)
+    missing = object()
+    value = cache.get(key, missing)
+    if value is missing:
+        value = compute()
+        if timeout is None:
+            cache.set(key, value)
+        else:
+            cache.set(key, value, timeout)
+    return value
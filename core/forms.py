@@ -0,0 +1,44 @@
+# core/forms.py
+from django import forms
+
+from .cache import get_or_set
+
+
+def company_choices(company, model):
+    """
+    Opções [(pk, rótulo)] dos objetos `model` da empresa para os selects,
+    guardadas no cache da empresa: a lista é montada uma vez e descartada a
+    cada gravação (ver core.signals.CACHED_MODELS).
+    """
+    def compute():
+        queryset = model.objects.filter(company=company)
+        if not queryset.ordered:
+            queryset = queryset.order_by('name')
+        return [(obj.pk, str(obj)) for obj in queryset]
+
+    return get_or_set(company, 'choices', compute, model._meta.label)
+
+
+class CompanyModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField cujas opções vêm do cache da empresa (ver company_choices)
+    em vez de uma consulta a cada renderização. Em um formset, as linhas podem
+    compartilhar a lista de opções (`choices`) e os objetos escolhidos
+    (`instances`, pk -> objeto), lidos uma única vez.
+    """
+    instances = None
+
+    def bind_company(self, company, choices=None, instances=None):
+        # O queryset continua valendo para validar valores fora de `instances`
+        self.queryset = self.queryset.model.objects.filter(company=company)
+        if choices is None:
+            choices = company_choices(company, self.queryset.model)
+        self.choices = [('', self.empty_label)] + choices if self.empty_label is not None else choices
+        self.instances = instances
+
+    def to_python(self, value):
+        if self.instances is not None and value not in self.empty_values:
+            instance = self.instances.get(str(value))
+            if instance is not None:
+                return instance
+        return super().to_python(value)
@@ -35,13 +35,18 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    # Incrementado a cada alteração nos vínculos com empresas (ver core.signals);
+    # invalida a empresa ativa guardada na sessão pelo ActiveCompanyMiddleware
+    company_version = models.PositiveIntegerField(default=0, editable=False)
+
     objects = CustomUserManager()
     def __str__(self):
         return self.email
 
     @property
     def company(self):
-        # Se tiver uma empresa ativa na sessão ou lógica para pegar a principal
+        # Fora de uma requisição (comandos, shell). Nas views use request.company,
+        # resolvido uma única vez pelo ActiveCompanyMiddleware
         link = self.company_links.filter(active=True).first()
         return link.company if link else None
 
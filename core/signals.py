@@ -0,0 +1,44 @@
+# core/signals.py
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import STOCK, bump_company_version
+from .models import CompanyUser, User
+
+
+@receiver(post_save, sender=CompanyUser)
+@receiver(post_delete, sender=CompanyUser)
+def bump_user_company_version(sender, instance, **kwargs):
+    """
+    Qualquer alteração em um vínculo usuário/empresa invalida a empresa ativa
+    guardada na sessão do usuário.
+    """
+    User.objects.filter(pk=instance.user_id).update(company_version=F('company_version') + 1)
+
+
+# Cadastros cujo conteúdo aparece em resultados guardados no cache do catálogo.
+# StockMovement invalida apenas o cache do estoque, e só no post_save: um
+# receptor de post_delete impediria a exclusão em lote feita no arquivamento do
+# histórico; gravações em lote de movimentos invalidam o cache explicitamente
+# (ver stock.services).
+CACHED_MODELS = (
+    'products.Product', 'products.Brand', 'products.Category',
+    'suppliers.Supplier', 'customers.Customer',
+)
+
+
+def invalidate_company_cache(sender, instance, **kwargs):
+    bump_company_version(instance.company_id)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_company_cache, sender=model, dispatch_uid=f'company_cache_save_{model}')
+    post_delete.connect(invalidate_company_cache, sender=model, dispatch_uid=f'company_cache_delete_{model}')
+
+
+def invalidate_stock_cache(sender, instance, **kwargs):
+    bump_company_version(instance.company_id, STOCK)
+
+
+post_save.connect(invalidate_stock_cache, sender='stock.StockMovement', dispatch_uid='company_cache_save_stock.StockMovement')
@@ -0,0 +1,22 @@
+# core/streaming.py
+"""
+Apoio às exportações em fluxo (StreamingHttpResponse): o csv.writer escreve
+em um pseudo-buffer que devolve cada linha formatada, em vez de acumulá-la,
+para que a resposta seja gerada linha a linha.
+"""
+import csv
+
+
+class Echo:
+    """Pseudo-buffer para o csv.writer: devolve a linha em vez de armazená-la."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """Gera o cabeçalho e as linhas `rows` já formatadas em CSV, uma a uma."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
@@ -1,3 +1,146 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import transaction
+from django.test import RequestFactory, TestCase
+
+from app.middleware import ActiveCompanyMiddleware
+from products.models import Product
+from stock.models import StockMovement
+from . import cache as company_cache
+from .models import Company, CompanyUser, User
+
+
+class ActiveCompanyMiddlewareTests(TestCase):
+    """
+    A empresa ativa fica na sessão e só é resolvida de novo quando os vínculos
+    do usuário mudam (User.company_version).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.second = Company.objects.create(name="Beta", cnpj="11.111.111/0001-11", address="-", city="-", state="SP")
+        cls.user = User.objects.create_user(email="a@a.com", password="x")
+        cls.link = CompanyUser.objects.create(user=cls.user, company=cls.first, role='admin')
+
+    def setUp(self):
+        self.middleware = ActiveCompanyMiddleware(lambda request: None)
+        self.session = SessionStore()
+
+    def resolve(self):
+        request = RequestFactory().get('/')
+        # Como na AuthenticationMiddleware, o usuário é lido a cada requisição
+        request.user = User.objects.get(pk=self.user.pk)
+        request.session = self.session
+        return self.middleware.resolve(request)
+
+    def test_cached_company_is_reused_while_links_do_not_change(self):
+        self.assertEqual(self.resolve(), (self.first, 'admin'))
+
+        # Apenas a leitura da empresa; o vínculo vem da sessão
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        request.session = self.session
+        with self.assertNumQueries(1):
+            self.assertEqual(self.middleware.resolve(request), (self.first, 'admin'))
+
+    def test_link_changes_invalidate_the_cached_company(self):
+        self.resolve()
+
+        self.link.active = False
+        self.link.save()
+        CompanyUser.objects.create(user=self.user, company=self.second, role='member')
+
+        self.assertEqual(self.resolve(), (self.second, 'member'))
+
+        CompanyUser.objects.filter(company=self.second).first().delete()
+        self.assertEqual(self.resolve(), (None, None))
+
+
+class CompanyCacheScopeTests(TestCase):
+    """
+    Movimentações de estoque invalidam apenas o cache do estoque; alterações
+    no catálogo invalidam os dois, pois os resultados do estoque dependem dele.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+
+    def setUp(self):
+        cache.clear()
+
+    def versions(self):
+        return (
+            company_cache.company_version(self.company, company_cache.CATALOG),
+            company_cache.company_version(self.company, company_cache.STOCK),
+        )
+
+    def test_stock_movements_keep_catalog_caches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(company=self.company, name="Caneta", sku="C1", sale_price=Decimal('5.00'))
+        choices = company_cache.get_or_set(self.company, 'choices', lambda: ['caneta'])
+        catalog, stock = self.versions()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockMovement.objects.create(
+                company=self.company, product=product, movement_type=StockMovement.MovementType.PURCHASE,
+                quantity=5, unit_price=Decimal('1.00'),
+            )
+
+        self.assertEqual(self.versions(), (catalog, stock + 1))
+        self.assertEqual(company_cache.get_or_set(self.company, 'choices', lambda: ['outra']), choices)
+
+    def test_catalog_changes_invalidate_stock_caches(self):
+        company_cache.get_or_set(self.company, 'fifo_valuation', lambda: 1, group=company_cache.STOCK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(company=self.company, name="Caneta", sku="C1", sale_price=Decimal('5.00'))
+
+        self.assertEqual(
+            company_cache.get_or_set(self.company, 'fifo_valuation', lambda: 2, group=company_cache.STOCK), 2,
+        )
+
+
+class CompanyCacheCommitTests(TestCase):
+    """
+    A versão do cache da empresa só muda depois do commit: uma transação
+    desfeita não invalida nada, e antes do commit o cache antigo continua valendo.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_is_bumped_on_commit(self):
+        version = company_cache.company_version(self.company)
+        company_cache.get_or_set(self.company, 'choices', lambda: 'antigo')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Product.objects.create(company=self.company, name="Caneta", sku="C1", sale_price=Decimal('5.00'))
+            # Ainda sem commit: outras requisições leriam o valor antigo
+            self.assertEqual(company_cache.company_version(self.company), version)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(company_cache.company_version(self.company), version + 1)
+        self.assertEqual(company_cache.get_or_set(self.company, 'choices', lambda: 'novo'), 'novo')
+
+    def test_rollback_does_not_bump_the_version(self):
+        version = company_cache.company_version(self.company)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Product.objects.create(company=self.company, name="Caneta", sku="C1", sale_price=Decimal('5.00'))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(company_cache.company_version(self.company), version)
+        self.assertFalse(Product.objects.exists())
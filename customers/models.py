@@ -38,6 +38,10 @@ class Customer(models.Model):
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
+        indexes = [
+            # Listagem paginada por cursor (nome, pk)
+            models.Index(fields=['company', 'name', 'id'], name='customer_company_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -3,14 +3,15 @@ from pyexpat.errors import messages
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from app.mixins import CompanyFilteredMixin
+from app.mixins import CompanyFilteredMixin, KeysetPaginationMixin
 from .models import Customer
 from .forms import CustomerForm
 
-class CustomerListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
+class CustomerListView(LoginRequiredMixin, CompanyFilteredMixin, KeysetPaginationMixin, ListView):
     model = Customer
     template_name = 'customers/customer_list.html'
     context_object_name = 'customers'
+    approximate_count = True
 
 class CustomerDetailView(LoginRequiredMixin, CompanyFilteredMixin, DetailView):
     model = Customer
@@ -31,9 +32,8 @@ class CustomerCreateView(LoginRequiredMixin, CompanyFilteredMixin, CreateView):
 
     def form_valid(self, form):
         try:
-            company_user = self.request.user.company_links.first()
-            if company_user:
-                form.instance.company = company_user.company
+            if self.request.company:
+                form.instance.company = self.request.company
             else:
                 return self.form_invalid(form)
         except AttributeError:
@@ -55,9 +55,8 @@ class CustomerUpdateView(LoginRequiredMixin, CompanyFilteredMixin, UpdateView):
 
     def form_valid(self, form):
         try:
-            company_user = self.request.user.company_links.first()
-            if company_user:
-                form.instance.company = company_user.company
+            if self.request.company:
+                form.instance.company = self.request.company
             else:
                 messages.success(self.request, 'Customer updated successfully.')
                 return self.form_invalid(form)
@@ -1,5 +1,6 @@
 from django import forms
-from . import models
+from core.forms import CompanyModelChoiceField
+from . import imports, models, pricing
 
 class BrandForm(forms.ModelForm):
     class Meta:
@@ -46,7 +47,9 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = models.Product
         # Campos atualizados com base no novo modelo do Canvas
-        fields = ['name', 'category', 'brand', 'description', 'sku', 'sale_price']
+        fields = ['name', 'category', 'brand', 'description', 'sku', 'ean', 'sale_price', 'minimum_stock', 'reorder_quantity']
+        # Opções de categoria e marca lidas do cache da empresa
+        field_classes = {'category': CompanyModelChoiceField, 'brand': CompanyModelChoiceField}
         
         widgets = {
             'name': forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': 'Digite o título do produto'}),
@@ -54,8 +57,11 @@ class ProductForm(forms.ModelForm):
             'brand': forms.Select(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white select2-field', 'placeholder': 'Selecionar marca'}),
             'description': forms.Textarea(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'rows': 3, 'placeholder': 'Descreva o produto detalhadamente...'}),
             'sku': forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': 'Ex: PROD-001'}),
+            'ean': forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': 'Código de barras'}),
             # Renomeado 'price' para 'sale_price' para corresponder ao modelo
             'sale_price': forms.NumberInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': 'R$ 0,00'}),
+            'minimum_stock': forms.NumberInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': '0'}),
+            'reorder_quantity': forms.NumberInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': '0'}),
         }
         
         labels = {
@@ -64,7 +70,10 @@ class ProductForm(forms.ModelForm):
             'brand': 'Marca',
             'description': 'Descrição',
             'sku': 'SKU',
+            'ean': 'EAN/GTIN',
             'sale_price': 'Preço de Venda',
+            'minimum_stock': 'Estoque Mínimo',
+            'reorder_quantity': 'Quantidade de Reposição',
         }
 
     # Seu método __init__ está perfeito e foi mantido como está.
@@ -72,10 +81,78 @@ class ProductForm(forms.ModelForm):
         request = kwargs.pop('request', None)
         super().__init__(*args, **kwargs)
 
-        if request and request.user.is_authenticated:
-            # É mais seguro verificar se company_links existe antes de filtrar
-            company_user = request.user.company_links.filter(active=True).first()
-            if company_user:
-                # Filtra as opções de Categoria e Marca para mostrar apenas as da empresa do usuário
-                self.fields['category'].queryset = models.Category.objects.filter(company=company_user.company)
-                self.fields['brand'].queryset = models.Brand.objects.filter(company=company_user.company)
+        company = getattr(request, 'company', None)
+        if company:
+            # Filtra as opções de Categoria e Marca para mostrar apenas as da empresa do usuário
+            self.fields['category'].bind_company(company)
+            self.fields['brand'].bind_company(company)
+
+
+class ProductImportForm(forms.Form):
+    """Envio da planilha de produtos (ver products.imports)."""
+    file = forms.FileField(
+        label='Arquivo (CSV ou XLSX)',
+        widget=forms.ClearableFileInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'accept': '.csv,.xlsx'}),
+    )
+    partial = forms.BooleanField(
+        label='Importar as linhas válidas mesmo se houver erros',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'mr-2'}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if self.file_format(file) not in imports.FORMATS:
+            raise forms.ValidationError("Envie um arquivo .csv ou .xlsx.")
+        return file
+
+    @staticmethod
+    def file_format(file):
+        return file.name.rsplit('.', 1)[-1].lower()
+
+
+class ProductRepricingForm(forms.Form):
+    """Regra de reajuste de preços em lote (ver products.pricing)."""
+    method = forms.ChoiceField(
+        label='Reajuste',
+        choices=list(pricing.METHODS.items()),
+        widget=forms.Select(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white'}),
+    )
+    value = forms.DecimalField(
+        label='Valor (% ou R$)',
+        max_digits=12,
+        decimal_places=4,
+        widget=forms.NumberInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'step': 'any', 'placeholder': 'Ex: 10 ou -5'}),
+    )
+    brand = CompanyModelChoiceField(
+        label='Marca',
+        queryset=models.Brand.objects.none(),
+        required=False,
+        widget=forms.Select(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white select2-field'}),
+    )
+    category = CompanyModelChoiceField(
+        label='Categoria',
+        queryset=models.Category.objects.none(),
+        required=False,
+        widget=forms.Select(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white select2-field'}),
+    )
+    sku_pattern = forms.CharField(
+        label='Padrão de SKU',
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': 'Ex: ACME-* (use * e ? como curingas)'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        company = kwargs.pop('company', None)
+        super().__init__(*args, **kwargs)
+        if company:
+            self.fields['brand'].bind_company(company)
+            self.fields['category'].bind_company(company)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        value = cleaned_data.get('value')
+        if value is not None and cleaned_data.get('method') in ('percent', 'markup') and value <= -100:
+            self.add_error('value', "O percentual deve ser maior que -100.")
+        return cleaned_data
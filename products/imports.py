@@ -0,0 +1,226 @@
+# products/imports.py
+"""
+Importação do catálogo de produtos a partir de CSV ou XLSX. O arquivo é lido
+em fluxo, linha a linha, e os produtos são gravados em lotes com
+bulk_create(update_conflicts=True) sobre a chave única (company, sku): SKUs já
+cadastrados são atualizados e os novos são inseridos. Marcas e categorias são
+resolvidas por mapas carregados uma única vez e as que faltam são criadas.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from core.cache import bump_company_version
+from stock.services import refresh_below_minimum
+from .models import Brand, Category, Product
+
+# Colunas reconhecidas no cabeçalho do arquivo
+IMPORT_FIELDS = ('sku', 'name', 'description', 'brand', 'category', 'sale_price', 'minimum_stock', 'reorder_quantity')
+REQUIRED_FIELDS = ('sku', 'name', 'sale_price')
+
+FORMATS = ('csv', 'xlsx')
+
+MAX_PRICE = Decimal('99999999.99')
+
+
+class ImportFileError(Exception):
+    """Arquivo ilegível ou sem as colunas obrigatórias."""
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    # Planilhas exportadas em português costumam usar ';' como separador
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    except UnicodeDecodeError:
+        raise ImportFileError("O arquivo CSV deve estar codificado em UTF-8.")
+    finally:
+        # Devolve o arquivo ao chamador sem fechá-lo junto com o wrapper
+        text.detach()
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("A importação de XLSX requer o pacote openpyxl.")
+    try:
+        # Modo somente leitura: as linhas são lidas sob demanda, sem carregar a planilha inteira
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("Não foi possível ler a planilha XLSX.")
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield [_cell(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def read_rows(file, fmt):
+    """
+    Abre o arquivo e retorna (colunas, linhas), onde `linhas` gera tuplas
+    (número_da_linha, {coluna: valor}) sob demanda. Levanta ImportFileError se
+    o formato for desconhecido ou faltarem colunas obrigatórias.
+    """
+    if fmt not in FORMATS:
+        raise ImportFileError("Formato inválido. Envie um arquivo CSV ou XLSX.")
+    rows = _csv_rows(file) if fmt == 'csv' else _xlsx_rows(file)
+
+    header = [name.strip().lower() for name in next(rows, [])]
+    missing = [name for name in REQUIRED_FIELDS if name not in header]
+    if missing:
+        raise ImportFileError(f"Colunas obrigatórias ausentes: {', '.join(missing)}.")
+    columns = [name for name in IMPORT_FIELDS if name in header]
+
+    def generate():
+        # A linha 1 é o cabeçalho
+        for number, values in enumerate(rows, start=2):
+            if not any(value.strip() for value in values):
+                continue
+            yield number, {name: value.strip() for name, value in zip(header, values) if name in columns}
+
+    return columns, generate()
+
+
+def _decimal(value):
+    # Aceita tanto 1234.56 quanto 1.234,56
+    if ',' in value:
+        value = value.replace('.', '').replace(',', '.')
+    return Decimal(value)
+
+
+def _clean_row(row):
+    """Valida uma linha; retorna (dados, erros)."""
+    data, errors = {}, {}
+
+    for name, max_length in (('sku', 100), ('name', 255)):
+        value = row.get(name, '')
+        if not value:
+            errors[name] = "Campo obrigatório."
+        elif len(value) > max_length:
+            errors[name] = f"Máximo de {max_length} caracteres."
+        data[name] = value
+
+    try:
+        price = _decimal(row.get('sale_price', ''))
+        if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+            raise InvalidOperation
+        data['sale_price'] = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        errors['sale_price'] = "Informe um preço de venda válido."
+
+    for name in ('minimum_stock', 'reorder_quantity'):
+        try:
+            value = int(_decimal(row.get(name) or '0'))
+            if value < 0:
+                raise ValueError
+            data[name] = value
+        except (ValueError, InvalidOperation):
+            errors[name] = "Informe um número inteiro maior ou igual a zero."
+
+    for name in ('brand', 'category'):
+        value = row.get(name, '')
+        if len(value) > 100:
+            errors[name] = "Máximo de 100 caracteres."
+        data[name] = value
+
+    data['description'] = row.get('description') or None
+    return data, errors
+
+
+def _resolve_names(model, company, names, known):
+    """Completa o mapa nome -> ID com os nomes que ainda não existem, criando-os."""
+    missing = [name for name in names if name and name not in known]
+    if missing:
+        model.objects.bulk_create([model(company=company, name=name) for name in missing], ignore_conflicts=True)
+        # Com ignore_conflicts os IDs gerados podem não ser os gravados: relê do banco
+        known.update(model.objects.filter(company=company, name__in=missing).values_list('name', 'pk'))
+
+
+def import_products(company, columns, rows, partial=False, batch_size=1000):
+    """
+    Grava os produtos de `rows` (ver read_rows) em lotes de `batch_size`, na
+    mesma transação. Produtos com SKU já cadastrado na empresa têm atualizadas
+    apenas as colunas presentes no arquivo.
+
+    Se houver erros, nada é gravado, exceto com `partial=True`, em que as linhas
+    válidas são gravadas. Retorna (quantidade_importada, erros), onde `erros` é
+    uma lista de {'row': linha_do_arquivo, 'errors': {campo: mensagem}}.
+    """
+    update_fields = [name for name in columns if name != 'sku'] + ['updated_at']
+
+    brands = dict(Brand.objects.filter(company=company).values_list('name', 'pk'))
+    categories = dict(Category.objects.filter(company=company).values_list('name', 'pk'))
+
+    def flush(batch):
+        _resolve_names(Brand, company, {data['brand'] for data in batch.values()}, brands)
+        _resolve_names(Category, company, {data['category'] for data in batch.values()}, categories)
+        products = [
+            Product(
+                company=company,
+                sku=sku,
+                name=data['name'],
+                description=data['description'],
+                brand_id=brands.get(data['brand']),
+                category_id=categories.get(data['category']),
+                sale_price=data['sale_price'],
+                minimum_stock=data['minimum_stock'],
+                reorder_quantity=data['reorder_quantity'],
+                # Produto novo ainda não tem saldo
+                below_minimum=data['minimum_stock'] > 0,
+            )
+            for sku, data in batch.items()
+        ]
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['company', 'sku'],
+            update_fields=update_fields,
+        )
+        if 'minimum_stock' in columns:
+            # Produtos existentes: o indicador depende do saldo atual
+            refresh_below_minimum(Product.objects.filter(company=company, sku__in=list(batch)).values('pk'))
+        return len(products)
+
+    imported, errors = 0, []
+    with transaction.atomic():
+        # O lote é indexado por SKU: uma linha repetida no arquivo prevalece sobre a anterior
+        batch = {}
+        for number, row in rows:
+            data, row_errors = _clean_row(row)
+            if row_errors:
+                errors.append({'row': number, 'errors': row_errors})
+                continue
+            if errors and not partial:
+                # A importação será desfeita: apenas valida o restante do arquivo
+                continue
+            batch[data['sku']] = data
+            if len(batch) >= batch_size:
+                imported += flush(batch)
+                batch = {}
+        if errors and not partial:
+            transaction.set_rollback(True)
+            return 0, errors
+        if batch:
+            imported += flush(batch)
+
+        # bulk_create não dispara post_save
+        bump_company_version(company)
+
+    return imported, errors
@@ -0,0 +1,101 @@
+# products/management/commands/benchmark_product_search.py
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.models import Company
+from products.models import Brand, Category, Product
+from products.search import search_products
+
+
+class _Rollback(Exception):
+    pass
+
+
+WORDS = (
+    "Café", "Açúcar", "Feijão", "Arroz", "Macarrão", "Óleo", "Leite", "Pão", "Biscoito", "Chocolate",
+    "Caneta", "Caderno", "Lápis", "Borracha", "Régua", "Papel", "Envelope", "Pasta", "Grampo", "Clipe",
+    "Sabão", "Detergente", "Esponja", "Vassoura", "Balde", "Pano", "Álcool", "Água", "Sanitária", "Desinfetante",
+)
+ADJECTIVES = ("Azul", "Vermelho", "Integral", "Orgânico", "Tradicional", "Extra", "Premium", "Econômico", "Grande", "Pequeno")
+BRANDS = ("Pilão", "União", "Camil", "Nestlé", "Faber-Castell", "Tilibra", "Ypê", "Bombril", "Tramontina", "Melitta")
+CATEGORIES = ("Alimentos", "Bebidas", "Papelaria", "Limpeza", "Utilidades", "Higiene")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a busca de produtos por icontains (LIKE '%termo%') com o índice FTS5, em uma "
+        "massa de dados gerada em uma empresa própria do benchmark e descartada ao final."
+    )
+
+    BENCHMARK_CNPJ = "00.000.000/0000-03"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help="Produtos gerados.")
+        parser.add_argument('--repeat', type=int, default=5, help="Execuções de cada consulta (usa a mediana).")
+        parser.add_argument('--limit', type=int, default=20, help="Resultados lidos por consulta (uma página).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("O índice FTS5 é específico do SQLite.")
+
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        started = time.perf_counter()
+        company = Company.objects.create(
+            name="Benchmark de Busca", cnpj=self.BENCHMARK_CNPJ, address="-", city="-", state="SP",
+        )
+        brands = Brand.objects.bulk_create([Brand(company=company, name=name) for name in BRANDS])
+        categories = Category.objects.bulk_create([Category(company=company, name=name) for name in CATEGORIES])
+        Product.objects.bulk_create(
+            (
+                Product(
+                    company=company,
+                    name=f"{random.choice(WORDS)} {random.choice(ADJECTIVES)} {random.randint(1, 999)}",
+                    sku=f"SKU-{index:06d}",
+                    brand=random.choice(brands),
+                    category=random.choice(categories),
+                    sale_price=1,
+                )
+                for index in range(options['products'])
+            ),
+            batch_size=2000,
+        )
+        self.stdout.write(f"{options['products']} produto(s) gerado(s) em {time.perf_counter() - started:.1f}s.")
+
+        products = Product.objects.filter(company=company)
+        limit = options['limit']
+        terms = ("cafe", "açúcar", "pilao", "caneta azul", "sku-0500", "limp")
+        self.stdout.write(f"{'termo':<14}{'icontains (ms)':>16}{'FTS5 (ms)':>12}{'resultados':>14}")
+        for term in terms:
+            words = term.split()
+            condition = Q()
+            for word in words:
+                condition &= (
+                    Q(name__icontains=word) | Q(sku__icontains=word)
+                    | Q(brand__name__icontains=word) | Q(category__name__icontains=word)
+                )
+            like = products.filter(condition).order_by('name')
+            fts = search_products(products, term)
+
+            like_ms = self._measure(lambda: list(like[:limit]), options['repeat'])
+            fts_ms = self._measure(lambda: list(fts[:limit]), options['repeat'])
+            self.stdout.write(f"{term:<14}{like_ms:>16.1f}{fts_ms:>12.1f}{fts.count():>14}")
+
+    def _measure(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
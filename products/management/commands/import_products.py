@@ -0,0 +1,44 @@
+# products/management/commands/import_products.py
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Company
+from products import imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa o catálogo de produtos de uma empresa a partir de um arquivo CSV ou XLSX, "
+        "atualizando os produtos pelo SKU (ver products.imports)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company', type=int, help="ID da empresa.")
+        parser.add_argument('path', help="Arquivo .csv ou .xlsx.")
+        parser.add_argument('--partial', action='store_true', help="Grava as linhas válidas mesmo se houver erros.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Empresa {options['company']} não encontrada.")
+
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f"Arquivo não encontrado: {path}")
+
+        with path.open('rb') as file:
+            try:
+                columns, rows = imports.read_rows(file, path.suffix.lstrip('.').lower())
+                imported, errors = imports.import_products(
+                    company, columns, rows, partial=options['partial'], batch_size=options['batch_size'],
+                )
+            except imports.ImportFileError as e:
+                raise CommandError(str(e))
+
+        for error in errors:
+            messages = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+            self.stderr.write(f"Linha {error['row']}: {messages}")
+        self.stdout.write(self.style.SUCCESS(f"{imported} produto(s) importado(s), {len(errors)} linha(s) com erro."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('products', '0002_alter_product_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='below_minimum',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Abaixo do Mínimo'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='minimum_stock',
+            field=models.PositiveIntegerField(default=0, verbose_name='Estoque Mínimo'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Quantidade de Reposição'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['company', 'below_minimum'], name='product_below_minimum_idx'),
+        ),
+    ]
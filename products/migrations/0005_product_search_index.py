@@ -0,0 +1,87 @@
+from django.db import migrations
+
+FTS_TABLE = 'products_product_fts'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        company_id UNINDEXED, name, sku, brand, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, company_id, name, sku, brand, category)
+    SELECT p.rowid, p.company_id, p.name, COALESCE(p.sku, ''), COALESCE(b.name, ''), COALESCE(c.name, '')
+    FROM products_product p
+    LEFT JOIN products_brand b ON b.id = p.brand_id
+    LEFT JOIN products_category c ON c.id = p.category_id
+    """,
+    f"""
+    CREATE TRIGGER products_product_fts_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, company_id, name, sku, brand, category) VALUES (
+            new.rowid, new.company_id, new.name, COALESCE(new.sku, ''),
+            COALESCE((SELECT name FROM products_brand WHERE id = new.brand_id), ''),
+            COALESCE((SELECT name FROM products_category WHERE id = new.category_id), '')
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_product_fts_update
+    AFTER UPDATE OF company_id, name, sku, brand_id, category_id ON products_product BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+        INSERT INTO {FTS_TABLE} (rowid, company_id, name, sku, brand, category) VALUES (
+            new.rowid, new.company_id, new.name, COALESCE(new.sku, ''),
+            COALESCE((SELECT name FROM products_brand WHERE id = new.brand_id), ''),
+            COALESCE((SELECT name FROM products_category WHERE id = new.category_id), '')
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_product_fts_delete AFTER DELETE ON products_product BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_brand_fts_update AFTER UPDATE OF name ON products_brand BEGIN
+        UPDATE {FTS_TABLE} SET brand = new.name
+        WHERE rowid IN (SELECT rowid FROM products_product WHERE brand_id = new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_category_fts_update AFTER UPDATE OF name ON products_category BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT rowid FROM products_product WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS products_category_fts_update",
+    "DROP TRIGGER IF EXISTS products_brand_fts_update",
+    "DROP TRIGGER IF EXISTS products_product_fts_delete",
+    "DROP TRIGGER IF EXISTS products_product_fts_update",
+    "DROP TRIGGER IF EXISTS products_product_fts_insert",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # O índice FTS5 é específico do SQLite; nos demais bancos a busca usa icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_user_company_version'),
+        ('products', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ean',
+            field=models.CharField(blank=True, max_length=14, null=True, verbose_name='EAN/GTIN'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['company', 'ean'], name='product_company_ean_idx'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+from importlib import import_module
+
+from django.db import migrations
+
+FTS_TABLE = 'products_product_fts'
+
+# A versão anterior ligava o índice ao produto pelo rowid, que o VACUUM pode
+# renumerar (a chave primária é um UUID); agora a ligação é pelo id do produto
+previous = import_module('products.migrations.0005_product_search_index')
+
+KEYS_TABLE = 'products_product_fts_keys'
+
+# Chave de cada linha do índice: o rowid explícito (INTEGER PRIMARY KEY) não é
+# renumerado pelo VACUUM e permite aos triggers achar a linha do produto sem
+# percorrer o índice inteiro (a coluna product_id do FTS5 não é indexada)
+FTS_ROWID = f"(SELECT rowid FROM {KEYS_TABLE} WHERE product_id = {{}}.id)"
+
+CREATE_SQL = [
+    f"""
+    CREATE TABLE {KEYS_TABLE} (
+        rowid INTEGER PRIMARY KEY,
+        product_id char(32) NOT NULL UNIQUE
+    )
+    """,
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        product_id UNINDEXED, company_id UNINDEXED, name, sku, brand, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    f"INSERT INTO {KEYS_TABLE} (product_id) SELECT id FROM products_product",
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, product_id, company_id, name, sku, brand, category)
+    SELECT k.rowid, p.id, p.company_id, p.name, COALESCE(p.sku, ''), COALESCE(b.name, ''), COALESCE(c.name, '')
+    FROM products_product p
+    JOIN {KEYS_TABLE} k ON k.product_id = p.id
+    LEFT JOIN products_brand b ON b.id = p.brand_id
+    LEFT JOIN products_category c ON c.id = p.category_id
+    """,
+    f"""
+    CREATE TRIGGER products_product_fts_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO {KEYS_TABLE} (product_id) VALUES (new.id);
+        INSERT INTO {FTS_TABLE} (rowid, product_id, company_id, name, sku, brand, category) VALUES (
+            {FTS_ROWID.format('new')}, new.id, new.company_id, new.name, COALESCE(new.sku, ''),
+            COALESCE((SELECT name FROM products_brand WHERE id = new.brand_id), ''),
+            COALESCE((SELECT name FROM products_category WHERE id = new.category_id), '')
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_product_fts_update
+    AFTER UPDATE OF company_id, name, sku, brand_id, category_id ON products_product BEGIN
+        UPDATE {FTS_TABLE} SET
+            company_id = new.company_id, name = new.name, sku = COALESCE(new.sku, ''),
+            brand = COALESCE((SELECT name FROM products_brand WHERE id = new.brand_id), ''),
+            category = COALESCE((SELECT name FROM products_category WHERE id = new.category_id), '')
+        WHERE rowid = {FTS_ROWID.format('new')};
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_product_fts_delete AFTER DELETE ON products_product BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = {FTS_ROWID.format('old')};
+        DELETE FROM {KEYS_TABLE} WHERE product_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_brand_fts_update AFTER UPDATE OF name ON products_brand BEGIN
+        UPDATE {FTS_TABLE} SET brand = new.name WHERE rowid IN (
+            SELECT k.rowid FROM {KEYS_TABLE} k
+            JOIN products_product p ON p.id = k.product_id
+            WHERE p.brand_id = new.id
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER products_category_fts_update AFTER UPDATE OF name ON products_category BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name WHERE rowid IN (
+            SELECT k.rowid FROM {KEYS_TABLE} k
+            JOIN products_product p ON p.id = k.product_id
+            WHERE p.category_id = new.id
+        );
+    END
+    """,
+]
+
+DROP_SQL = previous.DROP_SQL + [f"DROP TABLE IF EXISTS {KEYS_TABLE}"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_name_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            previous.run(DROP_SQL + CREATE_SQL),
+            previous.run(DROP_SQL + previous.CREATE_SQL),
+        ),
+    ]
@@ -1,6 +1,5 @@
 import uuid  # Importamos o módulo uuid
 from django.db import models
-from django.db.models import Sum
 from core.models import Company  # Importamos o modelo Company
 
 class Brand(models.Model):
@@ -48,11 +47,14 @@ class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     """
     Representa um produto no sistema. A quantidade em estoque não é armazenada
-    diretamente aqui, mas calculada a partir dos movimentos de estoque.
+    diretamente aqui, mas mantida no saldo materializado (StockBalance) a partir
+    dos movimentos de estoque.
     """
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='products', verbose_name="Empresa")
     name = models.CharField(max_length=255, verbose_name="Nome do Produto")
     sku = models.CharField(max_length=100, blank=True, null=True, verbose_name="SKU (Código)")
+    # Código de barras (cEAN das NF-e de compra)
+    ean = models.CharField(max_length=14, blank=True, null=True, verbose_name="EAN/GTIN")
     description = models.TextField(blank=True, null=True, verbose_name="Descrição")
     
     # Relações
@@ -62,6 +64,12 @@ class Product(models.Model):
     # Campos Financeiros
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Preço de Venda")
     average_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="Custo Médio")
+
+    # Ponto de reposição
+    minimum_stock = models.PositiveIntegerField(default=0, verbose_name="Estoque Mínimo")
+    reorder_quantity = models.PositiveIntegerField(default=0, verbose_name="Quantidade de Reposição")
+    # Mantido a cada movimento (ver stock.services.refresh_below_minimum)
+    below_minimum = models.BooleanField(default=False, editable=False, verbose_name="Abaixo do Mínimo")
     
     active = models.BooleanField(default=True, verbose_name="Ativo")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -72,16 +80,29 @@ class Product(models.Model):
         verbose_name_plural = "Produtos"
         unique_together = ('company', 'sku') # SKU deve ser único por empresa
         ordering = ['name']
+        indexes = [
+            # Listagens e buscas do catálogo da empresa, ordenadas por nome
+            models.Index(fields=['company', 'name', 'id'], name='product_company_name_idx'),
+            models.Index(fields=['company', 'below_minimum'], name='product_below_minimum_idx'),
+            models.Index(fields=['company', 'ean'], name='product_company_ean_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.sku or 'Sem SKU'})"
 
+    def save(self, *args, **kwargs):
+        # O estoque mínimo pode ter mudado: recalcula o indicador com o saldo atual
+        balance = 0 if self._state.adding else self.stock_quantity
+        self.below_minimum = balance < self.minimum_stock
+        super().save(*args, **kwargs)
+
     @property
     def stock_quantity(self):
         """
-        Calcula a quantidade atual em estoque somando todos os movimentos.
+        Retorna a quantidade atual em estoque a partir do saldo materializado.
         Esta é uma propriedade 'read-only'.
         """
-        # O related_name 'movements' vem do ForeignKey no modelo StockMovement
-        total = self.movements.aggregate(total_quantity=Sum('quantity'))['total_quantity']
-        return total if total is not None else 0
\ No newline at end of file
+        # O related_name 'stock_balance' vem do OneToOneField no modelo StockBalance,
+        # mantido a cada movimento (ver stock.services.apply_balance_deltas)
+        balance = getattr(self, 'stock_balance', None)
+        return balance.quantity if balance is not None else 0
@@ -0,0 +1,116 @@
+# products/pricing.py
+"""
+Reajuste de preços de venda em lote. Cada regra seleciona os produtos da
+empresa por marca, categoria e/ou padrão de SKU e define o novo preço por
+percentual, valor absoluto ou markup sobre o custo médio. Cada regra é
+aplicada com um único UPDATE; a prévia é calculada com uma única agregação.
+"""
+import fnmatch
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Greatest, Least, Round
+from django.utils import timezone
+
+from core.cache import bump_company_version
+from .models import Product
+
+METHODS = {
+    'percent': "Percentual sobre o preço atual",
+    'amount': "Valor somado ao preço atual",
+    'markup': "Markup sobre o custo médio",
+}
+
+# Limite de Product.sale_price (max_digits=10, decimal_places=2)
+MAX_PRICE = Decimal('99999999.99')
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def rule_queryset(company, brand=None, category=None, sku_pattern=None, method=None):
+    """
+    Produtos da empresa atingidos pela regra. `sku_pattern` aceita os curingas
+    * e ? (ex.: "ACME-*"); sem curingas, compara o SKU exato.
+    """
+    queryset = Product.objects.filter(company=company)
+    if brand:
+        queryset = queryset.filter(brand=brand)
+    if category:
+        queryset = queryset.filter(category=category)
+    if sku_pattern:
+        prefix = sku_pattern.rstrip('*')
+        if not any(char in sku_pattern for char in '*?'):
+            queryset = queryset.filter(sku=sku_pattern)
+        elif '*' not in prefix and '?' not in prefix:
+            queryset = queryset.filter(sku__startswith=prefix)
+        else:
+            queryset = queryset.filter(sku__regex=fnmatch.translate(sku_pattern))
+    if method == 'markup':
+        # Sem custo médio não há base para o markup
+        queryset = queryset.filter(average_cost__gt=0)
+    return queryset
+
+
+def price_expression(method, value):
+    """Expressão do novo preço, arredondada a centavos e limitada ao intervalo do campo."""
+    value = Decimal(value)
+    # O fator é calculado aqui: no SQLite, 50 / 100 seria uma divisão inteira
+    factor = Value(1 + value / 100, output_field=DecimalField())
+    if method == 'percent':
+        expression = F('sale_price') * factor
+    elif method == 'amount':
+        expression = F('sale_price') + Value(value, output_field=PRICE_FIELD)
+    elif method == 'markup':
+        expression = F('average_cost') * factor
+    else:
+        raise ValueError(f"Método de reajuste inválido: {method}")
+    expression = ExpressionWrapper(expression, output_field=PRICE_FIELD)
+    return Least(Greatest(Round(expression, 2), Value(Decimal('0.00'))), Value(MAX_PRICE), output_field=PRICE_FIELD)
+
+
+def preview_repricing(company, rule):
+    """
+    Simula a regra sem gravar: quantidade de produtos, soma e média dos preços
+    atuais e dos novos, em uma única consulta agregada.
+    """
+    new_price = price_expression(rule['method'], rule['value'])
+    totals = rule_queryset(company, **_filters(rule)).aggregate(
+        products=Count('pk'),
+        current_total=Sum('sale_price'),
+        new_total=Sum(new_price),
+        current_average=Avg('sale_price'),
+        new_average=Avg(new_price),
+    )
+    return {
+        key: value if key == 'products' else Decimal(value or 0).quantize(Decimal('0.01'))
+        for key, value in totals.items()
+    }
+
+
+def apply_repricing(company, rules):
+    """
+    Aplica as regras em ordem, cada uma com um único UPDATE, na mesma
+    transação. Um produto atingido por mais de uma regra recebe todas, em
+    sequência. Retorna a quantidade de produtos atualizados por regra.
+    """
+    now = timezone.now()
+    updated = []
+    with transaction.atomic():
+        for rule in rules:
+            updated.append(rule_queryset(company, **_filters(rule)).update(
+                sale_price=price_expression(rule['method'], rule['value']),
+                updated_at=now,
+            ))
+        # update() não dispara post_save
+        bump_company_version(company)
+    return updated
+
+
+def _filters(rule):
+    return {
+        'brand': rule.get('brand'),
+        'category': rule.get('category'),
+        'sku_pattern': rule.get('sku_pattern'),
+        'method': rule['method'],
+    }
@@ -0,0 +1,73 @@
+# products/search.py
+"""
+Busca textual de produtos com o índice FTS5 do SQLite (tabela virtual
+`products_product_fts`), criado pela migração 0008 e mantido por triggers no
+próprio banco: inserções, alterações e exclusões de produtos, inclusive em lote,
+e renomeações de marcas e categorias atualizam o índice na mesma transação.
+Cada linha do índice guarda o id do produto (coluna não indexada), e não o
+rowid, que o VACUUM pode renumerar; a tabela `products_product_fts_keys` liga
+o id à linha do índice para que os triggers a encontrem sem varrê-lo.
+
+O tokenizador `unicode61 remove_diacritics 2` ignora acentos ("acucar" encontra
+"Açúcar") e os índices de prefixo tornam rápida a busca por início de palavra.
+Em outros bancos a busca recai em `icontains`.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = 'products_product_fts'
+
+# Colunas do índice e o campo equivalente do modelo (usado fora do SQLite)
+SEARCH_FIELDS = {
+    'name': 'name__icontains',
+    'sku': 'sku__icontains',
+    'brand': 'brand__name__icontains',
+    'category': 'category__name__icontains',
+}
+
+# Pesos do bm25 na ordem das colunas: product_id e company_id (não indexadas), name, sku, brand, category
+RANK_WEIGHTS = '0, 0, 10.0, 8.0, 3.0, 2.0'
+
+
+def match_expression(term, field=None):
+    """
+    Converte o texto digitado em uma expressão MATCH do FTS5: cada palavra vira
+    um prefixo entre aspas (o que neutraliza a sintaxe do FTS5) e todas precisam
+    aparecer. Retorna None se não houver palavras.
+    """
+    words = re.findall(r'\w+', term or '')
+    if not words:
+        return None
+    expression = ' '.join(f'"{word}"*' for word in words)
+    if field:
+        return f'{field} : ({expression})'
+    return expression
+
+
+def search_products(queryset, term, field=None):
+    """
+    Filtra o queryset de produtos pelo texto `term` (opcionalmente só na coluna
+    `field`: name, sku, brand ou category) e ordena pela relevância (bm25).
+    """
+    if field not in SEARCH_FIELDS:
+        field = None
+
+    if connection.vendor != 'sqlite':
+        fields = [SEARCH_FIELDS[field]] if field else SEARCH_FIELDS.values()
+        condition = Q()
+        for lookup in fields:
+            condition |= Q(**{lookup: term})
+        return queryset.filter(condition)
+
+    expression = match_expression(term, field)
+    if expression is None:
+        return queryset.none()
+
+    return queryset.extra(
+        select={'search_rank': f'bm25({FTS_TABLE}, {RANK_WEIGHTS})'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.product_id = products_product.id', f'{FTS_TABLE} MATCH %s'],
+        params=[expression],
+    ).order_by('search_rank', 'name')
@@ -1,3 +1,205 @@
+import io
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Company, CompanyUser, User
+from stock.models import StockMovement
+from . import imports, pricing
+from .models import Brand, Category, Product
+from .search import search_products
+
+
+class ProductListViewTests(TestCase):
+    """
+    A lista de produtos carrega marca, categoria, saldo e valor em estoque na
+    mesma consulta: o número de consultas por página não depende dos produtos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.user = User.objects.create_user(email="a@a.com", password="x")
+        CompanyUser.objects.create(user=cls.user, company=cls.company, role='admin')
+        cls.brand = Brand.objects.create(company=cls.company, name="Marca")
+        cls.category = Category.objects.create(company=cls.company, name="Categoria")
+
+    def setUp(self):
+        # Os IDs das empresas se repetem entre os testes: descarta o cache anterior
+        cache.clear()
+
+    def create_products(self, count):
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            product = Product.objects.create(
+                company=self.company, name=f"Produto {index:02d}", sku=f"P{index:02d}",
+                brand=self.brand, category=self.category, sale_price=Decimal('10.00'),
+            )
+            StockMovement.objects.create(
+                company=self.company, product=product, movement_type=StockMovement.MovementType.PURCHASE,
+                quantity=3, unit_price=Decimal('2.00'),
+            )
+
+    def get_list(self):
+        return self.client.get(reverse('products:product_list'))
+
+    def test_query_count_does_not_grow_with_products(self):
+        self.client.force_login(self.user)
+        self.create_products(2)
+        self.get_list()  # resolve e guarda a empresa ativa na sessão
+
+        # Sessão, usuário, empresa e a página de produtos; o total vem do cache
+        with self.assertNumQueries(4):
+            response = self.get_list()
+        self.assertContains(response, "Produto 01")
+
+        self.create_products(8)
+        with self.assertNumQueries(4):
+            response = self.get_list()
+
+        product = response.context['products'][0]
+        self.assertEqual(product.balance, 3)
+        self.assertEqual(product.stock_value, Decimal('6.00'))
+        self.assertContains(response, "R$10.00")
+
+    def test_cursor_pagination_visits_every_product_once(self):
+        self.client.force_login(self.user)
+        self.create_products(25)
+
+        names, params = [], {}
+        while True:
+            response = self.client.get(reverse('products:product_list'), params)
+            page = response.context['page_obj']
+            names += [product.name for product in page]
+            if not page.has_next():
+                break
+            params = QueryDict(page.next_querystring)
+
+        self.assertEqual(names, sorted(Product.objects.values_list('name', flat=True)))
+        self.assertTrue(page.has_previous())
+
+        # Voltar uma página devolve os mesmos produtos da ida
+        response = self.client.get(reverse('products:product_list'), QueryDict(page.previous_querystring))
+        self.assertEqual([product.name for product in response.context['page_obj']], names[10:20])
+
+    def test_invalid_cursor_returns_404(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('products:product_list'), {'after': 'invalido'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTests(TestCase):
+    """
+    Busca pelo índice FTS5: prefixos, sem diferenciar acentos, e mantida pelos
+    triggers do banco quando produtos, marcas e categorias mudam.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.brand = Brand.objects.create(company=cls.company, name="Doçura")
+        cls.category = Category.objects.create(company=cls.company, name="Mercearia")
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            company=self.company, name="Açúcar Cristal", sku="ACU-01",
+            brand=self.brand, category=self.category, sale_price=Decimal('5.00'),
+        )
+        Product.objects.create(company=self.company, name="Café Torrado", sku="CAF-01", sale_price=Decimal('12.00'))
+
+    def search(self, term, field=None):
+        return list(search_products(Product.objects.filter(company=self.company), term, field))
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search("cris"), [self.product])
+        self.assertEqual(self.search("acu-0", field='sku'), [self.product])
+
+    def test_accent_insensitive_match(self):
+        self.assertEqual(self.search("acucar"), [self.product])
+        self.assertEqual(self.search("ACÚCAR"), [self.product])
+        self.assertEqual(self.search("docura", field='brand'), [self.product])
+
+    def test_update_keeps_index_in_sync(self):
+        Product.objects.filter(pk=self.product.pk).update(name="Mascavo Orgânico")
+        self.assertEqual(self.search("cristal"), [])
+        self.assertEqual(self.search("organico"), [self.product])
+
+        self.brand.name = "Doce Lar"
+        self.brand.save()
+        self.assertEqual(self.search("lar", field='brand'), [self.product])
+        self.assertEqual(self.search("docura"), [])
+
+    def test_delete_removes_from_index(self):
+        self.product.delete()
+        self.assertEqual(self.search("acucar"), [])
+        self.assertEqual([product.name for product in self.search("cafe")], ["Café Torrado"])
+
+
+class ProductImportTests(TestCase):
+    """
+    A importação atualiza os produtos existentes pelo SKU, cria os novos e as
+    marcas que faltam, e não grava nada se houver linhas inválidas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.product = Product.objects.create(company=cls.company, name="Antigo", sku="A1", sale_price=Decimal('1.00'))
+
+    def run_import(self, content, **kwargs):
+        columns, rows = imports.read_rows(io.BytesIO(content.encode()), 'csv')
+        return imports.import_products(self.company, columns, rows, **kwargs)
+
+    def test_upsert_by_sku(self):
+        imported, errors = self.run_import("sku;name;brand;sale_price\nA1;Novo Nome;Marca X;1.234,50\nB2;Outro;Marca X;2\n")
+
+        self.assertEqual((imported, errors), (2, []))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "Novo Nome")
+        self.assertEqual(self.product.sale_price, Decimal('1234.50'))
+        self.assertEqual(Product.objects.get(sku="B2").brand, self.product.brand)
+        self.assertEqual(Brand.objects.filter(company=self.company).count(), 1)
+
+    def test_invalid_rows_roll_back(self):
+        imported, errors = self.run_import("sku,name,sale_price\nC3,Novo,5\nD4,,abc\n")
+
+        self.assertEqual(imported, 0)
+        self.assertEqual(errors, [{'row': 3, 'errors': {'name': "Campo obrigatório.", 'sale_price': "Informe um preço de venda válido."}}])
+        self.assertFalse(Product.objects.filter(sku="C3").exists())
+
+
+class RepricingTests(TestCase):
+    """Cada regra de reajuste atinge só os produtos filtrados, com um único UPDATE."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        for sku, cost in (("ACME-1", '4.00'), ("ACME-2", '0.00'), ("OUTRO-1", '4.00')):
+            Product.objects.create(
+                company=cls.company, name=sku, sku=sku, sale_price=Decimal('10.00'), average_cost=Decimal(cost),
+            )
+
+    def prices(self):
+        return dict(Product.objects.values_list('sku', 'sale_price'))
+
+    def test_preview_does_not_write(self):
+        preview = pricing.preview_repricing(self.company, {'method': 'percent', 'value': Decimal('12.5'), 'sku_pattern': 'ACME-*'})
+
+        self.assertEqual(preview['products'], 2)
+        self.assertEqual(preview['new_total'], Decimal('22.50'))
+        self.assertEqual(set(self.prices().values()), {Decimal('10.00')})
+
+    def test_apply_rules_in_order(self):
+        # Um UPDATE por regra, entre a abertura e a liberação do savepoint
+        with self.assertNumQueries(4):
+            updated = pricing.apply_repricing(self.company, [
+                {'method': 'amount', 'value': Decimal('-1'), 'sku_pattern': 'ACME-?'},
+                {'method': 'markup', 'value': Decimal('50')},
+            ])
 
-# Create your tests here.
+        # O markup ignora o produto sem custo médio
+        self.assertEqual(updated, [2, 2])
+        self.assertEqual(self.prices(), {'ACME-1': Decimal('6.00'), 'ACME-2': Decimal('9.00'), 'OUTRO-1': Decimal('6.00')})
@@ -19,6 +19,8 @@ urlpatterns = [
     # URLs para Produtos
     path('', views.ProductListView.as_view(), name='product_list'), # URL para listar produtos
     path('create/', views.ProductCreateView.as_view(), name='product_create'),
+    path('import/', views.ProductImportView.as_view(), name='product_import'),
+    path('reprice/', views.ProductRepricingView.as_view(), name='product_reprice'),
     path('<uuid:pk>/update/', views.ProductUpdateView.as_view(), name='product_update'),
     path('<uuid:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
 ]
@@ -1,18 +1,20 @@
-from django.db.models import Q
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin # Para exigir login
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, render
-from app.mixins import CompanyFilteredMixin, CompanyAssignMixin
+from app.mixins import CompanyFilteredMixin, CompanyAssignMixin, KeysetPaginationMixin
 
-from . import models, forms
+from . import imports, models, forms, pricing
+from .search import search_products
 from core.models import Company # Importamos Company para filtrar por empresa
 
 # --- Views para Marcas (Brand) ---
 
-class BrandListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
+class BrandListView(LoginRequiredMixin, CompanyFilteredMixin, KeysetPaginationMixin, ListView):
     model = models.Brand
     template_name = 'products/brand_list.html'
     context_object_name = 'brands'
@@ -23,7 +25,7 @@ class BrandListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
         query = self.request.GET.get('q')
         if query:
             qs = qs.filter(name__icontains=query)
-        return qs.order_by('name')
+        return qs
 
 class BrandCreateView(LoginRequiredMixin, CompanyFilteredMixin, CompanyAssignMixin, CreateView):
     model = models.Brand
@@ -84,7 +86,7 @@ class BrandDeleteView(LoginRequiredMixin, CompanyFilteredMixin, DeleteView):
 
 # --- Views para Categorias (Category) ---
 
-class CategoryListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
+class CategoryListView(LoginRequiredMixin, CompanyFilteredMixin, KeysetPaginationMixin, ListView):
     model = models.Category
     template_name = 'products/category_list.html'
     context_object_name = 'categories'
@@ -147,41 +149,45 @@ class CategoryDeleteView(LoginRequiredMixin, CompanyFilteredMixin, DeleteView):
     
     
 # --- Views para Produtos (Product) ---
-class ProductListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
+class ProductListView(LoginRequiredMixin, CompanyFilteredMixin, KeysetPaginationMixin, ListView):
+    """
+    Lista os produtos com marca, categoria, saldo e valor em estoque carregados
+    na mesma consulta, de modo que o número de consultas por página é fixo.
+    Pagina por cursor sobre o nome; a busca mantém a ordem por relevância.
+    """
     model = models.Product
     template_name = 'products/product_list.html'
     context_object_name = 'products'
     paginate_by = 10
+    approximate_count = True
 
     def get_queryset(self):
-        # Chama o queryset padrão
-        queryset = super().get_queryset()
+        # Marca e categoria por JOIN; saldo e valor a partir do saldo materializado
+        queryset = super().get_queryset().select_related('brand', 'category').annotate(
+            balance=Coalesce('stock_balance__quantity', Value(0)),
+        ).annotate(
+            stock_value=ExpressionWrapper(
+                F('balance') * F('average_cost'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
 
         # Obtém os parâmetros da URL
         query = self.request.GET.get('q')
         filter_by = self.request.GET.get('filter_by')
 
-        # Se a pesquisa e o filtro existirem, filtra os produtos
-        if query and filter_by:
-            # Dicionário para mapear os valores do select aos campos do modelo
-            filter_map = {
-                'name': 'name__icontains',
-                'brand': 'brand__name__icontains',
-                'category': 'category__name__icontains',
-                'sku': 'sku__icontains',
-            }
-
-            # Obtém o parâmetro de filtro, com 'name__icontains' como padrão
-            filter_param = filter_map.get(filter_by, 'name__icontains')
-
-            # Filtra o queryset usando a busca dinâmica
-            queryset = queryset.filter(
-                Q(**{filter_param: query})
-            )
+        # Busca no índice textual (nome, SKU, marca e categoria), ordenada por
+        # relevância; `filter_by` restringe a busca a um desses campos
+        if query:
+            queryset = search_products(queryset, query, filter_by)
 
         # Retorna o queryset final, que pode ou não estar filtrado
         return queryset
 
+    def get_keyset_field(self):
+        # A ordem por relevância da busca não serve de cursor: usa páginas numeradas
+        return None if self.request.GET.get('q') else 'name'
+
 
 class ProductCreateView(LoginRequiredMixin, CompanyFilteredMixin, CompanyAssignMixin, CreateView):
     model = models.Product
@@ -229,4 +235,76 @@ class ProductDeleteView(LoginRequiredMixin, CompanyFilteredMixin, DeleteView):
         brand_name = self.object.name
         self.object.delete()
         messages.success(self.request, f'A marca "{brand_name}" foi excluída com sucesso.')
-        return HttpResponseRedirect(self.get_success_url())
\ No newline at end of file
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class ProductImportView(LoginRequiredMixin, FormView):
+    """
+    Importa o catálogo a partir de uma planilha CSV ou XLSX, atualizando os
+    produtos pelo SKU (ver products.imports). Os erros são listados por linha.
+    """
+    template_name = 'products/product_import.html'
+    form_class = forms.ProductImportForm
+    success_url = reverse_lazy('products:product_list')
+    # Erros exibidos na página; a contagem total é sempre mostrada
+    max_errors_shown = 100
+
+    def form_valid(self, form):
+        company = self.request.company
+        if not company:
+            form.add_error(None, "Usuário não associado a uma empresa ativa.")
+            return self.form_invalid(form)
+
+        file = form.cleaned_data['file']
+        try:
+            columns, rows = imports.read_rows(file, form.file_format(file))
+            imported, errors = imports.import_products(
+                company, columns, rows, partial=form.cleaned_data['partial'],
+            )
+        except imports.ImportFileError as e:
+            form.add_error('file', str(e))
+            return self.form_invalid(form)
+
+        if imported:
+            messages.success(self.request, f"{imported} produto(s) importado(s) com sucesso.")
+        if not errors:
+            return HttpResponseRedirect(self.get_success_url())
+
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            imported=imported,
+            error_count=len(errors),
+            errors=errors[:self.max_errors_shown],
+        ))
+
+
+class ProductRepricingView(LoginRequiredMixin, FormView):
+    """
+    Reajusta o preço de venda dos produtos filtrados por marca, categoria e/ou
+    padrão de SKU (ver products.pricing). O botão "Simular" mostra a prévia sem
+    gravar; "Aplicar" grava o reajuste.
+    """
+    template_name = 'products/product_reprice.html'
+    form_class = forms.ProductRepricingForm
+    success_url = reverse_lazy('products:product_list')
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['company'] = self.request.company
+        return kwargs
+
+    def form_valid(self, form):
+        company = self.request.company
+        if not company:
+            form.add_error(None, "Usuário não associado a uma empresa ativa.")
+            return self.form_invalid(form)
+
+        rule = form.cleaned_data
+        if 'apply' not in self.request.POST:
+            return self.render_to_response(self.get_context_data(
+                form=form, preview=pricing.preview_repricing(company, rule),
+            ))
+
+        updated, = pricing.apply_repricing(company, [rule])
+        messages.success(self.request, f"Preço de venda reajustado em {updated} produto(s).")
+        return HttpResponseRedirect(self.get_success_url())
@@ -0,0 +1,126 @@
+# purchases/aging.py
+"""
+Envelhecimento (aging) das contas a pagar. As parcelas em aberto (pendentes
+ou vencidas, de notas não canceladas) são distribuídas em faixas pelos dias
+de atraso em relação a `today`. O resumo por fornecedor é calculado com uma
+única consulta de agregação condicional (uma soma por faixa); o total geral
+é somado em memória sobre as linhas do resumo. A exportação lê as parcelas
+em lotes, como a do histórico de estoque (ver stock.exports).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from core.streaming import csv_lines
+from .models import PayableAccount, PurchaseInvoice
+
+CENTS = Decimal('0.01')
+
+OPEN_STATUSES = (PayableAccount.PaymentStatus.PENDING, PayableAccount.PaymentStatus.OVERDUE)
+
+# (chave, rótulo, menor e maior atraso em dias); None deixa a faixa aberta
+BUCKETS = (
+    ('current', "A vencer", None, 0),
+    ('days_1_30', "1 a 30 dias", 1, 30),
+    ('days_31_60', "31 a 60 dias", 31, 60),
+    ('days_61_90', "61 a 90 dias", 61, 90),
+    ('days_over_90', "Mais de 90 dias", 91, None),
+)
+BUCKET_LABELS = {key: label for key, label, _, _ in BUCKETS}
+
+EXPORT_HEADER = (
+    'supplier', 'supplier_cnpj', 'invoice_number', 'issue_date', 'due_date',
+    'days_overdue', 'bucket', 'amount', 'status',
+)
+
+
+def open_installments(company):
+    """Parcelas em aberto da empresa, pelo índice (company, status, due_date)."""
+    return PayableAccount.objects.filter(company=company, status__in=OPEN_STATUSES).exclude(
+        invoice__status=PurchaseInvoice.InvoiceStatus.CANCELED,
+    )
+
+
+def bucket_filter(key, today):
+    """Condição sobre o vencimento das parcelas da faixa `key`."""
+    for bucket, _, low, high in BUCKETS:
+        if bucket == key:
+            # Atraso entre low e high dias: vencimento entre today - high e today - low
+            condition = Q()
+            if high is not None:
+                condition &= Q(due_date__gte=today - timedelta(days=high))
+            if low is not None:
+                condition &= Q(due_date__lte=today - timedelta(days=low))
+            return condition
+    raise ValueError(f"Faixa de vencimento desconhecida: {key}")
+
+
+def bucket_for(due_date, today):
+    days = (today - due_date).days
+    for key, _, low, high in BUCKETS:
+        if (low is None or days >= low) and (high is None or days <= high):
+            return key
+
+
+def aging_summary(company, today=None):
+    """
+    Resumo por fornecedor: soma das parcelas em aberto em cada faixa, total e
+    quantidade de parcelas, do maior saldo para o menor. Retorna
+    {'today', 'suppliers': [linhas], 'totals': {faixa: soma, ...}} com uma
+    única consulta, qualquer que seja o número de parcelas.
+    """
+    today = today or timezone.localdate()
+    zero = Decimal('0.00')
+    sums = {
+        key: Sum('amount', filter=bucket_filter(key, today), default=zero)
+        for key, _, _, _ in BUCKETS
+    }
+    suppliers = list(
+        open_installments(company)
+        .values(supplier_id=F('invoice__supplier_id'), supplier_name=F('invoice__supplier__name'))
+        .annotate(**sums, total=Sum('amount', default=zero), installments=Count('pk'))
+        .order_by('-total', 'supplier_name')
+    )
+
+    amounts = (*sums, 'total')
+    totals = {key: zero for key in amounts}
+    totals['installments'] = 0
+    for row in suppliers:
+        for key in amounts:
+            # O SQLite soma decimais como ponto flutuante
+            row[key] = Decimal(row[key]).quantize(CENTS)
+        for key in totals:
+            totals[key] += row[key]
+    return {'today': today, 'suppliers': suppliers, 'totals': totals}
+
+
+def drilldown_queryset(company, today, supplier=None, bucket=None):
+    """Parcelas em aberto de um fornecedor e/ou de uma faixa, para a lista e a exportação."""
+    queryset = open_installments(company)
+    if supplier:
+        queryset = queryset.filter(invoice__supplier_id=supplier)
+    if bucket:
+        queryset = queryset.filter(bucket_filter(bucket, today))
+    return queryset
+
+
+def export_rows(queryset, today, chunk_size=2000):
+    """
+    Gera as linhas da exportação (na ordem de EXPORT_HEADER) por vencimento,
+    lendo as parcelas em lotes; a faixa e os dias de atraso são calculados aqui.
+    """
+    rows = queryset.order_by('due_date', 'pk').values_list(
+        'invoice__supplier__name', 'invoice__supplier__cnpj', 'invoice__invoice_number',
+        'invoice__issue_date', 'due_date', 'amount', 'status',
+    )
+    for name, cnpj, number, issue_date, due_date, amount, status in rows.iterator(chunk_size=chunk_size):
+        yield (
+            name, cnpj, number, issue_date.isoformat(), due_date.isoformat(),
+            max((today - due_date).days, 0), BUCKET_LABELS[bucket_for(due_date, today)], amount, status,
+        )
+
+
+def stream_csv(rows):
+    return csv_lines(EXPORT_HEADER, rows)
@@ -1,18 +1,45 @@
 # purchases/forms.py
 
+import uuid
+
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.utils.functional import cached_property
+from . import services
 from .models import PurchaseInvoice, PurchaseInvoiceItem, PayableAccount
-from suppliers.models import Supplier
+from core.forms import CompanyModelChoiceField, company_choices
 from products.models import Product
 
+class MoneyField(forms.DecimalField):
+    """
+    Valor em reais como digitado nos campos com máscara (1.234,56), aceitando
+    também o formato com ponto decimal (1234.56).
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('min_value', 0)
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if isinstance(value, str) and ',' in value:
+            value = value.replace('.', '').replace(',', '.')
+        return super().to_python(value)
+
+
 class PurchaseInvoiceForm(forms.ModelForm):
     """
-    Formulário para o cabeçalho da Nota de Compra.
+    Formulário para o cabeçalho da Nota de Compra. Subtotal e total não são
+    recebidos do navegador: são calculados a partir dos itens ao gravar a nota
+    (ver purchases.services.create_invoice).
     """
     class Meta:
         model = PurchaseInvoice
-        fields = ['supplier', 'invoice_number', 'issue_date']
+        fields = ['supplier', 'invoice_number', 'issue_date', 'discount', 'freight', 'other_costs']
+        field_classes = {
+            'supplier': CompanyModelChoiceField,
+            'discount': MoneyField,
+            'freight': MoneyField,
+            'other_costs': MoneyField,
+        }
         widgets = {
             'issue_date': forms.DateInput(
                 attrs={'type': 'date', 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white'}
@@ -22,11 +49,11 @@ class PurchaseInvoiceForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
+        company = kwargs.pop('company', None)
         super().__init__(*args, **kwargs)
         
-        if user and hasattr(user, 'company') and user.company:
-            self.fields['supplier'].queryset = Supplier.objects.filter(company=user.company)
+        if company:
+            self.fields['supplier'].bind_company(company)
 
 class PurchaseInvoiceItemForm(forms.ModelForm):
     """
@@ -35,6 +62,7 @@ class PurchaseInvoiceItemForm(forms.ModelForm):
     class Meta:
         model = PurchaseInvoiceItem
         fields = ('product', 'quantity', 'unit_cost')
+        field_classes = {'product': CompanyModelChoiceField, 'unit_cost': MoneyField}
         widgets = {
             'product': forms.Select(attrs={'class': 'select2-field w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white'}),
             'quantity': forms.NumberInput(attrs={'class': 'quantity-item w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'placeholder': 'Quantidade'}),
@@ -43,15 +71,65 @@ class PurchaseInvoiceItemForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         company = kwargs.pop('company', None)
+        product_choices = kwargs.pop('product_choices', None)
+        products = kwargs.pop('products', None)
         super().__init__(*args, **kwargs)
 
         if company:
-            self.fields['product'].queryset = Product.objects.filter(company=company)
+            # Opções do cache da empresa; no formset, lidas uma vez para todas as linhas
+            self.fields['product'].bind_company(company, choices=product_choices, instances=products)
+
+    def clean_quantity(self):
+        quantity = self.cleaned_data.get('quantity')
+        if quantity is not None and not services.valid_quantity(quantity):
+            raise forms.ValidationError(services.QUANTITY_ERROR)
+        return quantity
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # O produto já foi validado pelo campo contra os produtos da empresa: evita
+        # que a validação do modelo consulte o banco novamente a cada linha
+        exclude.add('product')
+        return exclude
+
+
+class BaseInvoiceItemFormSet(BaseInlineFormSet):
+    """
+    Formset dos itens da nota. A lista de produtos é lida do cache da empresa
+    uma única vez para todas as linhas, e os produtos escolhidos são carregados
+    em uma única consulta, compartilhada pelos formulários na validação.
+    """
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['product_choices'] = self.product_choices
+        kwargs['products'] = self.selected_products
+        return kwargs
+
+    @cached_property
+    def product_choices(self):
+        company = self.form_kwargs.get('company')
+        return company_choices(company, Product) if company else None
+
+    @cached_property
+    def selected_products(self):
+        company = self.form_kwargs.get('company')
+        if not self.is_bound or not company:
+            return None
+        ids = set()
+        for index in range(self.total_form_count()):
+            try:
+                ids.add(uuid.UUID(str(self.data.get(f'{self.add_prefix(index)}-product'))))
+            except ValueError:
+                continue
+        products = Product.objects.filter(company=company, pk__in=ids)
+        return {str(product.pk): product for product in products}
+
 
 InvoiceItemFormSet = inlineformset_factory(
     PurchaseInvoice,
     PurchaseInvoiceItem,
     form=PurchaseInvoiceItemForm,
+    formset=BaseInvoiceItemFormSet,
     fields=('product', 'quantity', 'unit_cost'),
     extra=0, 
     can_delete=True,
@@ -65,6 +143,7 @@ class PayableAccountForm(forms.ModelForm):
     class Meta:
         model = PayableAccount
         fields=('due_date', 'amount')
+        field_classes = {'amount': MoneyField}
         widgets={
             'due_date': forms.DateInput(
                 attrs={'type': 'date', 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-green-500 dark:bg-gray-700 dark:border-gray-600 dark:text-white'}),
@@ -81,3 +160,37 @@ PayableAccountFormSet = inlineformset_factory(
     extra=1, 
     can_delete=True,
 )
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """Campo de arquivo que aceita vários arquivos; retorna a lista."""
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            return [super(MultipleFileField, self).clean(item, initial) for item in data]
+        return [super().clean(data, initial)]
+
+
+class NFeImportForm(forms.Form):
+    """Envio dos XML de NF-e de compra (ver purchases.nfe)."""
+    max_files = 500
+
+    files = MultipleFileField(
+        label='Arquivos XML da NF-e',
+        widget=MultipleFileInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg dark:bg-gray-700 dark:border-gray-600 dark:text-white', 'accept': '.xml'}),
+    )
+
+    def clean_files(self):
+        files = self.cleaned_data['files']
+        if len(files) > self.max_files:
+            raise forms.ValidationError(f"Envie no máximo {self.max_files} arquivos por vez.")
+        if any(not file.name.lower().endswith('.xml') for file in files):
+            raise forms.ValidationError("Envie apenas arquivos .xml.")
+        return files
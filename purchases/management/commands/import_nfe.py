@@ -0,0 +1,67 @@
+# purchases/management/commands/import_nfe.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.models import Company
+from purchases import nfe
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa as NF-e (XML) de compra de um diretório, criando as notas, itens e parcelas "
+        "(ver purchases.nfe). Os arquivos são lidos em processos paralelos e gravados em lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company', type=int, help="ID da empresa.")
+        parser.add_argument('directory', help="Diretório com os arquivos .xml (inclui subdiretórios).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processos de leitura.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Notas gravadas por lote.")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Empresa {options['company']} não encontrada.")
+
+        directory = Path(options['directory'])
+        if not directory.is_dir():
+            raise CommandError(f"Diretório não encontrado: {directory}")
+        paths = sorted(path for path in directory.rglob('*') if path.suffix.lower() == '.xml')
+        if not paths:
+            raise CommandError(f"Nenhum arquivo .xml em {directory}")
+
+        parse_errors = []
+
+        def documents(results):
+            # A gravação acontece neste processo, enquanto os demais continuam lendo
+            for path, document, error in results:
+                if error:
+                    parse_errors.append({'file': path, 'errors': [error]})
+                else:
+                    yield path, document
+
+        workers = max(options['workers'], 1)
+        if workers == 1:
+            imported, errors = nfe.import_invoices(
+                company, documents(map(nfe.parse_nfe_file, paths)), batch_size=options['batch_size'],
+            )
+        else:
+            # Os processos de leitura não usam o banco: não devem herdar a conexão aberta
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(nfe.parse_nfe_file, paths, chunksize=max(len(paths) // (workers * 4), 1))
+                imported, errors = nfe.import_invoices(
+                    company, documents(results), batch_size=options['batch_size'],
+                )
+
+        errors = parse_errors + errors
+        for error in errors:
+            self.stderr.write(f"{error['file']}: {' '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} nota(s) importada(s) de {len(paths)} arquivo(s), {len(errors)} arquivo(s) com erro."
+        ))
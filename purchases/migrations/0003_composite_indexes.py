@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('purchases', '0002_purchaseinvoice_discount_purchaseinvoice_freight_and_more'),
+        ('suppliers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payableaccount',
+            index=models.Index(fields=['company', 'status', 'due_date'], name='payable_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseinvoice',
+            index=models.Index(fields=['company', '-issue_date'], name='purchase_inv_company_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseinvoice',
+            index=models.Index(fields=['company', 'status'], name='purchase_inv_status_idx'),
+        ),
+    ]
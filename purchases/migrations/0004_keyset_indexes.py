@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='purchaseinvoice',
+            name='purchase_inv_company_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='payableaccount',
+            index=models.Index(fields=['company', 'due_date', 'id'], name='payable_company_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseinvoice',
+            index=models.Index(fields=['company', '-issue_date', '-id'], name='purchase_inv_company_date_idx'),
+        ),
+    ]
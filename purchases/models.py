@@ -30,6 +30,12 @@ class PurchaseInvoice(models.Model):
         verbose_name = "Nota de Compra"
         verbose_name_plural = "Notas de Compra"
         unique_together = ('company', 'supplier', 'invoice_number')
+        indexes = [
+            # Listagem de notas da empresa, mais recentes primeiro; o id decrescente
+            # desempata na mesma ordem do cursor (-issue_date, -pk), sem ordenar à parte
+            models.Index(fields=['company', '-issue_date', '-id'], name='purchase_inv_company_date_idx'),
+            models.Index(fields=['company', 'status'], name='purchase_inv_status_idx'),
+        ]
 
     def __str__(self):
         return f"Nota {self.invoice_number} - {self.supplier.name}"
@@ -62,4 +68,11 @@ class PayableAccount(models.Model):
     class Meta:
         verbose_name = "Conta a Pagar"
         verbose_name_plural = "Contas a Pagar"
-        ordering = ['due_date']
\ No newline at end of file
+        ordering = ['due_date']
+        indexes = [
+            # Contas em aberto/vencidas da empresa por vencimento
+            models.Index(fields=['company', 'status', 'due_date'], name='payable_status_due_idx'),
+            # Parcelas em aberto por vencimento, na ordem do cursor do painel de aging:
+            # com status IN (pendente, vencida) o índice acima exige ordenar à parte
+            models.Index(fields=['company', 'due_date', 'id'], name='payable_company_due_idx'),
+        ]
\ No newline at end of file
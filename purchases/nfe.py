@@ -0,0 +1,249 @@
+# purchases/nfe.py
+"""
+Importação de NF-e (XML) de compra. Cada arquivo é lido em fluxo com
+iterparse: apenas os grupos usados (ide, emit, det, total, dup) são mantidos
+e os elementos são descartados à medida que são lidos. A leitura não acessa o
+banco, portanto pode ser feita em processos paralelos (ver o comando
+`import_nfe`). A gravação resolve fornecedores pelo CNPJ e produtos pelo EAN
+(cEAN) ou, sem correspondência, pelo SKU (cProd) com mapas carregados uma única vez, e cria as notas,
+seus itens e as parcelas (duplicatas) com bulk_create em lotes.
+"""
+import re
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from xml.etree.ElementTree import ParseError, iterparse
+
+from django.db import transaction
+
+from products.models import Product
+from suppliers.models import Supplier
+from . import services
+from .models import PayableAccount, PurchaseInvoice, PurchaseInvoiceItem
+
+CENTS = Decimal('0.01')
+
+# Grupos descartados após a leitura; os itens (det) podem ser milhares por nota
+CLEARED_GROUPS = {'ide', 'emit', 'det', 'total', 'cobr'}
+
+# Acréscimos do ICMSTot que compõem o vNF além de frete e outras despesas
+# (seguro, IPI, ST, FCP-ST, imposto de importação); entram em "outras despesas"
+EXTRA_CHARGES = ('vOutro', 'vSeg', 'vIPI', 'vIPIDevol', 'vST', 'vFCPST', 'vII')
+
+
+class NFeError(Exception):
+    """Arquivo que não é uma NF-e legível."""
+
+
+def _tag(element):
+    # Remove o namespace do portal da NF-e: {http://www.portalfiscal.inf.br/nfe}det -> det
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _children(element):
+    return {_tag(child): (child.text or '').strip() for child in element}
+
+
+def _decimal(value, field):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise NFeError(f"Valor inválido em {field}: {value!r}")
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def parse_nfe(file):
+    """
+    Lê uma NF-e (caminho ou arquivo binário) e retorna um dicionário com
+    número, data de emissão, CNPJ do emitente, itens, frete, outras despesas
+    (vOutro somado a seguro, IPI e ST), desconto, valor total (vNF) e
+    duplicatas. Levanta NFeError se o XML for inválido ou não
+    tiver os grupos obrigatórios.
+    """
+    document = {'items': [], 'installments': [], 'freight': Decimal('0'), 'other_costs': Decimal('0'),
+                'discount': Decimal('0')}
+    try:
+        for _, element in iterparse(file):
+            tag = _tag(element)
+            if tag == 'ide':
+                values = _children(element)
+                document['invoice_number'] = values.get('nNF', '')
+                # dhEmi (versão 3.10+) traz data e hora; dEmi (versões anteriores) só a data
+                issued = values.get('dhEmi') or values.get('dEmi') or ''
+                try:
+                    document['issue_date'] = date.fromisoformat(issued[:10])
+                except ValueError:
+                    raise NFeError(f"Data de emissão inválida: {issued!r}")
+            elif tag == 'emit':
+                values = _children(element)
+                document['supplier_cnpj'] = _digits(values.get('CNPJ'))
+                document['supplier_name'] = values.get('xNome', '')
+            elif tag == 'prod':
+                values = _children(element)
+                ean = values.get('cEAN', '')
+                document['items'].append({
+                    'code': values.get('cProd', ''),
+                    # Itens sem código de barras vêm com cEAN "SEM GTIN"
+                    'ean': ean if ean.isdigit() else '',
+                    'description': values.get('xProd', ''),
+                    'quantity': _decimal(values.get('qCom'), 'qCom'),
+                    'total': _decimal(values.get('vProd'), 'vProd'),
+                })
+            elif tag == 'ICMSTot':
+                values = _children(element)
+                document['freight'] = _decimal(values.get('vFrete') or '0', 'vFrete')
+                document['other_costs'] = sum(
+                    (_decimal(values.get(field) or '0', field) for field in EXTRA_CHARGES), Decimal('0'),
+                )
+                document['discount'] = _decimal(values.get('vDesc') or '0', 'vDesc')
+                if values.get('vNF'):
+                    document['total'] = _decimal(values['vNF'], 'vNF')
+            elif tag == 'dup':
+                values = _children(element)
+                try:
+                    due_date = date.fromisoformat(values.get('dVenc', ''))
+                except ValueError:
+                    raise NFeError(f"Vencimento de duplicata inválido: {values.get('dVenc')!r}")
+                document['installments'].append({
+                    'due_date': due_date, 'amount': _decimal(values.get('vDup'), 'vDup'),
+                })
+            if tag in CLEARED_GROUPS:
+                # Grupo já lido: libera a memória dos seus elementos
+                element.clear()
+    except ParseError as e:
+        raise NFeError(f"XML inválido: {e}")
+
+    if not document.get('invoice_number') or not document.get('supplier_cnpj'):
+        raise NFeError("O arquivo não é uma NF-e: faltam os grupos ide/emit.")
+    if not document['items']:
+        raise NFeError("A NF-e não tem itens.")
+    return document
+
+
+def parse_nfe_file(path):
+    """
+    Versão de parse_nfe para os processos de leitura: retorna (caminho,
+    documento, erro) em vez de levantar a exceção.
+    """
+    try:
+        return str(path), parse_nfe(str(path)), None
+    except (NFeError, OSError) as e:
+        return str(path), None, str(e)
+
+
+def import_invoices(company, documents, batch_size=500):
+    """
+    Grava as notas de `documents`, uma sequência de (nome, documento) com os
+    documentos de parse_nfe. Fornecedores e produtos da empresa são carregados
+    uma única vez; notas, itens e parcelas são inseridos com bulk_create a cada
+    `batch_size` notas. Cada arquivo é gravado ou recusado por inteiro: os
+    recusados (fornecedor ou produto não cadastrado, nota já lançada, total
+    diferente do vNF, parcelas que não somam o total) não impedem os demais.
+
+    Retorna (quantidade_importada, erros), onde `erros` é uma lista de
+    {'file': nome, 'errors': [mensagens]}.
+    """
+    suppliers = {
+        _digits(cnpj): pk for pk, cnpj in Supplier.objects.filter(company=company).values_list('pk', 'cnpj')
+    }
+    by_sku, by_ean = {}, {}
+    for pk, sku, ean in Product.objects.filter(company=company).values_list('pk', 'sku', 'ean'):
+        if sku:
+            by_sku[sku] = pk
+        if ean:
+            by_ean[ean] = pk
+    existing = set(
+        PurchaseInvoice.objects.filter(company=company).values_list('supplier_id', 'invoice_number')
+    )
+
+    def build(document):
+        errors = []
+        supplier_id = suppliers.get(document['supplier_cnpj'])
+        if supplier_id is None:
+            errors.append(
+                f"Fornecedor {document['supplier_name']} (CNPJ {document['supplier_cnpj']}) não cadastrado."
+            )
+        elif (supplier_id, document['invoice_number']) in existing:
+            errors.append(f"A nota {document['invoice_number']} deste fornecedor já foi lançada.")
+
+        invoice = PurchaseInvoice(
+            company=company,
+            supplier_id=supplier_id,
+            invoice_number=document['invoice_number'],
+            issue_date=document['issue_date'],
+            discount=document['discount'].quantize(CENTS),
+            freight=document['freight'].quantize(CENTS),
+            other_costs=document['other_costs'].quantize(CENTS),
+        )
+        items, products_total = [], Decimal('0')
+        for item in document['items']:
+            # O GTIN identifica o produto; o cProd é o código do fornecedor e só
+            # serve quando coincide com o nosso SKU e não há GTIN cadastrado
+            product_id = (by_ean.get(item['ean']) if item['ean'] else None) or by_sku.get(item['code'])
+            if product_id is None:
+                errors.append(f"Produto não cadastrado: {item['code']} - {item['description']}.")
+                continue
+            quantity = item['quantity']
+            if not services.valid_quantity(quantity):
+                # qCom pode ter até 4 casas, mas o estoque é controlado em unidades inteiras
+                errors.append(f"Quantidade inválida para {item['code']}: {quantity} (use unidades inteiras).")
+                continue
+            quantity = quantity.quantize(CENTS)
+            items.append(PurchaseInvoiceItem(
+                invoice=invoice,
+                product_id=product_id,
+                quantity=quantity,
+                # O valor do item (vProd) define o custo, pois vUnCom pode ter até 10 casas
+                unit_cost=(item['total'] / quantity).quantize(CENTS, rounding=ROUND_HALF_UP),
+            ))
+            products_total += item['total']
+
+        # Totais calculados da mesma forma que nas notas digitadas, conferidos com o vNF
+        services.invoice_totals(invoice, items)
+        # O custo unitário tem 2 casas: a diferença de arredondamento para a soma dos
+        # vProd entra em outras despesas e é rateada entre os itens na finalização
+        invoice.other_costs += products_total.quantize(CENTS) - invoice.subtotal
+        total = services.invoice_totals(invoice, items)
+        if not errors and document.get('total') is not None and total != document['total'].quantize(CENTS):
+            errors.append(
+                f"O total calculado (R$ {total:.2f}) difere do valor da NF-e (R$ {document['total']:.2f})."
+            )
+        installments = [
+            PayableAccount(company=company, invoice=invoice, due_date=dup['due_date'], amount=dup['amount'].quantize(CENTS))
+            for dup in document['installments']
+        ]
+        if installments and not errors:
+            installments_total = sum(installment.amount for installment in installments)
+            if installments_total != total:
+                errors.append(
+                    f"A soma das duplicatas (R$ {installments_total:.2f}) difere do total da nota (R$ {total:.2f})."
+                )
+        return invoice, items, installments, errors
+
+    def flush(batch):
+        with transaction.atomic():
+            PurchaseInvoice.objects.bulk_create([invoice for invoice, _, _ in batch])
+            # Os itens e parcelas apontam para as notas, que agora têm ID
+            PurchaseInvoiceItem.objects.bulk_create([item for _, items, _ in batch for item in items], batch_size=1000)
+            PayableAccount.objects.bulk_create(
+                [installment for _, _, installments in batch for installment in installments], batch_size=1000,
+            )
+        return len(batch)
+
+    imported, errors, batch = 0, [], []
+    for name, document in documents:
+        invoice, items, installments, document_errors = build(document)
+        if document_errors:
+            errors.append({'file': name, 'errors': document_errors})
+            continue
+        # Uma mesma nota repetida no lote é lançada uma única vez
+        existing.add((invoice.supplier_id, invoice.invoice_number))
+        batch.append((invoice, items, installments))
+        if len(batch) >= batch_size:
+            imported += flush(batch)
+            batch = []
+    if batch:
+        imported += flush(batch)
+    return imported, errors
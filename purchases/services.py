@@ -0,0 +1,184 @@
+# purchases/services.py
+"""
+Serviços das notas de compra: gravação da nota com itens e parcelas,
+finalização (lançamento dos itens no estoque) e cancelamento (estorno dos
+lançamentos). Os movimentos são gravados em lote por
+stock.services.bulk_ingest_movements, na mesma transação da mudança de status
+da nota.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from stock.models import StockMovement
+from stock.services import COST_PRECISION, bulk_ingest_movements
+from .models import PayableAccount, PurchaseInvoice, PurchaseInvoiceItem
+
+InvoiceStatus = PurchaseInvoice.InvoiceStatus
+
+QUANTITY_ERROR = "As quantidades dos itens devem ser números inteiros maiores que zero."
+
+
+def valid_quantity(quantity):
+    """O estoque é controlado em unidades inteiras: a nota só aceita quantidades inteiras e positivas."""
+    return quantity is not None and quantity > 0 and quantity % 1 == 0
+
+
+def invoice_totals(invoice, items):
+    """
+    Calcula em memória, em uma única passada pelos itens, o total de cada item
+    e o subtotal e o total da nota (subtotal + frete + outras despesas - desconto).
+    """
+    subtotal = Decimal('0.00')
+    for item in items:
+        item.total_cost = (Decimal(item.quantity) * Decimal(item.unit_cost)).quantize(
+            COST_PRECISION, rounding=ROUND_HALF_UP,
+        )
+        subtotal += item.total_cost
+    invoice.subtotal = subtotal
+    invoice.total_amount = subtotal + Decimal(invoice.freight) + Decimal(invoice.other_costs) - Decimal(invoice.discount)
+    return invoice.total_amount
+
+
+def create_invoice(invoice, items, installments=()):
+    """
+    Grava uma nota nova com seus itens e parcelas (instâncias ainda não salvas).
+    Os totais são calculados no servidor (ver invoice_totals) e as parcelas,
+    quando houver, conferidas contra o total antes de qualquer gravação; itens
+    e parcelas são inseridos com um bulk_create cada, na mesma transação.
+    Levanta ValidationError se a nota não tiver itens, se alguma quantidade
+    não for inteira e positiva, se o total ficar negativo ou se as parcelas
+    não somarem o total.
+    """
+    items, installments = list(items), list(installments)
+    errors = []
+    if not items:
+        errors.append("Adicione pelo menos um item à nota.")
+    if not all(valid_quantity(Decimal(item.quantity)) for item in items):
+        errors.append(QUANTITY_ERROR)
+
+    total = invoice_totals(invoice, items)
+    if total < 0:
+        errors.append("O desconto não pode ser maior que o valor da nota.")
+    if installments:
+        installments_total = sum(Decimal(installment.amount) for installment in installments)
+        if installments_total != total:
+            errors.append(
+                f"A soma das parcelas (R$ {installments_total:.2f}) difere do total da nota (R$ {total:.2f})."
+            )
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        invoice.save()
+        for item in items:
+            item.invoice = invoice
+        PurchaseInvoiceItem.objects.bulk_create(items)
+        for installment in installments:
+            installment.invoice = invoice
+            installment.company_id = invoice.company_id
+        PayableAccount.objects.bulk_create(installments)
+    return invoice
+
+
+def landed_unit_costs(items, adjustment):
+    """
+    Rateia `adjustment` (frete + outras despesas - desconto) entre os itens,
+    proporcionalmente ao valor de cada um (ou à quantidade, se a nota não tiver
+    valor), e retorna o custo unitário final de cada item, na mesma ordem.
+    O último item recebe a diferença de arredondamento do rateio.
+    """
+    adjustment = Decimal(adjustment)
+    weights = [Decimal(item['total_cost']) for item in items]
+    if not any(weights):
+        weights = [Decimal(item['quantity']) for item in items]
+    base = sum(weights)
+
+    costs, allocated = [], Decimal('0.00')
+    for index, (item, weight) in enumerate(zip(items, weights)):
+        if index == len(items) - 1:
+            share = adjustment - allocated
+        else:
+            share = (adjustment * weight / base).quantize(COST_PRECISION, rounding=ROUND_HALF_UP) if base else 0
+            allocated += share
+        total = Decimal(item['quantity']) * Decimal(item['unit_cost']) + share
+        unit_cost = (total / Decimal(item['quantity'])).quantize(COST_PRECISION, rounding=ROUND_HALF_UP)
+        costs.append(max(unit_cost, Decimal('0.00')))
+    return costs
+
+
+def _movement_rows(invoice, movement_type):
+    items = list(invoice.items.order_by('pk').values('product_id', 'quantity', 'unit_cost', 'total_cost'))
+    if not items:
+        raise ValidationError("A nota não tem itens.")
+    if not all(valid_quantity(item['quantity']) for item in items):
+        raise ValidationError(QUANTITY_ERROR)
+
+    adjustment = Decimal(invoice.freight) + Decimal(invoice.other_costs) - Decimal(invoice.discount)
+    notes = f"Nota de compra {invoice.invoice_number}"
+    return [
+        {
+            'product': item['product_id'],
+            'movement_type': movement_type,
+            'quantity': int(item['quantity']),
+            'unit_price': unit_cost,
+            'supplier': invoice.supplier_id,
+            'notes': notes,
+        }
+        for item, unit_cost in zip(items, landed_unit_costs(items, adjustment))
+    ]
+
+
+def _ingest(invoice, rows, user):
+    created, errors = bulk_ingest_movements(invoice.company, rows, user=user)
+    if errors:
+        raise ValidationError([
+            message for error in errors for message in error['errors'].values()
+        ])
+    return created
+
+
+def _change_status(invoice, current, new, message, **changes):
+    """UPDATE condicional: só uma requisição consegue mudar o status da nota."""
+    updated = PurchaseInvoice.objects.filter(pk=invoice.pk, status=current).update(status=new, **changes)
+    if not updated:
+        raise ValidationError(message)
+
+
+def finalize_invoice(invoice, user=None):
+    """
+    Finaliza uma nota em rascunho: grava um movimento de compra por item, com
+    o custo unitário acrescido do rateio de frete e despesas e abatido do
+    desconto, e atualiza saldos e custos médios, tudo em uma transação.
+    Retorna a quantidade de movimentos gravados; levanta ValidationError se a
+    nota não estiver em rascunho ou tiver itens inválidos.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        _change_status(
+            invoice, InvoiceStatus.DRAFT, InvoiceStatus.FINALIZED,
+            "Apenas notas em rascunho podem ser finalizadas.", finalized_at=now,
+        )
+        created = _ingest(invoice, _movement_rows(invoice, StockMovement.MovementType.PURCHASE), user)
+    invoice.status, invoice.finalized_at = InvoiceStatus.FINALIZED, now
+    return created
+
+
+def cancel_invoice(invoice, user=None):
+    """
+    Cancela a nota. Se ela já estava finalizada, estorna as entradas com uma
+    devolução ao fornecedor por item, pelo mesmo custo lançado na finalização;
+    o estorno é recusado se o saldo de algum produto não bastar. Retorna a
+    quantidade de movimentos de estorno gravados.
+    """
+    with transaction.atomic():
+        if invoice.status == InvoiceStatus.DRAFT:
+            _change_status(invoice, InvoiceStatus.DRAFT, InvoiceStatus.CANCELED, "A nota já foi finalizada ou cancelada.")
+            created = 0
+        else:
+            _change_status(invoice, InvoiceStatus.FINALIZED, InvoiceStatus.CANCELED, "A nota já foi cancelada.")
+            created = _ingest(invoice, _movement_rows(invoice, StockMovement.MovementType.RETURN_OUT), user)
+    invoice.status = InvoiceStatus.CANCELED
+    return created
@@ -1,3 +1,507 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Company, CompanyUser, User
+from products.models import Product
+from stock.models import StockBalance, StockMovement
+from suppliers.models import Supplier
+from . import aging, nfe, services
+from .forms import InvoiceItemFormSet
+from .models import PayableAccount, PurchaseInvoice, PurchaseInvoiceItem
+
+
+class InvoiceItemFormSetTests(TestCase):
+    """
+    Os itens da nota compartilham a lista de produtos do cache da empresa e
+    os produtos escolhidos são carregados uma única vez para todas as linhas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.products = Product.objects.bulk_create([
+            Product(company=cls.company, name=f"Produto {index:03d}", sku=f"P{index:03d}", sale_price=Decimal('1.00'))
+            for index in range(50)
+        ])
+
+    def setUp(self):
+        # Os IDs das empresas se repetem entre os testes: descarta o cache anterior
+        cache.clear()
+
+    def build_data(self, products):
+        data = {'items-TOTAL_FORMS': str(len(products)), 'items-INITIAL_FORMS': '0'}
+        for index, product in enumerate(products):
+            data[f'items-{index}-product'] = str(product.pk)
+            data[f'items-{index}-quantity'] = '1'
+            data[f'items-{index}-unit_cost'] = '2.00'
+        return data
+
+    def test_products_are_loaded_once_for_all_rows(self):
+        data = self.build_data(self.products)
+        InvoiceItemFormSet(data, prefix='items', form_kwargs={'company': self.company}).is_valid()
+
+        # Lista de opções já no cache: só a consulta dos produtos escolhidos
+        formset = InvoiceItemFormSet(data, prefix='items', form_kwargs={'company': self.company})
+        with self.assertNumQueries(1):
+            self.assertTrue(formset.is_valid())
+            formset.as_p()
+        self.assertEqual(formset.forms[7].cleaned_data['product'], self.products[7])
+
+    def test_product_from_another_company_is_rejected(self):
+        other = Company.objects.create(name="Outra", cnpj="11.111.111/0001-11", address="-", city="-", state="SP")
+        foreign = Product.objects.create(company=other, name="Alheio", sku="X1", sale_price=Decimal('1.00'))
+
+        formset = InvoiceItemFormSet(
+            self.build_data([self.products[0], foreign]), prefix='items', form_kwargs={'company': self.company},
+        )
+        self.assertFalse(formset.is_valid())
+        self.assertIn('product', formset.forms[1].errors)
+
+
+class InvoiceFinalizationTests(TestCase):
+    """
+    A finalização lança um movimento de compra por item, com frete, despesas e
+    desconto rateados no custo unitário; o cancelamento estorna os lançamentos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.supplier = Supplier.objects.create(
+            company=cls.company, name="Fornecedor", cnpj="11.111.111/0001-11", phone="-", email="f@f.com", address="-",
+        )
+        cls.pen = Product.objects.create(company=cls.company, name="Caneta", sku="C1", sale_price=Decimal('20.00'))
+        cls.book = Product.objects.create(company=cls.company, name="Caderno", sku="K1", sale_price=Decimal('50.00'))
+
+    def setUp(self):
+        cache.clear()
+        StockMovement.objects.create(
+            company=self.company, product=self.pen, movement_type=StockMovement.MovementType.PURCHASE,
+            quantity=2, unit_price=Decimal('8.00'),
+        )
+        self.invoice = PurchaseInvoice.objects.create(
+            company=self.company, supplier=self.supplier, invoice_number="123", issue_date=datetime.date(2026, 1, 10),
+            freight=Decimal('10.00'), discount=Decimal('5.00'),
+        )
+        PurchaseInvoiceItem.objects.create(invoice=self.invoice, product=self.pen, quantity=2, unit_cost=Decimal('10.00'))
+        PurchaseInvoiceItem.objects.create(invoice=self.invoice, product=self.book, quantity=1, unit_cost=Decimal('30.00'))
+
+    def balance(self, product):
+        return StockBalance.objects.get(product=product).quantity
+
+    def test_finalize_posts_items_with_allocated_costs(self):
+        self.assertEqual(services.finalize_invoice(self.invoice), 2)
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, PurchaseInvoice.InvoiceStatus.FINALIZED)
+        self.assertIsNotNone(self.invoice.finalized_at)
+        # Frete - desconto = 5,00, rateado pelo valor dos itens (20,00 e 30,00)
+        costs = dict(
+            StockMovement.objects.filter(notes="Nota de compra 123").values_list('product__sku', 'unit_price')
+        )
+        self.assertEqual(costs, {'C1': Decimal('11.00'), 'K1': Decimal('33.00')})
+        self.assertEqual(self.balance(self.pen), 4)
+        self.assertEqual(self.balance(self.book), 1)
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.average_cost, Decimal('9.50'))
+
+        with self.assertRaises(ValidationError):
+            services.finalize_invoice(self.invoice)
+        self.assertEqual(StockMovement.objects.filter(notes="Nota de compra 123").count(), 2)
+
+    def test_cancel_reverses_finalized_invoice(self):
+        services.finalize_invoice(self.invoice)
+        self.assertEqual(services.cancel_invoice(self.invoice), 2)
+
+        self.assertEqual(self.balance(self.pen), 2)
+        self.assertEqual(self.balance(self.book), 0)
+        self.assertEqual(
+            PurchaseInvoice.objects.get(pk=self.invoice.pk).status, PurchaseInvoice.InvoiceStatus.CANCELED,
+        )
+
+    def test_cancel_is_refused_when_stock_was_consumed(self):
+        services.finalize_invoice(self.invoice)
+        StockMovement.objects.create(
+            company=self.company, product=self.book, movement_type=StockMovement.MovementType.SALE,
+            quantity=1, unit_price=Decimal('50.00'),
+        )
+
+        with self.assertRaises(ValidationError):
+            services.cancel_invoice(self.invoice)
+        self.assertEqual(
+            PurchaseInvoice.objects.get(pk=self.invoice.pk).status, PurchaseInvoice.InvoiceStatus.FINALIZED,
+        )
+        self.assertEqual(self.balance(self.pen), 4)
+
+
+class PurchaseInvoiceCreateViewTests(TestCase):
+    """
+    Os totais da nota são calculados no servidor a partir dos itens, e as
+    parcelas precisam somar o total para que a nota seja gravada.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.user = User.objects.create_user(email="a@a.com", password="x")
+        CompanyUser.objects.create(user=cls.user, company=cls.company, role='admin')
+        cls.supplier = Supplier.objects.create(
+            company=cls.company, name="Fornecedor", cnpj="11.111.111/0001-11", phone="-", email="f@f.com", address="-",
+        )
+        cls.products = Product.objects.bulk_create([
+            Product(company=cls.company, name=f"Produto {index}", sku=f"P{index}", sale_price=Decimal('1.00'))
+            for index in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, installments, quantity=None):
+        data = {
+            'supplier': str(self.supplier.pk), 'invoice_number': '55', 'issue_date': '2026-01-10',
+            'discount': '1,00', 'freight': '1.234,56', 'other_costs': '0,00',
+            'items-TOTAL_FORMS': '3', 'items-INITIAL_FORMS': '0',
+            'payables-TOTAL_FORMS': str(len(installments)), 'payables-INITIAL_FORMS': '0',
+        }
+        for index, product in enumerate(self.products):
+            data[f'items-{index}-product'] = str(product.pk)
+            data[f'items-{index}-quantity'] = quantity if quantity and index == 0 else str(index + 1)
+            data[f'items-{index}-unit_cost'] = '3,33'
+        for index, amount in enumerate(installments):
+            data[f'payables-{index}-due_date'] = f'2026-0{index + 2}-10'
+            data[f'payables-{index}-amount'] = amount
+        return self.client.post(reverse('purchases:purchase_create'), data)
+
+    def test_totals_are_computed_from_items(self):
+        # Subtotal = 3,33 * (1 + 2 + 3); total = subtotal + frete - desconto
+        response = self.post(['626,77', '626,77'])
+
+        self.assertRedirects(response, reverse('purchases:purchase_list'))
+        invoice = PurchaseInvoice.objects.get()
+        self.assertEqual(invoice.subtotal, Decimal('19.98'))
+        self.assertEqual(invoice.total_amount, Decimal('1253.54'))
+        self.assertEqual(
+            sorted(invoice.items.values_list('total_cost', flat=True)),
+            [Decimal('3.33'), Decimal('6.66'), Decimal('9.99')],
+        )
+        self.assertEqual(
+            list(PayableAccount.objects.filter(company=self.company).values_list('amount', flat=True)),
+            [Decimal('626.77'), Decimal('626.77')],
+        )
+
+    def test_installments_must_add_up_to_total(self):
+        response = self.post(['600,00', '600,00'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("difere do total da nota", str(response.context['form'].non_field_errors()))
+        self.assertFalse(PurchaseInvoice.objects.exists())
+
+    def test_fractional_quantities_are_rejected_at_creation(self):
+        response = self.post(['626,77', '626,77'], quantity='2.5')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(services.QUANTITY_ERROR, response.context['item_formset'].forms[0].errors['quantity'])
+        self.assertFalse(PurchaseInvoice.objects.exists())
+
+        # O serviço recusa a nota mesmo sem passar pelo formulário
+        invoice = PurchaseInvoice(
+            company=self.company, supplier=self.supplier, invoice_number='56', issue_date=datetime.date(2026, 1, 10),
+        )
+        item = PurchaseInvoiceItem(product=self.products[0], quantity=Decimal('2.5'), unit_cost=Decimal('1.00'))
+        with self.assertRaisesMessage(ValidationError, services.QUANTITY_ERROR):
+            services.create_invoice(invoice, [item])
+        self.assertFalse(PurchaseInvoice.objects.exists())
+
+
+NFE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
+  <NFe><infNFe versao="4.00" Id="NFe3526">
+    <ide><nNF>{number}</nNF><dhEmi>2026-01-10T10:00:00-03:00</dhEmi></ide>
+    <emit><CNPJ>{cnpj}</CNPJ><xNome>Fornecedor</xNome></emit>
+    <det nItem="1"><prod><cProd>C1</cProd><cEAN>SEM GTIN</cEAN><xProd>Caneta</xProd>
+      <qCom>10.0000</qCom><vUnCom>2.5000000000</vUnCom><vProd>25.00</vProd></prod></det>
+    <det nItem="2"><prod><cProd>FORN-99</cProd><cEAN>7891234567895</cEAN><xProd>Caderno</xProd>
+      <qCom>2.0000</qCom><vUnCom>15.0000000000</vUnCom><vProd>30.00</vProd></prod></det>
+    <total><ICMSTot><vProd>55.00</vProd><vFrete>5.00</vFrete><vDesc>0.00</vDesc><vOutro>0.00</vOutro>
+      <vNF>60.00</vNF></ICMSTot></total>
+    <cobr><dup><nDup>001</nDup><dVenc>2026-02-10</dVenc><vDup>30.00</vDup></dup>
+      <dup><nDup>002</nDup><dVenc>2026-03-10</dVenc><vDup>30.00</vDup></dup></cobr>
+  </infNFe></NFe>
+</nfeProc>
+"""
+
+
+class NFeImportTests(TestCase):
+    """
+    A NF-e é lida em fluxo; o fornecedor é localizado pelo CNPJ e os produtos
+    pelo SKU ou EAN, e a nota é criada com itens e parcelas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.supplier = Supplier.objects.create(
+            company=cls.company, name="Fornecedor", cnpj="11.111.111/0001-11", phone="-", email="f@f.com", address="-",
+        )
+        cls.pen = Product.objects.create(company=cls.company, name="Caneta", sku="C1", sale_price=Decimal('5.00'))
+        cls.book = Product.objects.create(
+            company=cls.company, name="Caderno", sku="K1", ean="7891234567895", sale_price=Decimal('20.00'),
+        )
+
+    def document(self, number='123', cnpj='11111111000111'):
+        return nfe.parse_nfe(io.BytesIO(NFE_XML.format(number=number, cnpj=cnpj).encode()))
+
+    def test_invoice_is_created_with_items_and_installments(self):
+        imported, errors = nfe.import_invoices(self.company, [('123.xml', self.document())])
+
+        self.assertEqual((imported, errors), (1, []))
+        invoice = PurchaseInvoice.objects.get(invoice_number='123')
+        self.assertEqual(invoice.supplier, self.supplier)
+        self.assertEqual(invoice.issue_date, datetime.date(2026, 1, 10))
+        self.assertEqual((invoice.subtotal, invoice.freight, invoice.total_amount),
+                         (Decimal('55.00'), Decimal('5.00'), Decimal('60.00')))
+        self.assertEqual(
+            sorted(invoice.items.values_list('product__sku', 'quantity', 'unit_cost')),
+            [('C1', Decimal('10.00'), Decimal('2.50')), ('K1', Decimal('2.00'), Decimal('15.00'))],
+        )
+        self.assertEqual(invoice.installments.count(), 2)
+        self.assertEqual(invoice.installments.first().company, self.company)
+
+    def test_rejected_files_do_not_block_the_others(self):
+        nfe.import_invoices(self.company, [('123.xml', self.document())])
+
+        imported, errors = nfe.import_invoices(self.company, [
+            ('123.xml', self.document()),
+            ('124.xml', self.document(number='124')),
+            ('125.xml', self.document(number='125', cnpj='99999999000199')),
+        ])
+
+        self.assertEqual(imported, 1)
+        self.assertEqual([error['file'] for error in errors], ['123.xml', '125.xml'])
+        self.assertEqual(PurchaseInvoice.objects.count(), 2)
+
+    def test_ean_takes_precedence_over_supplier_code(self):
+        # O código do fornecedor para o caderno coincide com o SKU da caneta
+        xml = NFE_XML.format(number='130', cnpj='11111111000111').replace('<cProd>FORN-99</cProd>', '<cProd>C1</cProd>')
+
+        imported, errors = nfe.import_invoices(self.company, [('130.xml', nfe.parse_nfe(io.BytesIO(xml.encode())))])
+
+        self.assertEqual((imported, errors), (1, []))
+        invoice = PurchaseInvoice.objects.get(invoice_number='130')
+        self.assertEqual(
+            sorted(invoice.items.values_list('product__sku', 'quantity')),
+            [('C1', Decimal('10.00')), ('K1', Decimal('2.00'))],
+        )
+
+    def test_taxes_are_added_to_other_costs_and_checked_against_vnf(self):
+        xml = NFE_XML.format(number='127', cnpj='11111111000111').replace(
+            '<vOutro>0.00</vOutro>', '<vOutro>0.00</vOutro><vSeg>1.00</vSeg><vIPI>2.50</vIPI><vST>1.50</vST>',
+        ).replace('<vNF>60.00</vNF>', '<vNF>65.00</vNF>').replace('<vDup>30.00</vDup>', '<vDup>32.50</vDup>')
+
+        imported, errors = nfe.import_invoices(self.company, [('127.xml', nfe.parse_nfe(io.BytesIO(xml.encode())))])
+
+        self.assertEqual((imported, errors), (1, []))
+        invoice = PurchaseInvoice.objects.get(invoice_number='127')
+        self.assertEqual((invoice.other_costs, invoice.total_amount), (Decimal('5.00'), Decimal('65.00')))
+
+    def test_unit_cost_rounding_is_kept_in_other_costs(self):
+        # 10,00 / 3 = 3,33 por unidade: o centavo restante vai para outras despesas
+        xml = NFE_XML.format(number='129', cnpj='11111111000111').replace(
+            '<qCom>10.0000</qCom><vUnCom>2.5000000000</vUnCom><vProd>25.00</vProd>',
+            '<qCom>3.0000</qCom><vUnCom>3.3333333333</vUnCom><vProd>10.00</vProd>',
+        ).replace('<vNF>60.00</vNF>', '<vNF>45.00</vNF>').replace('<vDup>30.00</vDup>', '<vDup>22.50</vDup>')
+
+        imported, errors = nfe.import_invoices(self.company, [('129.xml', nfe.parse_nfe(io.BytesIO(xml.encode())))])
+
+        self.assertEqual((imported, errors), (1, []))
+        invoice = PurchaseInvoice.objects.get(invoice_number='129')
+        self.assertEqual((invoice.subtotal, invoice.other_costs, invoice.total_amount),
+                         (Decimal('39.99'), Decimal('0.01'), Decimal('45.00')))
+
+    def test_total_must_match_vnf(self):
+        xml = NFE_XML.format(number='128', cnpj='11111111000111').replace('<vNF>60.00</vNF>', '<vNF>61.00</vNF>')
+
+        imported, errors = nfe.import_invoices(self.company, [('128.xml', nfe.parse_nfe(io.BytesIO(xml.encode())))])
+
+        self.assertEqual(imported, 0)
+        self.assertIn("difere do valor da NF-e", errors[0]['errors'][0])
+
+    def test_fractional_quantities_are_rejected(self):
+        xml = NFE_XML.format(number='126', cnpj='11111111000111').replace('<qCom>10.0000</qCom>', '<qCom>2.5000</qCom>')
+
+        imported, errors = nfe.import_invoices(self.company, [('126.xml', nfe.parse_nfe(io.BytesIO(xml.encode())))])
+
+        self.assertEqual(imported, 0)
+        self.assertIn("unidades inteiras", errors[0]['errors'][0])
+
+    def test_invalid_xml_is_reported(self):
+        with self.assertRaises(nfe.NFeError):
+            nfe.parse_nfe(io.BytesIO(b"<nfeProc><NFe>"))
+
+
+class Select2SearchTests(TestCase):
+    """
+    As buscas do Select2 exigem login, paginam com limite e respondem 304
+    enquanto os cadastros da empresa não mudam.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.user = User.objects.create_user(email="a@a.com", password="x")
+        CompanyUser.objects.create(user=cls.user, company=cls.company, role='admin')
+        Supplier.objects.bulk_create([
+            Supplier(
+                company=cls.company, name=f"Fornecedor {index:02d}", cnpj=f"{index:014d}", phone="-",
+                email=f"f{index}@f.com", address="-",
+            )
+            for index in range(25)
+        ] + [
+            Supplier(company=cls.company, name="Outro", cnpj="99999999999999", phone="-", email="o@f.com", address="-"),
+        ])
+        Supplier.objects.create(
+            company=cls.company, name="água fresca", cnpj="88888888888888", phone="-", email="a@f.com", address="-",
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('purchases:buscar_fornecedores')
+
+    def test_login_is_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_prefix_search_is_paginated(self):
+        self.client.force_login(self.user)
+
+        first = self.client.get(self.url, {'q': 'forn', 'page': 1}).json()
+        second = self.client.get(self.url, {'q': 'forn', 'page': 2}).json()
+
+        self.assertEqual(len(first['results']), 20)
+        self.assertTrue(first['pagination']['more'])
+        self.assertEqual([row['text'] for row in second['results']], [f"Fornecedor {index}" for index in range(20, 25)])
+        self.assertFalse(second['pagination']['more'])
+        self.assertEqual(set(first['results'][0]), {'id', 'text', 'cnpj', 'phone', 'email'})
+
+    def test_search_ignores_case_and_accents(self):
+        self.client.force_login(self.user)
+
+        for term in ('água', 'agua', 'ÁGUA F'):
+            results = self.client.get(self.url, {'q': term}).json()['results']
+            self.assertEqual([row['text'] for row in results], ["água fresca"], term)
+
+    def test_unchanged_results_are_not_modified(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {'q': 'out'})
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, {'q': 'out'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.filter(name="Outro").first().save()
+        response = self.client.get(self.url, {'q': 'out'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PayableAgingTests(TestCase):
+    """
+    O painel distribui as parcelas em aberto nas faixas de atraso com uma
+    única consulta, detalha por fornecedor e faixa e exporta em CSV.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.user = User.objects.create_user(email="a@a.com", password="x")
+        CompanyUser.objects.create(user=cls.user, company=cls.company, role='admin')
+        cls.supplier = Supplier.objects.create(
+            company=cls.company, name="Papelaria", cnpj="11111111111111", phone="-", email="p@p.com", address="-",
+        )
+        cls.other = Supplier.objects.create(
+            company=cls.company, name="Gráfica", cnpj="22222222222222", phone="-", email="g@g.com", address="-",
+        )
+        cls.today = datetime.date.today()
+        invoice = PurchaseInvoice.objects.create(
+            company=cls.company, supplier=cls.supplier, invoice_number="1", issue_date=cls.today,
+        )
+        other_invoice = PurchaseInvoice.objects.create(
+            company=cls.company, supplier=cls.other, invoice_number="2", issue_date=cls.today,
+        )
+        canceled = PurchaseInvoice.objects.create(
+            company=cls.company, supplier=cls.other, invoice_number="3", issue_date=cls.today,
+            status=PurchaseInvoice.InvoiceStatus.CANCELED,
+        )
+        installments = [
+            (invoice, 0, '100.00', 'PENDING'),
+            (invoice, -10, '50.00', 'PENDING'),
+            (invoice, 30, '20.00', 'OVERDUE'),
+            (invoice, 31, '30.00', 'OVERDUE'),
+            (invoice, 91, '40.00', 'OVERDUE'),
+            (invoice, 45, '999.00', 'PAID'),
+            (other_invoice, 75, '15.00', 'PENDING'),
+            (canceled, 5, '500.00', 'PENDING'),
+        ]
+        PayableAccount.objects.bulk_create([
+            PayableAccount(
+                company=cls.company, invoice=inv, due_date=cls.today - datetime.timedelta(days=days),
+                amount=Decimal(amount), status=status,
+            )
+            for inv, days, amount, status in installments
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_summary_buckets_open_installments(self):
+        summary = aging.aging_summary(self.company, today=self.today)
+
+        first, second = summary['suppliers']
+        self.assertEqual(first['supplier_name'], "Papelaria")
+        self.assertEqual(
+            [first[key] for key, _, _, _ in aging.BUCKETS],
+            [Decimal('150.00'), Decimal('20.00'), Decimal('30.00'), Decimal('0.00'), Decimal('40.00')],
+        )
+        self.assertEqual(second['days_61_90'], Decimal('15.00'))
+        self.assertEqual(summary['totals']['total'], Decimal('255.00'))
+        self.assertEqual(summary['totals']['installments'], 6)
+
+    def test_dashboard_query_budget_does_not_grow(self):
+        url = reverse('purchases:payable_aging')
+        self.client.get(url)
+        # Sessão, usuário, empresa e a agregação
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, "R$255.00")
+
+        invoice = PurchaseInvoice.objects.get(invoice_number="1")
+        PayableAccount.objects.bulk_create([
+            PayableAccount(company=self.company, invoice=invoice, due_date=self.today, amount=Decimal('1.00'))
+            for _ in range(50)
+        ])
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_drilldown_and_export(self):
+        supplier = str(self.supplier.pk)
+        response = self.client.get(
+            reverse('purchases:payable_aging_detail'), {'supplier': supplier, 'bucket': 'current'},
+        )
+        self.assertEqual([row.amount for row in response.context['installments']], [Decimal('100.00'), Decimal('50.00')])
+
+        self.assertEqual(
+            self.client.get(reverse('purchases:payable_aging_detail'), {'bucket': 'x'}).status_code, 404,
+        )
 
-# Create your tests here.
+        response = self.client.get(reverse('purchases:payable_aging_export'), {'bucket': 'days_1_30'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['supplier', 'supplier_cnpj', 'invoice_number'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn("30,1 a 30 dias,20.00,OVERDUE", lines[1])
@@ -7,6 +7,12 @@ urlpatterns = [
     path('', views.PurchaseInvoiceListView.as_view(), name='purchase_list'),
     # path('<uuid:pk>/', views.purchase_detail, name='purchase_detail'),
     path('create/', views.PurchaseInvoiceCreateView.as_view(), name='purchase_create'),
+    path('import/', views.NFeImportView.as_view(), name='purchase_import'),
+    path('<int:pk>/finalize/', views.PurchaseInvoiceFinalizeView.as_view(), name='purchase_finalize'),
+    path('<int:pk>/cancel/', views.PurchaseInvoiceCancelView.as_view(), name='purchase_cancel'),
+    path('payables/aging/', views.PayableAgingView.as_view(), name='payable_aging'),
+    path('payables/aging/installments/', views.PayableAgingDetailView.as_view(), name='payable_aging_detail'),
+    path('payables/aging/export/', views.export_payable_aging, name='payable_aging_export'),
     # path('<uuid:pk>/update/', views.purchase_update, name='purchase_update'),
     # path('<uuid:pk>/delete/', views.purchase_delete, name='purchase_delete'),
  
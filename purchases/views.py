@@ -1,15 +1,29 @@
 # purchases/views.py
 
-from django.shortcuts import render, redirect
-from django.views.generic import View, ListView
+import hashlib
+import uuid
+
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.shortcuts import get_object_or_404, render, redirect
+from django.core.paginator import Paginator
+from django.views.generic import FormView, View, ListView, TemplateView
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
 from django.urls import reverse_lazy
-from django.http import JsonResponse
-from django.db.models import Q
-from .models import PurchaseInvoice, Supplier, Product # Importe os modelos aqui, para as novas APIs
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.db.models import F
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.utils import timezone
+from .models import PayableAccount, PurchaseInvoice, Supplier, Product # Importe os modelos aqui, para as novas APIs
 
-from .forms import PurchaseInvoiceForm, InvoiceItemFormSet, PayableAccountFormSet
+from . import aging, nfe, services
+from .forms import NFeImportForm, PurchaseInvoiceForm, InvoiceItemFormSet, PayableAccountFormSet
+from app.mixins import KeysetPaginationMixin
+from core import cache as company_cache
+from products.search import search_products
+from suppliers.search import search_suppliers
 
 
 class PurchaseInvoiceCreateView(LoginRequiredMixin, View):
@@ -19,12 +33,9 @@ class PurchaseInvoiceCreateView(LoginRequiredMixin, View):
         """
         Lida com a requisição GET: mostra o formulário principal e os formsets em branco.
         """
-        # Acessa a empresa do usuário logado
-        user_company = request.user.company if hasattr(request.user, 'company') else None
-
-        form = PurchaseInvoiceForm(user=request.user)
+        form = PurchaseInvoiceForm(company=request.company)
         # Passa a empresa para o formset para que ele possa filtrar os produtos
-        item_formset = InvoiceItemFormSet(prefix='items', form_kwargs={'company': user_company})
+        item_formset = InvoiceItemFormSet(prefix='items', form_kwargs={'company': request.company})
         payable_formset = PayableAccountFormSet(prefix='payables')
         
         context = {
@@ -38,31 +49,31 @@ class PurchaseInvoiceCreateView(LoginRequiredMixin, View):
         """
         Lida com a requisição POST: processa e valida todos os formulários.
         """
-        user_company = request.user.company if hasattr(request.user, 'company') else None
-        form = PurchaseInvoiceForm(request.POST, user=request.user)
-        item_formset = InvoiceItemFormSet(request.POST, prefix='items', form_kwargs={'company': user_company})
+        form = PurchaseInvoiceForm(request.POST, company=request.company)
+        item_formset = InvoiceItemFormSet(request.POST, prefix='items', form_kwargs={'company': request.company})
         payable_formset = PayableAccountFormSet(request.POST, prefix='payables')
 
         if form.is_valid() and item_formset.is_valid() and payable_formset.is_valid():
             try:
-                with transaction.atomic():
-                    company = request.user.company
-                    if not company:
-                        form.add_error(None, "Usuário não associado a uma empresa ativa.")
-                        raise ValueError("Empresa não encontrada para o usuário.")
-
-                    invoice = form.save(commit=False)
-                    invoice.company = company
-                    invoice.save()
-                    
-                    item_formset.instance = invoice
-                    item_formset.save()
-                    
-                    payable_formset.instance = invoice
-                    payable_formset.save()
+                company = request.company
+                if not company:
+                    form.add_error(None, "Usuário não associado a uma empresa ativa.")
+                    raise ValueError("Empresa não encontrada para o usuário.")
+
+                invoice = form.save(commit=False)
+                invoice.company = company
+                item_formset.instance = invoice
+                payable_formset.instance = invoice
 
+                # Itens e parcelas são montados sem gravar: a nota, seus totais e as
+                # parcelas são conferidos e gravados de uma vez pelo serviço
+                services.create_invoice(
+                    invoice, item_formset.save(commit=False), payable_formset.save(commit=False),
+                )
                 return redirect(reverse_lazy('purchases:purchase_list'))
 
+            except ValidationError as e:
+                form.add_error(None, e)
             except Exception as e:
                 context = {
                     'form': form,
@@ -79,30 +90,246 @@ class PurchaseInvoiceCreateView(LoginRequiredMixin, View):
         }
         return render(request, self.template_name, context)
 
-class PurchaseInvoiceListView(LoginRequiredMixin, ListView):
+class PurchaseInvoiceListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = PurchaseInvoice
     template_name = 'purchases/purchase_invoice_list.html'
     context_object_name = 'invoices'
+    # Mais recentes primeiro, pelo índice (company, -issue_date)
+    keyset_field = '-issue_date'
 
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'company') and user.company:
-            return PurchaseInvoice.objects.filter(company=user.company).order_by('-issue_date')
+        company = self.request.company
+        if company:
+            return PurchaseInvoice.objects.filter(company=company).select_related('supplier')
         return PurchaseInvoice.objects.none()
 
+
+class PurchaseInvoiceActionView(LoginRequiredMixin, View):
+    """
+    Ação sobre uma nota da empresa (POST), executada por `action`
+    (ver purchases.services). Volta para a lista com o resultado em uma mensagem.
+    """
+    action = None
+    success_message = ''
+
+    def post(self, request, pk, *args, **kwargs):
+        invoice = get_object_or_404(PurchaseInvoice, pk=pk, company=request.company)
+        try:
+            movements = self.action(invoice, user=request.user)
+        except ValidationError as e:
+            for message in e.messages:
+                messages.error(request, message)
+        else:
+            messages.success(request, self.success_message.format(invoice=invoice, movements=movements))
+        return redirect('purchases:purchase_list')
+
+
+class PurchaseInvoiceFinalizeView(PurchaseInvoiceActionView):
+    action = staticmethod(services.finalize_invoice)
+    success_message = "Nota {invoice.invoice_number} finalizada: {movements} entradas lançadas no estoque."
+
+
+class PurchaseInvoiceCancelView(PurchaseInvoiceActionView):
+    action = staticmethod(services.cancel_invoice)
+    success_message = "Nota {invoice.invoice_number} cancelada: {movements} entradas estornadas."
+
+class NFeImportView(LoginRequiredMixin, FormView):
+    """
+    Importa notas de compra a partir dos XML de NF-e enviados (ver
+    purchases.nfe). Cada arquivo é importado ou recusado por inteiro; os
+    recusados são listados com o motivo. Lotes grandes (um mês de notas)
+    devem usar o comando `import_nfe`, que lê os arquivos em paralelo.
+    """
+    template_name = 'purchases/nfe_import.html'
+    form_class = NFeImportForm
+    success_url = reverse_lazy('purchases:purchase_list')
+
+    def form_valid(self, form):
+        company = self.request.company
+        if not company:
+            form.add_error(None, "Usuário não associado a uma empresa ativa.")
+            return self.form_invalid(form)
+
+        documents, errors = [], []
+        for file in form.cleaned_data['files']:
+            try:
+                documents.append((file.name, nfe.parse_nfe(file)))
+            except nfe.NFeError as e:
+                errors.append({'file': file.name, 'errors': [str(e)]})
+        imported, import_errors = nfe.import_invoices(company, documents)
+        errors += import_errors
+
+        if imported:
+            messages.success(self.request, f"{imported} nota(s) importada(s) com sucesso.")
+        if not errors:
+            return redirect(self.get_success_url())
+
+        return self.render_to_response(self.get_context_data(form=form, imported=imported, errors=errors))
+
+# --- Envelhecimento das contas a pagar (ver purchases.aging) ---
+
+def _aging_filters(request):
+    """Fornecedor e faixa da seleção; valores inválidos resultam em 404."""
+    supplier = request.GET.get('supplier') or None
+    bucket = request.GET.get('bucket') or None
+    try:
+        supplier = uuid.UUID(supplier) if supplier else None
+    except ValueError:
+        raise Http404("Fornecedor inválido.")
+    if bucket and bucket not in aging.BUCKET_LABELS:
+        raise Http404("Faixa de vencimento inválida.")
+    return supplier, bucket
+
+
+class PayableAgingView(LoginRequiredMixin, TemplateView):
+    """
+    Painel de envelhecimento das contas a pagar: saldo em aberto por faixa de
+    atraso, por fornecedor e no total, obtido com uma única consulta. As
+    linhas de fornecedores são paginadas em memória.
+    """
+    template_name = 'purchases/payable_aging.html'
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        company = self.request.company
+        if not company:
+            raise Http404("Usuário não associado a uma empresa ativa.")
+
+        summary = aging.aging_summary(company)
+        page = Paginator(summary['suppliers'], self.paginate_by).get_page(self.request.GET.get('page'))
+        page.next_querystring = f'page={page.next_page_number()}' if page.has_next() else ''
+        page.previous_querystring = f'page={page.previous_page_number()}' if page.has_previous() else ''
+        page.count = None
+        # Os templates não indexam dicionários por variável: valores na ordem das faixas
+        keys = [key for key, _, _, _ in aging.BUCKETS]
+        for row in page:
+            row['amounts'] = [(key, row[key]) for key in keys]
+        summary['totals']['amounts'] = [(key, summary['totals'][key]) for key in keys]
+        context.update(
+            summary,
+            buckets=aging.BUCKETS,
+            page_obj=page,
+            is_paginated=page.has_other_pages(),
+        )
+        return context
+
+
+class PayableAgingDetailView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """Parcelas em aberto de um fornecedor e/ou faixa do painel, por vencimento."""
+    template_name = 'purchases/payable_aging_detail.html'
+    context_object_name = 'installments'
+    keyset_field = 'due_date'
+
+    def get_queryset(self):
+        company = self.request.company
+        if not company:
+            return PayableAccount.objects.none()
+        self.today = timezone.localdate()
+        self.supplier, self.bucket = _aging_filters(self.request)
+        return aging.drilldown_queryset(
+            company, self.today, supplier=self.supplier, bucket=self.bucket,
+        ).select_related('invoice__supplier')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for installment in context['installments']:
+            installment.days_overdue = max((self.today - installment.due_date).days, 0)
+        context['bucket_label'] = aging.BUCKET_LABELS.get(self.bucket)
+        context['export_querystring'] = self.request.GET.urlencode()
+        return context
+
+
+@login_required
+def export_payable_aging(request):
+    """
+    Exporta em CSV, em fluxo, as parcelas em aberto da empresa com a faixa de
+    atraso de cada uma; aceita os mesmos filtros da lista de parcelas.
+    """
+    company = request.company
+    if not company:
+        raise Http404("Usuário não associado a uma empresa ativa.")
+    supplier, bucket = _aging_filters(request)
+    today = timezone.localdate()
+    rows = aging.export_rows(aging.drilldown_queryset(company, today, supplier=supplier, bucket=bucket), today)
+    response = StreamingHttpResponse(aging.stream_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="contas_a_pagar_{today.isoformat()}.csv"'
+    return response
+
+
 # APIs para o Select2 (endpoints de busca)
-# APIs para o Select2 (endpoints de busca)
+# Protocolo de paginação do Select2: recebe `page` e responde {"results": [...],
+# "pagination": {"more": bool}}. O número de páginas é limitado: além disso o
+# usuário deve refinar a busca. As respostas ficam no cache da empresa e levam
+# um ETag derivado da versão do cache (ver core.cache), que muda a cada
+# gravação nos cadastros: enquanto nada mudar, o navegador recebe 304.
+SELECT2_PAGE_SIZE = 20
+SELECT2_MAX_PAGES = 10
+SELECT2_MAX_TERM = 100
+SELECT2_CACHE_TIMEOUT = 60
+
+
+def _select2_params(request):
+    term = request.GET.get('q', '').strip()[:SELECT2_MAX_TERM]
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    return term, page
+
+
+def _select2_etag(request, *args, **kwargs):
+    if not request.company:
+        return None
+    term, page = _select2_params(request)
+    digest = hashlib.md5(f'{request.path}|{term}|{page}'.encode()).hexdigest()
+    return f'{company_cache.company_version(request.company)}-{digest}'
+
+
+def _select2_response(request, name, search):
+    """
+    Uma página de resultados de `search(termo)`, um queryset já projetado com
+    values(). Lê uma linha a mais para saber se há próxima página.
+    """
+    company = request.company
+    term, page = _select2_params(request)
+    if not company or page > SELECT2_MAX_PAGES:
+        return JsonResponse({'results': [], 'pagination': {'more': False}})
+
+    def compute():
+        start = (page - 1) * SELECT2_PAGE_SIZE
+        rows = list(search(company, term)[start:start + SELECT2_PAGE_SIZE + 1])
+        return {
+            'results': rows[:SELECT2_PAGE_SIZE],
+            'pagination': {'more': len(rows) > SELECT2_PAGE_SIZE and page < SELECT2_MAX_PAGES},
+        }
+
+    digest = hashlib.md5(term.encode()).hexdigest()
+    payload = company_cache.get_or_set(company, name, compute, digest, page, timeout=SELECT2_CACHE_TIMEOUT)
+    return JsonResponse(payload)
+
+
+def _search_suppliers(company, term):
+    return search_suppliers(Supplier.objects.filter(company=company), term).values(
+        'id', 'cnpj', 'phone', 'email', text=F('name'),
+    )
+
+
+def _search_products(company, term):
+    products = Product.objects.filter(company=company)
+    products = search_products(products, term) if term else products.order_by('name', 'pk')
+    return products.values('id', 'sku', text=F('name'))
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_select2_etag)
 def buscar_fornecedores(request):
-    query = request.GET.get('q', '')
-    empresa = request.user.company
-    fornecedores = Supplier.objects.filter(company=empresa, name__icontains=query)
-    # AQUI: Adicionamos mais campos ao resultado
-    resultados = [{'id': f.pk, 'text': f.name, 'cnpj': f.cnpj, 'phone': f.phone, 'email': f.email} for f in fornecedores]
-    return JsonResponse({'results': resultados})
+    return _select2_response(request, 'select2_suppliers', _search_suppliers)
+
 
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_select2_etag)
 def buscar_produtos(request):
-    query = request.GET.get('q', '')
-    empresa = request.user.company
-    produtos = Product.objects.filter(company=empresa, name__icontains=query)
-    resultados = [{'id': p.pk, 'text': p.name} for p in produtos]
-    return JsonResponse({'results': resultados})
+    return _select2_response(request, 'select2_products', _search_products)
@@ -1,12 +1,14 @@
 # stock/admin.py
 from django.contrib import admin
-from .models import StockMovement
+from .models import ArchivedStockMovement, StockBalance, StockCostLayer, StockMovement, StockSnapshot
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
     """
     Configuração do painel de administração para o modelo StockMovement.
     Garante que os campos exibidos em list_display correspondam aos campos do modelo.
+    O histórico é somente de inclusão (ver StockMovement.save): movimentos
+    lançados não são editados nem excluídos, inclusive pela ação em massa.
     """
     list_display = (
         'product',
@@ -17,5 +19,70 @@ class StockMovementAdmin(admin.ModelAdmin):
     )
     list_filter = ('movement_type', 'company')
     search_fields = ('product__name', 'user__username', 'company__name')
-    
 
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """
+    Dados derivados do histórico (saldos, fechamentos, arquivo, camadas FIFO):
+    mantidos pelos movimentos e comandos de estoque, no admin ficam apenas para
+    consulta. Inclusão, alteração ou exclusão manual os deixaria divergentes.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockBalance)
+class StockBalanceAdmin(ReadOnlyAdmin):
+    """
+    Saldos materializados são mantidos pelos movimentos; no admin ficam apenas para consulta.
+    """
+    list_display = ('product', 'quantity', 'company', 'updated_at')
+    list_filter = ('company',)
+    search_fields = ('product__name', 'product__sku')
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(ReadOnlyAdmin):
+    """
+    Fechamentos são gravados pelo comando close_stock_periods; no admin ficam apenas para consulta.
+    """
+    list_display = ('product', 'snapshot_date', 'quantity', 'company')
+    list_filter = ('company', 'snapshot_date')
+    search_fields = ('product__name', 'product__sku')
+    date_hierarchy = 'snapshot_date'
+
+
+@admin.register(ArchivedStockMovement)
+class ArchivedStockMovementAdmin(ReadOnlyAdmin):
+    """
+    Movimentos arquivados ficam disponíveis apenas para consulta.
+    """
+    list_display = ('product', 'movement_type', 'quantity', 'created_at', 'company')
+    list_filter = ('movement_type', 'company')
+    search_fields = ('product__name', 'product__sku')
+    date_hierarchy = 'created_at'
+
+
+@admin.register(StockCostLayer)
+class StockCostLayerAdmin(ReadOnlyAdmin):
+    """
+    Camadas FIFO são mantidas pelos movimentos; no admin ficam apenas para consulta.
+    """
+    list_display = ('product', 'received_at', 'quantity', 'remaining', 'unit_cost', 'company')
+    list_filter = ('company',)
+    search_fields = ('product__name', 'product__sku')
+    date_hierarchy = 'received_at'
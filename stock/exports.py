@@ -0,0 +1,86 @@
+# stock/exports.py
+"""
+Exportação do histórico de movimentações em CSV ou JSONL, gerada em fluxo:
+as linhas são lidas do banco em lotes e escritas uma a uma, de modo que o uso
+de memória não depende da quantidade de movimentos.
+"""
+import json
+from datetime import datetime, time
+
+from django.utils import timezone
+
+from core.streaming import csv_lines
+from .services import end_of_day, ledger_querysets
+
+# Colunas exportadas; nomes relacionados são resolvidos por JOIN na própria consulta
+EXPORT_FIELDS = (
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('movement_type', 'movement_type'),
+    ('product_sku', 'product__sku'),
+    ('product_name', 'product__name'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('supplier', 'supplier__name'),
+    ('customer', 'customer__name'),
+    ('user', 'user__email'),
+    ('notes', 'notes'),
+)
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def ledger_rows(company, start=None, end=None, product=None, movement_type=None, chunk_size=2000):
+    """
+    Gera as linhas do histórico da empresa (movimentos arquivados e atuais, sem
+    as consolidações mensais) em ordem cronológica, como tuplas na ordem de
+    EXPORT_FIELDS.
+    """
+    filters = {'company': company}
+    if start:
+        filters['created_at__gte'] = timezone.make_aware(datetime.combine(start, time.min))
+    if end:
+        filters['created_at__lt'] = end_of_day(end)
+    if product:
+        filters['product'] = product
+    if movement_type:
+        filters['movement_type'] = movement_type
+
+    lookups = [lookup for _, lookup in EXPORT_FIELDS]
+    hot, archived = ledger_querysets(**filters)
+    # Os movimentos arquivados são sempre anteriores aos da tabela principal
+    for movements in (archived, hot):
+        yield from movements.order_by('created_at', 'pk').values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if value is None:
+        return ''
+    return str(value)
+
+
+def _json_default(value):
+    # Decimais e UUIDs viram texto; datas seguem o fuso configurado
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    return str(value)
+
+
+def stream_ledger(rows, fmt='csv'):
+    """
+    Converte as linhas de `ledger_rows` em pedaços de texto no formato pedido,
+    prontos para um StreamingHttpResponse ou para escrita em arquivo.
+    """
+    header = [name for name, _ in EXPORT_FIELDS]
+    if fmt == 'csv':
+        yield from csv_lines(header, ([_serialize(value) for value in row] for row in rows))
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), default=_json_default, ensure_ascii=False) + '\n'
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
@@ -1,9 +1,7 @@
 # stock/forms.py
 from django import forms
+from core.forms import CompanyModelChoiceField
 from .models import StockMovement
-from products.models import Product
-from suppliers.models import Supplier
-from customers.models import Customer
 
 class PurchaseForm(forms.ModelForm):
     """
@@ -12,14 +10,15 @@ class PurchaseForm(forms.ModelForm):
     class Meta:
         model = StockMovement
         fields = ['product', 'quantity', 'supplier', 'unit_price']
+        field_classes = {'product': CompanyModelChoiceField, 'supplier': CompanyModelChoiceField}
 
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
+        company = kwargs.pop('company', None)
         super().__init__(*args, **kwargs)
-        if user and user.company:
-            # Filtra os produtos e fornecedores da empresa do usuário
-            self.fields['product'].queryset = Product.objects.filter(company=user.company)
-            self.fields['supplier'].queryset = Supplier.objects.filter(company=user.company)
+        if company:
+            # Filtra os produtos e fornecedores da empresa do usuário (opções do cache da empresa)
+            self.fields['product'].bind_company(company)
+            self.fields['supplier'].bind_company(company)
 
 
 class SaleForm(forms.ModelForm):
@@ -29,14 +28,15 @@ class SaleForm(forms.ModelForm):
     class Meta:
         model = StockMovement
         fields = ['product', 'quantity', 'customer', 'unit_price']
+        field_classes = {'product': CompanyModelChoiceField, 'customer': CompanyModelChoiceField}
         
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
+        company = kwargs.pop('company', None)
         super().__init__(*args, **kwargs)
-        if user and user.company:
-            # Filtra os produtos e clientes da empresa do usuário
-            self.fields['product'].queryset = Product.objects.filter(company=user.company)
-            self.fields['customer'].queryset = Customer.objects.filter(company=user.company)
+        if company:
+            # Filtra os produtos e clientes da empresa do usuário (opções do cache da empresa)
+            self.fields['product'].bind_company(company)
+            self.fields['customer'].bind_company(company)
 
     def clean_quantity(self):
         # Valida se a quantidade não é negativa
@@ -0,0 +1,50 @@
+# stock/management/commands/archive_stock_ledger.py
+import calendar
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from core.models import Company
+from stock.models import StockSnapshot
+from stock.services import archive_ledger
+
+
+def _month_end(value):
+    try:
+        month = datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError("Informe o mês no formato AAAA-MM.")
+    return month.replace(day=calendar.monthrange(month.year, month.month)[1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva os movimentos de estoque até o fim do mês informado, deixando na tabela "
+        "principal uma consolidação por produto e mês. O mês precisa estar fechado "
+        "(ver close_stock_periods)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', required=True, type=_month_end, help="Último mês a arquivar (AAAA-MM).")
+        parser.add_argument('--company', type=int, help="Arquiva apenas os movimentos desta empresa (ID).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tamanho dos lotes de leitura e gravação.")
+
+    def handle(self, *args, **options):
+        until = options['until']
+        companies = Company.objects.all()
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+
+        for company in companies:
+            last_closed = StockSnapshot.objects.filter(company=company).aggregate(last=Max('snapshot_date'))['last']
+            if last_closed is None or last_closed < until:
+                self.stdout.write(self.style.WARNING(
+                    f"{company}: período até {until:%m/%Y} ainda não fechado; execute close_stock_periods antes."
+                ))
+                continue
+
+            archived, closings = archive_ledger(company, until, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{company}: {archived} movimento(s) arquivado(s), {closings} consolidação(ões) criada(s)."
+            ))
@@ -0,0 +1,32 @@
+# stock/management/commands/backfill_stock_rollups.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import STOCK, bump_company_version
+from stock.models import StockDailyRollup
+from stock.services import ledger_querysets, ledger_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os resumos diários de movimentação (StockDailyRollup) a partir do "
+        "histórico detalhado, atual e arquivado, com uma consulta agrupada por tabela."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Reconstrói apenas os resumos desta empresa (ID).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tamanho dos lotes de inserção.")
+
+    def handle(self, *args, **options):
+        filters = {'company_id': options['company']} if options['company'] else {}
+        rollups = StockDailyRollup.objects.filter(**filters)
+
+        rebuilt = ledger_rollups(ledger_querysets(**filters))
+
+        with transaction.atomic():
+            rollups.delete()
+            StockDailyRollup.objects.bulk_create(rebuilt, batch_size=options['batch_size'])
+            for company_id in {rollup.company_id for rollup in rebuilt}:
+                bump_company_version(company_id, STOCK)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(rebuilt)} resumo(s) diário(s) reconstruído(s)."))
@@ -0,0 +1,231 @@
+# stock/management/commands/benchmark_query_plans.py
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from core.models import Company
+from customers.models import Customer
+from customers.views import CustomerListView
+from products.models import Product
+from products.views import ProductListView
+from purchases.models import PayableAccount, PurchaseInvoice
+from purchases.views import PayableAgingDetailView, PurchaseInvoiceListView
+from stock.models import StockMovement
+from suppliers.models import Supplier
+from suppliers.search import search_suppliers
+from suppliers.views import SupplierListView
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera uma massa de dados grande em uma empresa própria do benchmark e verifica, via "
+        "EXPLAIN QUERY PLAN, que as consultas principais usam os índices compostos (sem varredura "
+        "completa nem ordenação em tabela temporária), incluindo as páginas seguintes e anteriores "
+        "das listas paginadas por cursor. Os dados são descartados ao final."
+    )
+
+    BENCHMARK_CNPJ = "00.000.000/0000-01"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help="Produtos gerados.")
+        parser.add_argument('--movements', type=int, default=100000, help="Movimentos de estoque gerados.")
+        parser.add_argument('--invoices', type=int, default=5000, help="Notas de compra geradas (com uma parcela cada).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Os planos esperados foram definidos para o SQLite.")
+
+        try:
+            with transaction.atomic():
+                company = self._seed(options)
+                failures = self._check_plans(company)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError("Consultas sem o índice esperado: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Todas as consultas usam os índices esperados."))
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        company = Company.objects.create(
+            name="Benchmark de Índices", cnpj=self.BENCHMARK_CNPJ, address="-", city="-", state="SP",
+        )
+        # Outra empresa com volume semelhante, para que o filtro por empresa seja seletivo
+        other = Company.objects.create(
+            name="Benchmark de Índices (outra)", cnpj="00.000.000/0000-02", address="-", city="-", state="SP",
+        )
+
+        products = []
+        for owner in (company, other):
+            products += Product.objects.bulk_create(
+                [
+                    Product(company=owner, name=f"Produto {index:06d}", sku=f"B{index:06d}", sale_price=1)
+                    for index in range(options['products'])
+                ],
+                batch_size=1000,
+            )
+
+        now = timezone.now()
+        types = [StockMovement.MovementType.PURCHASE, StockMovement.MovementType.SALE]
+        StockMovement.objects.bulk_create(
+            (
+                StockMovement(
+                    company_id=product.company_id, product=product, movement_type=random.choice(types),
+                    quantity=1, unit_price=1, created_at=now,
+                )
+                for product in (random.choice(products) for _ in range(options['movements']))
+            ),
+            batch_size=1000,
+        )
+        # created_at é auto_now_add: espalha as datas em um ano com um único UPDATE por lote de dias
+        for offset in range(0, 365, 7):
+            StockMovement.objects.filter(
+                pk__in=StockMovement.objects.filter(created_at=now).values('pk')[:options['movements'] // 52]
+            ).update(created_at=now - timedelta(days=offset))
+
+        suppliers = []
+        for owner in (company, other):
+            suppliers += Supplier.objects.bulk_create([
+                Supplier(
+                    company=owner, name=f"Fornecedor {index}", cnpj=f"{owner.pk:04d}{index:010d}",
+                    email=f"f{owner.pk}-{index}@benchmark.local", phone="-", address="-", city="-", state="SP",
+                )
+                for index in range(20)
+            ])
+
+        for owner in (company, other):
+            Customer.objects.bulk_create(
+                [Customer(company=owner, name=f"Cliente {index:06d}") for index in range(options['products'])],
+                batch_size=1000,
+            )
+
+        statuses = PurchaseInvoice.InvoiceStatus.values
+        today = date.today()
+        invoices = PurchaseInvoice.objects.bulk_create(
+            [
+                PurchaseInvoice(
+                    company_id=supplier.company_id, supplier=supplier, invoice_number=str(index),
+                    issue_date=today - timedelta(days=index % 365), status=random.choice(statuses),
+                )
+                for index, supplier in ((index, random.choice(suppliers)) for index in range(options['invoices']))
+            ],
+            batch_size=1000,
+        )
+        payable_statuses = PayableAccount.PaymentStatus.values
+        PayableAccount.objects.bulk_create(
+            [
+                PayableAccount(
+                    company_id=invoice.company_id, invoice=invoice, amount=1,
+                    due_date=invoice.issue_date + timedelta(days=30), status=random.choice(payable_statuses),
+                )
+                for invoice in invoices
+            ],
+            batch_size=1000,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Massa de dados gerada em {time.perf_counter() - started:.1f}s.")
+        return company
+
+    def _check_plans(self, company):
+        product = Product.objects.filter(company=company).first()
+        now = timezone.now()
+        checks = [
+            (
+                "histórico do produto",
+                StockMovement.objects.filter(company=company, product=product).order_by('-created_at'),
+                'stock_mov_product_date_idx',
+            ),
+            (
+                "saldo do produto em uma data",
+                StockMovement.objects.filter(
+                    company=company, product=product, created_at__lt=now - timedelta(days=30),
+                ).values('product_id').order_by(),
+                'stock_mov_product_date_idx',
+            ),
+            (
+                "exportação do período",
+                StockMovement.objects.filter(
+                    company=company, created_at__gte=now - timedelta(days=30), created_at__lt=now,
+                ).order_by('created_at'),
+                'stock_mov_company_date_idx',
+            ),
+            (
+                "notas por situação",
+                PurchaseInvoice.objects.filter(company=company, status=PurchaseInvoice.InvoiceStatus.DRAFT),
+                'purchase_inv_status_idx',
+            ),
+            (
+                "contas a pagar vencidas",
+                PayableAccount.objects.filter(
+                    company=company, status=PayableAccount.PaymentStatus.PENDING, due_date__lt=date.today(),
+                ).order_by('due_date'),
+                'payable_status_due_idx',
+            ),
+            (
+                "busca de fornecedores por prefixo",
+                search_suppliers(Supplier.objects.filter(company=company), "forn").values('id', 'name')[:21],
+                'supplier_search_name_idx',
+            ),
+        ]
+        for label, view_class, index in (
+            ("catálogo de produtos", ProductListView, 'product_company_name_idx'),
+            ("lista de clientes", CustomerListView, 'customer_company_name_idx'),
+            ("lista de fornecedores", SupplierListView, 'supplier_company_name_idx'),
+            ("lista de notas de compra", PurchaseInvoiceListView, 'purchase_inv_company_date_idx'),
+            ("parcelas em aberto", PayableAgingDetailView, 'payable_company_due_idx'),
+        ):
+            checks += self._keyset_checks(company, label, view_class, index)
+
+        failures = []
+        for label, queryset, index in checks:
+            plan = queryset.explain()
+            lines = plan.splitlines()
+            ok = (
+                index in plan
+                and not any(' SCAN ' in f' {line} ' for line in lines)
+                and 'TEMP B-TREE' not in plan
+            )
+            self.stdout.write(f"{'OK ' if ok else 'ERRO'} {label}: {' | '.join(line.strip() for line in lines)}")
+            if not ok:
+                failures.append(label)
+        return failures
+
+    def _list_view(self, view_class, company, params):
+        request = RequestFactory().get('/', params)
+        request.user = AnonymousUser()
+        request.company = company
+        view = view_class()
+        view.setup(request)
+        return view
+
+    def _keyset_checks(self, company, label, view_class, index):
+        """
+        Consultas de uma lista paginada por cursor como a view as executa: a
+        primeira página e, com o cursor do fim dela, a seguinte e a anterior.
+        """
+        checks = []
+        token = None
+        for param, page in ((None, "primeira página"), ('after', "próxima página"), ('before', "página anterior")):
+            view = self._list_view(view_class, company, {param: token} if param else {})
+            field = view.get_keyset_field()
+            rows, _, _ = view.keyset_queryset(view.get_queryset(), field)
+            if token is None:
+                # Cursor da última linha da primeira página, como no link "próxima"
+                last = rows[view.paginate_by - 1]
+                token = view._encode_cursor(last, field.lstrip('-'))
+            checks.append((f"{label} ({page})", rows[:view.paginate_by + 1], index))
+        return checks
@@ -0,0 +1,107 @@
+# stock/management/commands/benchmark_stock_contention.py
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from core.models import Company
+from products.models import Product
+from stock.models import StockMovement
+from stock.services import save_movement
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a vazão de vendas concorrentes de um mesmo produto (N vendedores em paralelo) "
+        "e verifica que o saldo nunca fica negativo. Usa uma empresa e um produto próprios do "
+        "benchmark, apagados ao final com tudo o que foi gerado."
+    )
+
+    BENCHMARK_CNPJ = "00.000.000/0000-00"
+
+    def _reset(self):
+        # Apaga a empresa do benchmark: o CASCADE remove o produto, os movimentos e
+        # tudo o que deriva deles (saldo, camadas FIFO e seus consumos, consolidações
+        # diárias), inclusive as tabelas ligadas ao movimento sem chave estrangeira
+        Company.objects.filter(cnpj=self.BENCHMARK_CNPJ).delete()
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=8, help="Número de vendedores (threads) em paralelo.")
+        parser.add_argument('--sales', type=int, default=50, help="Vendas por vendedor.")
+        parser.add_argument('--initial-stock', type=int, help="Estoque inicial. Padrão: metade da demanda total.")
+        parser.add_argument('--keep', action='store_true', help="Mantém os dados gerados após o benchmark.")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError("O benchmark precisa de um banco em arquivo (threads não compartilham banco em memória).")
+
+        sellers, sales = options['sellers'], options['sales']
+        initial_stock = options['initial_stock']
+        if initial_stock is None:
+            initial_stock = sellers * sales // 2
+
+        # Descarta sobras de uma execução anterior (--keep ou interrompida)
+        self._reset()
+        company = Company.objects.create(
+            cnpj=self.BENCHMARK_CNPJ, name="Benchmark de Concorrência", address="-", city="-", state="SP",
+        )
+        product = Product.objects.create(company=company, sku="BENCH-001", name="Produto Benchmark", sale_price=1)
+        StockMovement.objects.create(
+            company=company, product=product, movement_type=StockMovement.MovementType.PURCHASE,
+            quantity=initial_stock, unit_price=1,
+        )
+
+        results = {'sold': 0, 'rejected': 0, 'failed': 0}
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(sellers)
+
+        def seller():
+            counts = {'sold': 0, 'rejected': 0, 'failed': 0}
+            start_barrier.wait()
+            try:
+                for _ in range(sales):
+                    movement = StockMovement(
+                        company=company, product_id=product.pk,
+                        movement_type=StockMovement.MovementType.SALE, quantity=1, unit_price=1,
+                    )
+                    try:
+                        save_movement(movement)
+                        counts['sold'] += 1
+                    except ValidationError:
+                        counts['rejected'] += 1
+                    except OperationalError:
+                        counts['failed'] += 1
+            finally:
+                connection.close()
+            with lock:
+                for key, value in counts.items():
+                    results[key] += value
+
+        threads = [threading.Thread(target=seller) for _ in range(sellers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        balance = Product.objects.select_related('stock_balance').get(pk=product.pk).stock_quantity
+        ledger = product.movements.aggregate(total=Sum('quantity'))['total'] or 0
+        attempts = sellers * sales
+
+        self.stdout.write(f"Vendedores: {sellers} | Tentativas: {attempts} | Estoque inicial: {initial_stock}")
+        self.stdout.write(
+            f"Vendidas: {results['sold']} | Recusadas: {results['rejected']} | Falhas após retentativas: {results['failed']}"
+        )
+        self.stdout.write(f"Tempo: {elapsed:.2f}s | Vazão: {attempts / elapsed:.1f} operações/s")
+        self.stdout.write(f"Saldo final: {balance} | Soma do histórico: {ledger}")
+
+        if not options['keep']:
+            self._reset()
+
+        if balance < 0 or balance != ledger or results['sold'] > initial_stock:
+            raise CommandError("Inconsistência detectada: o estoque foi vendido além do disponível.")
+        self.stdout.write(self.style.SUCCESS("Nenhuma venda além do estoque disponível."))
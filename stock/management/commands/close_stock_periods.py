@@ -0,0 +1,73 @@
+# stock/management/commands/close_stock_periods.py
+import calendar
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from core.models import Company
+from stock.models import StockSnapshot
+from stock.services import close_stock_period, ledger_querysets
+
+
+def _period_end(day, period):
+    if period == 'day':
+        return day
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Fecha os períodos de estoque gravando snapshots de saldo por produto. "
+        "Continua a partir do último fechamento de cada empresa; sem fechamentos "
+        "anteriores, faz o backfill desde o primeiro movimento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=['day', 'month'], default='month', help="Granularidade dos fechamentos.")
+        parser.add_argument('--until', type=date.fromisoformat, help="Último dia a fechar (AAAA-MM-DD). Padrão: último período completo.")
+        parser.add_argument('--company', type=int, help="Fecha apenas os períodos desta empresa (ID).")
+        parser.add_argument('--rebuild', action='store_true', help="Apaga os fechamentos existentes e refaz o backfill.")
+
+    def handle(self, *args, **options):
+        period = options['period']
+        today = timezone.localdate()
+        until = options['until']
+        if until is None:
+            until = today - timedelta(days=1) if period == 'day' else today.replace(day=1) - timedelta(days=1)
+        if until >= today:
+            raise CommandError("Só é possível fechar períodos já encerrados.")
+
+        companies = Company.objects.all()
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+
+        for company in companies:
+            if options['rebuild']:
+                StockSnapshot.objects.filter(company=company).delete()
+
+            last_closed = StockSnapshot.objects.filter(company=company).aggregate(last=Max('snapshot_date'))['last']
+            if last_closed:
+                start = last_closed + timedelta(days=1)
+            else:
+                first_dates = [
+                    movements.aggregate(first=Min('created_at'))['first']
+                    for movements in ledger_querysets(company=company)
+                ]
+                first_dates = [value for value in first_dates if value is not None]
+                if not first_dates:
+                    continue
+                start = timezone.localtime(min(first_dates)).date()
+
+            closed = 0
+            opening = None
+            while _period_end(start, period) <= until:
+                end = _period_end(start, period)
+                with transaction.atomic():
+                    opening = close_stock_period(company, start, end, opening)
+                closed += 1
+                start = end + timedelta(days=1)
+
+            self.stdout.write(self.style.SUCCESS(f"{company}: {closed} período(s) fechado(s)."))
@@ -0,0 +1,47 @@
+# stock/management/commands/export_stock_ledger.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Company
+from stock.exports import FORMATS, ledger_rows, stream_ledger
+from stock.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = "Exporta o histórico de movimentações de uma empresa em CSV ou JSONL, em fluxo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True, help="ID da empresa.")
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', help="Formato do arquivo.")
+        parser.add_argument('--output', help="Arquivo de saída. Padrão: saída padrão.")
+        parser.add_argument('--start', type=date.fromisoformat, help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument('--end', type=date.fromisoformat, help="Data final (AAAA-MM-DD).")
+        parser.add_argument('--product', help="ID do produto.")
+        parser.add_argument('--type', dest='movement_type', choices=StockMovement.MovementType.values, help="Tipo de movimento.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Linhas lidas do banco por lote.")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError("Empresa não encontrada.")
+
+        rows = ledger_rows(
+            company,
+            start=options['start'],
+            end=options['end'],
+            product=options['product'],
+            movement_type=options['movement_type'],
+            chunk_size=options['chunk_size'],
+        )
+
+        chunks = stream_ledger(rows, options['format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
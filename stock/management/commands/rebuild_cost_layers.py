@@ -0,0 +1,68 @@
+# stock/management/commands/rebuild_cost_layers.py
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import STOCK, bump_company_version
+from core.models import Company
+from stock.models import StockCostLayer, StockMovement
+from stock.services import apply_fifo, ledger_querysets, weighted_average_cost
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói as camadas de custo FIFO reprocessando o histórico detalhado "
+        "(arquivado e atual) em ordem cronológica, em lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Reconstrói apenas esta empresa (ID).")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Movimentos processados por lote.")
+
+    def handle(self, *args, **options):
+        companies = Company.objects.order_by('pk')
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+
+        chunk_size = options['chunk_size']
+        return_type = StockMovement.MovementType.RETURN_IN
+        for company in companies:
+            processed = 0
+            with transaction.atomic():
+                StockCostLayer.objects.filter(company=company).delete()
+                hot, archived = ledger_querysets(company=company)
+
+                # Custo médio e saldo correntes por produto, para que as devoluções
+                # entrem pelo custo médio da época e não pelo atual
+                state = {}
+                chunk, return_costs = [], {}
+
+                def flush():
+                    nonlocal chunk, return_costs, processed
+                    apply_fifo(chunk, batch_size=chunk_size, return_costs=return_costs)
+                    processed += len(chunk)
+                    chunk, return_costs = [], {}
+
+                # Os movimentos arquivados são sempre anteriores aos da tabela principal
+                for queryset in (archived, hot):
+                    for movement in queryset.order_by('product_id', 'created_at', 'pk').iterator(chunk_size=chunk_size):
+                        balance, average_cost = state.get(movement.product_id, (0, Decimal('0.00')))
+                        if movement.movement_type == return_type:
+                            return_costs[movement.pk] = average_cost
+                        elif movement.movement_type in StockMovement.COST_TYPES:
+                            average_cost = weighted_average_cost(
+                                balance, average_cost, movement.quantity, movement.unit_price,
+                            )
+                        state[movement.product_id] = (balance + movement.quantity, average_cost)
+
+                        chunk.append(movement)
+                        if len(chunk) >= chunk_size:
+                            flush()
+                if chunk:
+                    flush()
+                bump_company_version(company, STOCK)
+
+            self.stdout.write(f"{company.name}: {processed} movimento(s) processado(s).")
+
+        self.stdout.write(self.style.SUCCESS("Camadas de custo FIFO reconstruídas."))
@@ -0,0 +1,52 @@
+# stock/management/commands/rebuild_stock_balances.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from products.models import Product
+from stock.models import StockBalance, StockMovement
+from stock.services import refresh_below_minimum
+
+
+class Command(BaseCommand):
+    help = "Reconstrói os saldos materializados de estoque (StockBalance) a partir do histórico de movimentações."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Reconstrói apenas os saldos desta empresa (ID).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tamanho dos lotes de inserção.")
+
+    def handle(self, *args, **options):
+        movements = StockMovement.objects.all()
+        balances = StockBalance.objects.all()
+        if options['company']:
+            movements = movements.filter(company_id=options['company'])
+            balances = balances.filter(company_id=options['company'])
+
+        # Uma única consulta agrupada por produto sobre o histórico
+        totals = (
+            movements.order_by()
+            .values('company_id', 'product_id')
+            .annotate(total=Sum('quantity'), last_movement_at=Max('created_at'))
+        )
+
+        with transaction.atomic():
+            balances.delete()
+            created = StockBalance.objects.bulk_create(
+                (
+                    StockBalance(
+                        company_id=row['company_id'],
+                        product_id=row['product_id'],
+                        quantity=row['total'] or 0,
+                        last_movement_at=row['last_movement_at'],
+                    )
+                    for row in totals.iterator()
+                ),
+                batch_size=options['batch_size'],
+            )
+
+            products = Product.objects.all()
+            if options['company']:
+                products = products.filter(company_id=options['company'])
+            refresh_below_minimum(products.values('pk'))
+
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} saldo(s) de estoque reconstruído(s)."))
@@ -0,0 +1,65 @@
+# stock/management/commands/recalculate_average_cost.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product
+from stock.models import StockMovement
+from stock.services import weighted_average_cost
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o custo médio ponderado dos produtos reprocessando o histórico de "
+        "movimentações em ordem cronológica, lido em lotes para manter a memória constante."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Recalcula apenas os produtos desta empresa (ID).")
+        parser.add_argument('--product', action='append', default=[], help="ID de produto a recalcular (pode repetir).")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Linhas lidas do histórico por lote.")
+
+    def handle(self, *args, **options):
+        movements = StockMovement.objects.all()
+        if options['company']:
+            movements = movements.filter(company_id=options['company'])
+        if options['product']:
+            movements = movements.filter(product_id__in=options['product'])
+
+        ledger = (
+            movements.order_by('product_id', 'created_at', 'pk')
+            .values_list('product_id', 'movement_type', 'quantity', 'unit_price')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+
+        pending = []
+        updated = 0
+        current, balance, average_cost = None, 0, 0
+
+        def flush():
+            nonlocal pending, updated
+            with transaction.atomic():
+                Product.objects.bulk_update(pending, ['average_cost'])
+            updated += len(pending)
+            pending = []
+
+        for product_id, movement_type, quantity, unit_price in ledger:
+            if product_id != current:
+                if current is not None:
+                    pending.append(Product(pk=current, average_cost=average_cost))
+                    if len(pending) >= options['chunk_size']:
+                        flush()
+                current, balance, average_cost = product_id, 0, 0
+
+            if movement_type == StockMovement.MovementType.CLOSING:
+                # Consolidação de mês arquivado: traz o custo médio ao final do mês
+                average_cost = unit_price
+            elif movement_type in StockMovement.COST_TYPES:
+                average_cost = weighted_average_cost(balance, average_cost, quantity, unit_price)
+            balance += quantity
+
+        if current is not None:
+            pending.append(Product(pk=current, average_cost=average_cost))
+        if pending:
+            flush()
+
+        self.stdout.write(self.style.SUCCESS(f"Custo médio recalculado para {updated} produto(s)."))
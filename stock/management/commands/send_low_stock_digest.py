@@ -0,0 +1,51 @@
+# stock/management/commands/send_low_stock_digest.py
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from core.models import Company, CompanyUser
+from stock.services import low_stock_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Envia aos administradores de cada empresa o resumo diário dos produtos abaixo do "
+        "estoque mínimo, lido do indicador pré-calculado (Product.below_minimum)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Envia apenas para esta empresa (ID).")
+
+    def handle(self, *args, **options):
+        companies = Company.objects.filter(products__below_minimum=True, products__active=True).distinct().order_by('pk')
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+
+        today = timezone.localdate()
+        sent = 0
+        for company in companies:
+            recipients = list(
+                CompanyUser.objects.filter(company=company, role='admin', active=True, user__is_active=True)
+                .exclude(user__email='')
+                .values_list('user__email', flat=True)
+            )
+            if not recipients:
+                continue
+
+            products = list(low_stock_products(company))
+            message = render_to_string('stock/email/low_stock_digest.txt', {
+                'company': company,
+                'products': products,
+                'today': today,
+            })
+            send_mail(
+                f"[{company.name}] Estoque baixo em {today:%d/%m/%Y}",
+                message,
+                settings.DEFAULT_FROM_EMAIL,
+                recipients,
+            )
+            sent += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Resumo de estoque baixo enviado para {sent} empresa(s)."))
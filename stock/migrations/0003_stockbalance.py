@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_balances(apps, schema_editor):
+    StockMovement = apps.get_model('stock', 'StockMovement')
+    StockBalance = apps.get_model('stock', 'StockBalance')
+    totals = StockMovement.objects.order_by().values('company_id', 'product_id').annotate(total=Sum('quantity'))
+    StockBalance.objects.bulk_create(
+        [StockBalance(company_id=row['company_id'], product_id=row['product_id'], quantity=row['total'] or 0) for row in totals],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('products', '0002_alter_product_id'),
+        ('stock', '0002_alter_stockmovement_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantidade')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado Em')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_balances', to='core.company', verbose_name='Empresa')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_balance', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Estoque',
+                'verbose_name_plural': 'Saldos de Estoque',
+                'unique_together': {('company', 'product')},
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:25
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def populate_last_movement_at(apps, schema_editor):
+    StockMovement = apps.get_model('stock', 'StockMovement')
+    StockBalance = apps.get_model('stock', 'StockBalance')
+    last_movement = (
+        StockMovement.objects.filter(product_id=OuterRef('product_id'))
+        .order_by().values('product_id').annotate(last=Max('created_at')).values('last')
+    )
+    StockBalance.objects.update(last_movement_at=Subquery(last_movement))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0004_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockbalance',
+            name='last_movement_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último Movimento'),
+        ),
+        migrations.RunPython(populate_last_movement_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('customers', '0001_initial'),
+        ('products', '0002_alter_product_id'),
+        ('stock', '0005_stockbalance_last_movement_at'),
+        ('suppliers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='movement_type',
+            field=models.CharField(choices=[('IN', 'Compra (Entrada)'), ('OUT', 'Venda (Saída)'), ('ADJ_IN', 'Ajuste (Entrada)'), ('ADJ_OUT', 'Ajuste (Saída)'), ('RET_IN', 'Devolução (Entrada)'), ('RET_OUT', 'Devolução (Saída)'), ('CLOSE', 'Consolidação de Período')], max_length=10, verbose_name='Tipo de Movimento'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedStockMovement',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('movement_type', models.CharField(choices=[('IN', 'Compra (Entrada)'), ('OUT', 'Venda (Saída)'), ('ADJ_IN', 'Ajuste (Entrada)'), ('ADJ_OUT', 'Ajuste (Saída)'), ('RET_IN', 'Devolução (Entrada)'), ('RET_OUT', 'Devolução (Saída)'), ('CLOSE', 'Consolidação de Período')], max_length=10, verbose_name='Tipo de Movimento')),
+                ('quantity', models.IntegerField(verbose_name='Quantidade')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Preço/Custo Unitário')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Observações')),
+                ('created_at', models.DateTimeField(verbose_name='Data do Movimento')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Arquivado Em')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_stock_movements', to='core.company', verbose_name='Empresa')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='customers.customer', verbose_name='Cliente')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_movements', to='products.product', verbose_name='Produto')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='suppliers.supplier', verbose_name='Fornecedor')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Movimentação Arquivada',
+                'verbose_name_plural': 'Movimentações Arquivadas',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('products', '0002_alter_product_id'),
+        ('stock', '0006_archivedstockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_at', models.DateTimeField(verbose_name='Data de Entrada')),
+                ('quantity', models.IntegerField(verbose_name='Quantidade Recebida')),
+                ('remaining', models.IntegerField(verbose_name='Quantidade Restante')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Custo Unitário')),
+                ('depleted_at', models.DateTimeField(blank=True, null=True, verbose_name='Esgotada Em')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_cost_layers', to='core.company', verbose_name='Empresa')),
+                ('movement', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='stock.stockmovement', verbose_name='Movimento de Origem')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Camada de Custo (FIFO)',
+                'verbose_name_plural': 'Camadas de Custo (FIFO)',
+                'ordering': ['received_at', 'pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLayerConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Quantidade')),
+                ('consumed_at', models.DateTimeField(verbose_name='Data do Consumo')),
+                ('layer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumptions', to='stock.stockcostlayer', verbose_name='Camada')),
+                ('movement', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='stock.stockmovement', verbose_name='Movimento de Saída')),
+            ],
+            options={
+                'verbose_name': 'Consumo de Camada',
+                'verbose_name_plural': 'Consumos de Camadas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockcostlayer',
+            index=models.Index(fields=['product', 'received_at'], name='stock_layer_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockcostlayer',
+            index=models.Index(fields=['company', 'depleted_at'], name='stock_layer_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocklayerconsumption',
+            index=models.Index(fields=['layer', 'consumed_at'], name='stock_consumption_layer_idx'),
+        ),
+    ]
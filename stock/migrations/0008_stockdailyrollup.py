@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('products', '0003_product_reorder_point'),
+        ('stock', '0007_stockcostlayer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('IN', 'Compra (Entrada)'), ('OUT', 'Venda (Saída)'), ('ADJ_IN', 'Ajuste (Entrada)'), ('ADJ_OUT', 'Ajuste (Saída)'), ('RET_IN', 'Devolução (Entrada)'), ('RET_OUT', 'Devolução (Saída)'), ('CLOSE', 'Consolidação de Período')], max_length=10, verbose_name='Tipo de Movimento')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('quantity_in', models.IntegerField(default=0, verbose_name='Quantidade de Entrada')),
+                ('quantity_out', models.IntegerField(default=0, verbose_name='Quantidade de Saída')),
+                ('value_in', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor de Entrada')),
+                ('value_out', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor de Saída')),
+                ('movements', models.PositiveIntegerField(default=0, verbose_name='Movimentos')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_rollups', to='core.company', verbose_name='Empresa')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Estoque',
+                'verbose_name_plural': 'Resumos Diários de Estoque',
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['company', 'product', 'day'], name='stock_rollup_product_idx'), models.Index(fields=['company', 'day'], name='stock_rollup_company_idx')],
+                'unique_together': {('product', 'movement_type', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('customers', '0001_initial'),
+        ('products', '0004_composite_indexes'),
+        ('stock', '0008_stockdailyrollup'),
+        ('suppliers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedstockmovement',
+            index=models.Index(fields=['company', 'product', 'created_at'], name='stock_arch_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedstockmovement',
+            index=models.Index(fields=['company', 'created_at'], name='stock_arch_company_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['company', 'product', 'created_at'], name='stock_mov_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['company', 'created_at'], name='stock_mov_company_date_idx'),
+        ),
+    ]
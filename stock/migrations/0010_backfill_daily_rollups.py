@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from stock.services import ledger_rollups
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    # Mesmo cálculo do comando backfill_stock_rollups, sobre os modelos históricos.
+    # Os resumos já gravados incrementalmente são descartados e recalculados.
+    StockMovement = apps.get_model('stock', 'StockMovement')
+    ArchivedStockMovement = apps.get_model('stock', 'ArchivedStockMovement')
+    StockDailyRollup = apps.get_model('stock', 'StockDailyRollup')
+    rollups = ledger_rollups(
+        (StockMovement.objects.exclude(movement_type='CLOSE'), ArchivedStockMovement.objects.all()),
+        model=StockDailyRollup,
+    )
+    StockDailyRollup.objects.all().delete()
+    StockDailyRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0009_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
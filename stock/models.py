@@ -4,6 +4,7 @@ import uuid
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from products.models import Product
 from suppliers.models import Supplier
 from customers.models import Customer
@@ -22,6 +23,8 @@ class StockMovement(models.Model):
         ADJUSTMENT_OUT = 'ADJ_OUT', 'Ajuste (Saída)'
         RETURN_IN = 'RET_IN', 'Devolução (Entrada)'
         RETURN_OUT = 'RET_OUT', 'Devolução (Saída)'
+        # Resumo líquido de um mês cujos movimentos foram arquivados (ver archive_stock_ledger)
+        CLOSING = 'CLOSE', 'Consolidação de Período'
 
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_movements', verbose_name="Empresa")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Usuário")
@@ -44,30 +47,232 @@ class StockMovement(models.Model):
         verbose_name = "Movimentação de Estoque"
         verbose_name_plural = "Movimentações de Estoque"
         ordering = ['-created_at']
+        # Consultas do histórico sempre filtram pela empresa e ordenam pela data:
+        # por produto (saldo em data, exportação por produto, arquivamento) ou
+        # pela empresa inteira em um período (exportação, fechamentos)
+        indexes = [
+            models.Index(fields=['company', 'product', 'created_at'], name='stock_mov_product_date_idx'),
+            models.Index(fields=['company', 'created_at'], name='stock_mov_company_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} de {self.product.name}: {self.quantity}"
 
+    # Tipos de movimento que retiram produtos do estoque (quantidade negativa)
+    OUTBOUND_TYPES = (MovementType.SALE, MovementType.ADJUSTMENT_OUT, MovementType.RETURN_OUT)
+    # Entradas cujo preço unitário é um custo e, portanto, compõem o custo médio.
+    # Devoluções de clientes voltam ao estoque pelo custo médio vigente.
+    COST_TYPES = (MovementType.PURCHASE, MovementType.ADJUSTMENT_IN)
+
+    def normalize_quantity(self):
+        """
+        Garante que a quantidade seja negativa para saídas e positiva para entradas.
+        """
+        if self.movement_type == self.MovementType.CLOSING:
+            return
+        if self.movement_type in self.OUTBOUND_TYPES:
+            self.quantity = -abs(self.quantity)
+        else:
+            self.quantity = abs(self.quantity)
+
     def save(self, *args, **kwargs):
-        # Garante que a quantidade seja negativa para saídas e positiva para entradas
+        from . import services
+
+        # O histórico é somente de inclusão: saldos, camadas FIFO, custo médio e
+        # consolidações diárias derivam dele. Correções são lançadas como estorno.
+        if not self._state.adding:
+            raise ValidationError(
+                "Movimentações de estoque não podem ser alteradas; lance um movimento de estorno."
+            )
+
         # Esta lógica é melhor aqui do que no form, pois se aplica a qualquer criação de objeto.
-        if self.movement_type in [self.MovementType.SALE, self.MovementType.ADJUSTMENT_OUT, self.MovementType.RETURN_OUT]:
-            if self.quantity > 0:
-                self.quantity = -self.quantity
-        else: # Entradas
+        self.normalize_quantity()
+
+        with transaction.atomic():
             if self.quantity < 0:
-                self.quantity = abs(self.quantity)
+                # Antes de salvar uma saída, reserva o saldo com um decremento condicional
+                # atômico: se não houver estoque suficiente, nada é alterado e a saída é recusada.
+                services.reserve_stock(self.product, abs(self.quantity))
+                delta = 0
+            else:
+                if self.movement_type in self.COST_TYPES:
+                    # O custo médio usa o saldo anterior à entrada, por isso é calculado antes
+                    services.update_average_cost(self.product, self.quantity, self.unit_price)
+                delta = self.quantity
+
+            super().save(*args, **kwargs)
+
+            # O saldo materializado é atualizado na mesma transação do movimento
+            services.apply_balance_deltas({(self.company_id, self.product_id): delta}, moved_at=self.created_at)
+            services.apply_fifo([self])
+            services.apply_rollups([self])
+            services.clear_cached_balance(self.product)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError(
+            "Movimentações de estoque não podem ser excluídas; lance um movimento de estorno."
+        )
+
+
+class StockBalance(models.Model):
+    """
+    Saldo materializado de estoque por (empresa, produto).
+    É atualizado na mesma transação de cada movimento, permitindo ler o estoque
+    atual sem somar o histórico. O histórico (StockMovement) continua sendo a
+    fonte da verdade: o comando `rebuild_stock_balances` reconstrói esta tabela.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_balances', verbose_name="Empresa")
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='stock_balance', verbose_name="Produto")
+    quantity = models.IntegerField("Quantidade", default=0)
+    last_movement_at = models.DateTimeField("Último Movimento", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado Em")
+
+    class Meta:
+        verbose_name = "Saldo de Estoque"
+        verbose_name_plural = "Saldos de Estoque"
+        unique_together = ('company', 'product')
 
-        # Antes de salvar, valida se há estoque suficiente para uma saída
-        if self.pk is None and self.quantity < 0: # Apenas na criação de um novo movimento de saída
-            stock_atual = self.product.stock_quantity
-            if stock_atual < abs(self.quantity):
-                raise ValidationError(
-                    f"Estoque insuficiente para {self.product.name}. "
-                    f"Disponível: {stock_atual}, Saída: {abs(self.quantity)}"
-                )
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity}"
+
+
+class StockSnapshot(models.Model):
+    """
+    Saldo de fechamento de um produto ao final de um período (dia ou mês).
+    Permite consultar o estoque em uma data passada a partir do snapshot mais
+    próximo somado aos movimentos posteriores, sem percorrer todo o histórico.
+    Os snapshots são gerados pelo comando `close_stock_periods`.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_snapshots', verbose_name="Empresa")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots', verbose_name="Produto")
+    snapshot_date = models.DateField("Data de Fechamento")
+    quantity = models.IntegerField("Quantidade")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fechamento de Estoque"
+        verbose_name_plural = "Fechamentos de Estoque"
+        unique_together = ('product', 'snapshot_date')
+        ordering = ['-snapshot_date']
 
-        super().save(*args, **kwargs)
+    def __str__(self):
+        return f"{self.product.name} em {self.snapshot_date:%d/%m/%Y}: {self.quantity}"
+
+
+class ArchivedStockMovement(models.Model):
+    """
+    Cópia dos movimentos de estoque de períodos já fechados que foram retirados
+    da tabela principal pelo comando `archive_stock_ledger`. Na tabela principal
+    fica apenas uma consolidação por produto e mês (MovementType.CLOSING), o que
+    mantém os saldos exatos; o detalhe continua disponível para consulta aqui.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='archived_stock_movements', verbose_name="Empresa")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Usuário")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='archived_movements', verbose_name="Produto")
+    movement_type = models.CharField(max_length=10, choices=StockMovement.MovementType.choices, verbose_name="Tipo de Movimento")
+    quantity = models.IntegerField("Quantidade")
+    unit_price = models.DecimalField("Preço/Custo Unitário", max_digits=10, decimal_places=2)
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Fornecedor")
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Cliente")
+    notes = models.TextField(blank=True, null=True, verbose_name="Observações")
+    created_at = models.DateTimeField("Data do Movimento")
+    archived_at = models.DateTimeField("Arquivado Em", auto_now_add=True)
 
-        # Após salvar, podemos recalcular o custo médio do produto (lógica a ser implementada)
-        # Ex: self.product.recalculate_average_cost()
+    class Meta:
+        verbose_name = "Movimentação Arquivada"
+        verbose_name_plural = "Movimentações Arquivadas"
+        ordering = ['-created_at']
+        # Mesmos padrões de acesso da tabela principal (ver ledger_querysets)
+        indexes = [
+            models.Index(fields=['company', 'product', 'created_at'], name='stock_arch_product_date_idx'),
+            models.Index(fields=['company', 'created_at'], name='stock_arch_company_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_movement_type_display()} de {self.product.name}: {self.quantity}"
+
+
+class StockCostLayer(models.Model):
+    """
+    Camada de custo FIFO: cada entrada (compra, ajuste ou devolução) abre uma
+    camada com a quantidade e o custo unitário recebidos, e as saídas consomem
+    as camadas mais antigas primeiro. O saldo remanescente das camadas abertas
+    dá a valorização FIFO do estoque sem reprocessar o histórico.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_cost_layers', verbose_name="Empresa")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers', verbose_name="Produto")
+    # Sem restrição no banco: o movimento de origem pode ter sido arquivado (mesmo ID)
+    movement = models.ForeignKey(
+        StockMovement, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+        related_name='+', verbose_name="Movimento de Origem",
+    )
+    received_at = models.DateTimeField("Data de Entrada")
+    quantity = models.IntegerField("Quantidade Recebida")
+    remaining = models.IntegerField("Quantidade Restante")
+    unit_cost = models.DecimalField("Custo Unitário", max_digits=10, decimal_places=2)
+    depleted_at = models.DateTimeField("Esgotada Em", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Camada de Custo (FIFO)"
+        verbose_name_plural = "Camadas de Custo (FIFO)"
+        ordering = ['received_at', 'pk']
+        indexes = [
+            models.Index(fields=['product', 'received_at'], name='stock_layer_product_idx'),
+            models.Index(fields=['company', 'depleted_at'], name='stock_layer_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.remaining}/{self.quantity} a {self.unit_cost}"
+
+
+class StockLayerConsumption(models.Model):
+    """
+    Quantidade de uma camada FIFO consumida por um movimento de saída.
+    Permite valorizar o estoque em uma data passada.
+    """
+    layer = models.ForeignKey(StockCostLayer, on_delete=models.CASCADE, related_name='consumptions', verbose_name="Camada")
+    movement = models.ForeignKey(
+        StockMovement, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+        related_name='+', verbose_name="Movimento de Saída",
+    )
+    quantity = models.IntegerField("Quantidade")
+    consumed_at = models.DateTimeField("Data do Consumo")
+
+    class Meta:
+        verbose_name = "Consumo de Camada"
+        verbose_name_plural = "Consumos de Camadas"
+        indexes = [
+            models.Index(fields=['layer', 'consumed_at'], name='stock_consumption_layer_idx'),
+        ]
+
+
+class StockDailyRollup(models.Model):
+    """
+    Totais diários de movimentação por (empresa, produto, tipo de movimento):
+    quantidades e valores de entrada e saída. Atualizados a cada movimento,
+    alimentam os gráficos de séries temporais sem agrupar o histórico.
+    O comando `backfill_stock_rollups` reconstrói a tabela.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_rollups', verbose_name="Empresa")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_rollups', verbose_name="Produto")
+    movement_type = models.CharField(max_length=10, choices=StockMovement.MovementType.choices, verbose_name="Tipo de Movimento")
+    day = models.DateField("Dia")
+    quantity_in = models.IntegerField("Quantidade de Entrada", default=0)
+    quantity_out = models.IntegerField("Quantidade de Saída", default=0)
+    value_in = models.DecimalField("Valor de Entrada", max_digits=14, decimal_places=2, default=0)
+    value_out = models.DecimalField("Valor de Saída", max_digits=14, decimal_places=2, default=0)
+    movements = models.PositiveIntegerField("Movimentos", default=0)
+
+    class Meta:
+        verbose_name = "Resumo Diário de Estoque"
+        verbose_name_plural = "Resumos Diários de Estoque"
+        unique_together = ('product', 'movement_type', 'day')
+        ordering = ['day']
+        indexes = [
+            models.Index(fields=['company', 'product', 'day'], name='stock_rollup_product_idx'),
+            models.Index(fields=['company', 'day'], name='stock_rollup_company_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} em {self.day:%d/%m/%Y} ({self.get_movement_type_display()})"
@@ -0,0 +1,802 @@
+# stock/services.py
+"""
+Serviços de estoque: manutenção das estruturas derivadas do histórico de
+movimentações (saldos materializados, etc.).
+"""
+import random
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import groupby
+from operator import itemgetter
+from time import sleep
+
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, transaction
+from django.db.models import (
+    BooleanField, Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value,
+    When,
+)
+from django.db.models.functions import Abs, Coalesce, Greatest, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from core.cache import STOCK, bump_company_version
+from customers.models import Customer
+from products.models import Product
+from suppliers.models import Supplier
+from .models import (
+    ArchivedStockMovement, StockBalance, StockCostLayer, StockDailyRollup, StockLayerConsumption, StockMovement,
+    StockSnapshot,
+)
+
+# Casas decimais de Product.average_cost
+COST_PRECISION = Decimal('0.01')
+
+
+def apply_balance_deltas(deltas, moved_at=None):
+    """
+    Aplica variações de saldo no formato {(company_id, product_id): delta}.
+    Deve ser chamado dentro de uma transação, junto com a gravação dos movimentos.
+    `moved_at`, quando informado, é registrado como data do último movimento.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    product_ids = [product_id for _, product_id in deltas]
+    existing = set(
+        StockBalance.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True)
+    )
+    missing = [
+        StockBalance(company_id=company_id, product_id=product_id, quantity=0)
+        for company_id, product_id in deltas
+        if product_id not in existing
+    ]
+    if missing:
+        StockBalance.objects.bulk_create(missing, ignore_conflicts=True)
+
+    changes = {'updated_at': timezone.now()}
+    if moved_at is not None:
+        changes['last_movement_at'] = moved_at
+    for (company_id, product_id), delta in deltas.items():
+        StockBalance.objects.filter(company_id=company_id, product_id=product_id).update(
+            quantity=F('quantity') + delta,
+            **changes,
+        )
+    refresh_below_minimum(product_ids)
+
+
+def refresh_below_minimum(product_ids):
+    """
+    Recalcula, em um único UPDATE, o indicador Product.below_minimum dos
+    produtos informados a partir do saldo materializado. Assim a lista de
+    estoque baixo é um filtro indexado, sem somar o histórico.
+    """
+    balance = StockBalance.objects.filter(product_id=OuterRef('pk')).values('quantity')[:1]
+    Product.objects.filter(pk__in=product_ids).update(
+        below_minimum=ExpressionWrapper(
+            Q(minimum_stock__gt=Coalesce(Subquery(balance), Value(0))),
+            output_field=BooleanField(),
+        ),
+    )
+
+
+def reserve_stock(product, quantity):
+    """
+    Retira `quantity` unidades do saldo do produto com um único UPDATE
+    condicional (`quantity >= quantity`). A verificação e o decremento
+    acontecem no mesmo comando, portanto duas vendas simultâneas nunca
+    consomem o mesmo saldo. Levanta ValidationError se o estoque não bastar.
+    Atualiza também Product.below_minimum.
+    """
+    now = timezone.now()
+    updated = StockBalance.objects.filter(product_id=product.pk, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity,
+        last_movement_at=now,
+        updated_at=now,
+    )
+    if not updated:
+        available = StockBalance.objects.filter(product_id=product.pk).values_list('quantity', flat=True).first()
+        raise ValidationError(
+            f"Estoque insuficiente para {product.name}. "
+            f"Disponível: {available or 0}, Saída: {quantity}"
+        )
+    # A saída não passa por apply_balance_deltas: o indicador de estoque baixo é atualizado aqui
+    refresh_below_minimum([product.pk])
+
+
+def weighted_average_cost(balance, average_cost, quantity, unit_price):
+    """
+    Custo médio ponderado após a entrada de `quantity` unidades a `unit_price`,
+    partindo de `balance` unidades a `average_cost`. Com saldo zerado ou
+    negativo, o custo da entrada passa a ser o custo médio.
+    """
+    balance = max(balance, 0)
+    if balance + quantity <= 0:
+        return Decimal(average_cost)
+    total = Decimal(balance) * Decimal(average_cost) + Decimal(quantity) * Decimal(unit_price)
+    return (total / (balance + quantity)).quantize(COST_PRECISION, rounding=ROUND_HALF_UP)
+
+
+def update_average_cost(product, quantity, unit_price):
+    """
+    Atualiza o custo médio do produto em O(1) para uma entrada, a partir do
+    saldo atual (antes da entrada) e do custo médio gravado. Deve ser chamado
+    dentro da transação que grava o movimento.
+    """
+    balance = (
+        StockBalance.objects.select_for_update().filter(product_id=product.pk)
+        .values_list('quantity', flat=True).first()
+    ) or 0
+    current = Product.objects.filter(pk=product.pk).values_list('average_cost', flat=True).first() or 0
+    average_cost = weighted_average_cost(balance, current, quantity, unit_price)
+    Product.objects.filter(pk=product.pk).update(average_cost=average_cost)
+    product.average_cost = average_cost
+    return average_cost
+
+
+def save_movement(movement, attempts=5, backoff=0.05):
+    """
+    Grava um movimento repetindo a transação quando o banco está bloqueado por
+    outra escrita concorrente (ex.: 'database is locked' no SQLite), com espera
+    exponencial entre as tentativas. Dentro de uma transação externa não há
+    como repetir apenas este trecho, então o erro é propagado imediatamente.
+    """
+    adding = movement._state.adding
+    for attempt in range(1, attempts + 1):
+        try:
+            movement.save()
+            return movement
+        except OperationalError:
+            if attempt == attempts or transaction.get_connection().in_atomic_block:
+                raise
+            movement._state.adding = adding
+            sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def clear_cached_balance(product):
+    """
+    Remove o saldo em cache na instância do produto, para que a próxima leitura
+    de `stock_quantity` reflita o valor atualizado.
+    """
+    related = Product.stock_balance.related
+    if related.is_cached(product):
+        related.delete_cached_value(product)
+
+
+def low_stock_products(company):
+    """
+    Produtos ativos da empresa abaixo do estoque mínimo, lidos do indicador
+    pré-calculado, com o saldo atual e a quantidade sugerida para reposição
+    (a quantidade de reposição cadastrada ou, no mínimo, o que falta para o mínimo).
+    """
+    return (
+        Product.objects.filter(company=company, active=True, below_minimum=True)
+        .select_related('brand', 'category')
+        .annotate(balance=Coalesce('stock_balance__quantity', Value(0)))
+        .annotate(suggested_quantity=Greatest('reorder_quantity', F('minimum_stock') - F('balance')))
+        .order_by('name', 'pk')
+    )
+
+
+def end_of_day(day):
+    """
+    Retorna o instante (aware) imediatamente após o fim do dia informado,
+    usado como limite exclusivo nas consultas por `created_at`.
+    """
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def ledger_querysets(**filters):
+    """
+    Retorna os querysets que, juntos, formam o histórico completo e detalhado:
+    os movimentos da tabela principal (sem as consolidações mensais) e os
+    movimentos arquivados.
+    """
+    return (
+        StockMovement.objects.filter(**filters).exclude(movement_type=StockMovement.MovementType.CLOSING),
+        ArchivedStockMovement.objects.filter(**filters),
+    )
+
+
+def stock_at_date(product, day):
+    """
+    Calcula o saldo de um produto ao final do dia informado.
+    Parte do snapshot de fechamento mais próximo e soma apenas os movimentos
+    posteriores a ele, de modo que o custo não cresce com o tamanho do histórico.
+    """
+    snapshot = (
+        StockSnapshot.objects.filter(product=product, snapshot_date__lte=day)
+        .order_by('-snapshot_date')
+        .values_list('snapshot_date', 'quantity')
+        .first()
+    )
+    filters = {'company_id': product.company_id, 'product': product, 'created_at__lt': end_of_day(day)}
+    balance = 0
+    if snapshot:
+        snapshot_date, balance = snapshot
+        filters['created_at__gte'] = end_of_day(snapshot_date)
+
+    for movements in ledger_querysets(**filters):
+        balance += movements.aggregate(total=Sum('quantity'))['total'] or 0
+    return balance
+
+
+def close_stock_period(company, period_start, period_end, opening=None):
+    """
+    Grava os snapshots de fechamento do período [period_start, period_end] para
+    os produtos da empresa que tiveram movimentos nele.
+
+    `opening` é um dicionário {product_id: saldo} com os saldos de abertura;
+    quando omitido, é carregado a partir dos snapshots anteriores. O dicionário
+    atualizado é retornado para que fechamentos consecutivos não precisem
+    recarregá-lo.
+    """
+    if opening is None:
+        latest = StockSnapshot.objects.filter(
+            product=OuterRef('pk'), snapshot_date__lt=period_start
+        ).order_by('-snapshot_date').values('quantity')[:1]
+        opening = {
+            product_id: quantity
+            for product_id, quantity in Product.objects.filter(company=company)
+            .annotate(closing=Subquery(latest))
+            .filter(closing__isnull=False)
+            .values_list('pk', 'closing')
+        }
+
+    totals = {}
+    for movements in ledger_querysets(
+        company=company,
+        created_at__gte=end_of_day(period_start - timedelta(days=1)),
+        created_at__lt=end_of_day(period_end),
+    ):
+        for product_id, total in movements.order_by().values_list('product_id').annotate(total=Sum('quantity')):
+            totals[product_id] = totals.get(product_id, 0) + (total or 0)
+
+    snapshots = []
+    for product_id, total in totals.items():
+        opening[product_id] = opening.get(product_id, 0) + total
+        snapshots.append(
+            StockSnapshot(company=company, product_id=product_id, snapshot_date=period_end, quantity=opening[product_id])
+        )
+
+    StockSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['product', 'snapshot_date'],
+        update_fields=['quantity'],
+    )
+    return opening
+
+
+def _as_uuid(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def _valid_uuids(values):
+    return [key for key in map(_as_uuid, values) if key]
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bulk_ingest_movements(company, rows, user=None, partial=False, batch_size=1000):
+    """
+    Valida e grava vários movimentos de uma vez (ex.: sincronização dos coletores
+    do depósito).
+
+    Cada linha é um dicionário com `product` (ID) ou `sku`, `movement_type`,
+    `quantity`, `unit_price` e, opcionalmente, `supplier`, `customer` e `notes`.
+    Produtos, fornecedores, clientes e saldos são carregados uma única vez; o
+    sinal e a suficiência de estoque são validados (e o custo médio calculado)
+    em uma passada sobre os saldos em memória, e os movimentos são inseridos com `bulk_create` em lotes,
+    tudo na mesma transação.
+
+    Se houver erros, nada é gravado, exceto com `partial=True`, em que as linhas
+    válidas são gravadas. Retorna (quantidade_criada, erros), onde `erros` é uma
+    lista de {'row': índice, 'errors': {campo: mensagem}}.
+    """
+    rows = list(rows)
+    valid_types = set(StockMovement.MovementType.values) - {StockMovement.MovementType.CLOSING}
+
+    # Identificadores referenciados no lote, para carregar tudo de uma vez
+    product_ids, skus, supplier_ids, customer_ids = set(), set(), set(), set()
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        if row.get('product'):
+            product_ids.add(str(row['product']))
+        elif row.get('sku'):
+            skus.add(str(row['sku']))
+        if row.get('supplier'):
+            supplier_ids.add(str(row['supplier']))
+        if row.get('customer'):
+            customer_ids.add(str(row['customer']))
+
+    company_products = Product.objects.filter(company=company).only('pk', 'sku', 'name')
+    products_by_id, products_by_sku, suppliers, customers = {}, {}, set(), set()
+    for chunk in _chunks(_valid_uuids(product_ids), 500):
+        products_by_id.update({str(p.pk): p for p in company_products.filter(pk__in=chunk)})
+    for chunk in _chunks(skus, 500):
+        products_by_sku.update({p.sku: p for p in company_products.filter(sku__in=chunk)})
+    for chunk in _chunks(_valid_uuids(supplier_ids), 500):
+        suppliers.update(
+            str(pk) for pk in Supplier.objects.filter(company=company, pk__in=chunk).values_list('pk', flat=True)
+        )
+    for chunk in _chunks([value for value in customer_ids if value.isdigit()], 500):
+        customers.update(
+            str(pk) for pk in Customer.objects.filter(company=company, pk__in=chunk).values_list('pk', flat=True)
+        )
+
+    with transaction.atomic():
+        # Saldos carregados (e bloqueados, nos bancos que suportam) dentro da transação
+        all_products = {p.pk: p for p in list(products_by_id.values()) + list(products_by_sku.values())}
+        balances = {}
+        for chunk in _chunks(all_products, 500):
+            balances.update({
+                balance.product_id: balance
+                for balance in StockBalance.objects.select_for_update().filter(product_id__in=chunk)
+            })
+        running = {product_id: balance.quantity for product_id, balance in balances.items()}
+        costs = {}
+        for chunk in _chunks(all_products, 500):
+            costs.update(Product.objects.filter(pk__in=chunk).values_list('pk', 'average_cost'))
+        costed = set()
+
+        movements, errors = [], []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors.append({'row': index, 'errors': {'__all__': "Linha inválida."}})
+                continue
+
+            row_errors = {}
+            if row.get('product'):
+                product = products_by_id.get(_as_uuid(row['product']))
+            else:
+                product = products_by_sku.get(str(row.get('sku') or ''))
+            if product is None:
+                row_errors['product'] = "Produto não encontrado."
+
+            movement_type = row.get('movement_type')
+            if movement_type not in valid_types:
+                row_errors['movement_type'] = "Tipo de movimento inválido."
+
+            try:
+                quantity = int(str(row.get('quantity')))
+            except ValueError:
+                quantity = 0
+            if not quantity:
+                row_errors['quantity'] = "Informe uma quantidade inteira diferente de zero."
+
+            try:
+                unit_price = Decimal(str(row.get('unit_price')))
+                if not unit_price.is_finite() or unit_price < 0:
+                    raise InvalidOperation
+            except InvalidOperation:
+                row_errors['unit_price'] = "Informe um preço/custo unitário válido."
+
+            supplier = row.get('supplier') and _as_uuid(row['supplier'])
+            if row.get('supplier') and supplier not in suppliers:
+                row_errors['supplier'] = "Fornecedor não encontrado."
+            customer = row.get('customer')
+            if customer and str(customer) not in customers:
+                row_errors['customer'] = "Cliente não encontrado."
+
+            if not row_errors:
+                movement = StockMovement(
+                    company=company,
+                    user=user,
+                    product=product,
+                    movement_type=movement_type,
+                    quantity=quantity,
+                    unit_price=unit_price,
+                    supplier_id=supplier or None,
+                    customer_id=customer or None,
+                    notes=row.get('notes') or None,
+                )
+                movement.normalize_quantity()
+                available = running.get(product.pk, 0)
+                if available + movement.quantity < 0:
+                    row_errors['quantity'] = (
+                        f"Estoque insuficiente para {product.name}. "
+                        f"Disponível: {available}, Saída: {abs(movement.quantity)}"
+                    )
+                else:
+                    if movement.movement_type in StockMovement.COST_TYPES:
+                        costs[product.pk] = weighted_average_cost(
+                            available, costs[product.pk], movement.quantity, movement.unit_price,
+                        )
+                        costed.add(product.pk)
+                    running[product.pk] = available + movement.quantity
+                    movements.append(movement)
+
+            if row_errors:
+                errors.append({'row': index, 'errors': row_errors})
+
+        if errors and not partial:
+            return 0, errors
+
+        StockMovement.objects.bulk_create(movements, batch_size=batch_size)
+
+        # Grava os saldos finais calculados em memória com um upsert: os saldos
+        # existentes estão bloqueados desde a leitura e os que faltam são criados
+        now = timezone.now()
+        moved = {movement.product_id for movement in movements}
+        StockBalance.objects.bulk_create(
+            [
+                StockBalance(company=company, product_id=product_id, quantity=running[product_id], last_movement_at=now)
+                for product_id in moved
+            ],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['quantity', 'last_movement_at', 'updated_at'],
+            batch_size=batch_size,
+        )
+        for chunk in _chunks(moved, 500):
+            refresh_below_minimum(chunk)
+
+        # Custos médios calculados incrementalmente durante a validação
+        Product.objects.bulk_update(
+            [Product(pk=product_id, average_cost=costs[product_id]) for product_id in costed],
+            ['average_cost'],
+            batch_size=batch_size,
+        )
+
+        apply_fifo(movements, batch_size=batch_size)
+        apply_rollups(movements)
+        # bulk_create não dispara post_save
+        bump_company_version(company, STOCK)
+
+    return len(movements), errors
+
+
+def _month_last_instant(month):
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    return end_of_day(next_month - timedelta(days=1)) - timedelta(microseconds=1)
+
+
+def archive_ledger(company, until, batch_size=1000):
+    """
+    Move para ArchivedStockMovement os movimentos da empresa criados até o fim
+    do dia `until` (normalmente o último dia de um mês já fechado) e grava, na
+    tabela principal, uma consolidação (MovementType.CLOSING) por produto e mês
+    com a quantidade líquida do mês e o custo médio ao final dele. Assim a soma
+    do histórico, os saldos e o reprocessamento do custo médio continuam exatos.
+
+    O histórico é lido em lotes, ordenado por produto e data. Retorna
+    (movimentos_arquivados, consolidações_criadas).
+    """
+    closing_type = StockMovement.MovementType.CLOSING
+    cutoff = end_of_day(until)
+    rows = (
+        StockMovement.objects.filter(company=company, created_at__lt=cutoff)
+        .order_by('product_id', 'created_at', 'pk')
+        .values(
+            'id', 'company_id', 'user_id', 'product_id', 'movement_type', 'quantity',
+            'unit_price', 'supplier_id', 'customer_id', 'notes', 'created_at',
+        )
+        .iterator(chunk_size=batch_size)
+    )
+
+    archived = 0
+    buffer, closings = [], []
+    with transaction.atomic():
+        for product_id, product_rows in groupby(rows, key=itemgetter('product_id')):
+            balance, average_cost = 0, Decimal('0.00')
+            months = groupby(product_rows, key=lambda row: timezone.localtime(row['created_at']).date().replace(day=1))
+            for month, month_rows in months:
+                net, has_movements = 0, False
+                for row in month_rows:
+                    if row['movement_type'] == closing_type:
+                        # Mês já consolidado anteriormente: só atualiza o estado corrente
+                        balance += row['quantity']
+                        average_cost = row['unit_price']
+                        continue
+
+                    if row['movement_type'] in StockMovement.COST_TYPES:
+                        average_cost = weighted_average_cost(balance, average_cost, row['quantity'], row['unit_price'])
+                    balance += row['quantity']
+                    net += row['quantity']
+                    has_movements = True
+
+                    buffer.append(ArchivedStockMovement(**row))
+                    if len(buffer) >= batch_size:
+                        ArchivedStockMovement.objects.bulk_create(buffer)
+                        archived += len(buffer)
+                        buffer = []
+
+                if has_movements:
+                    closings.append((product_id, month, net, average_cost))
+
+        if buffer:
+            ArchivedStockMovement.objects.bulk_create(buffer)
+            archived += len(buffer)
+
+        StockMovement.objects.filter(company=company, created_at__lt=cutoff).exclude(movement_type=closing_type).delete()
+
+        # As consolidações são gravadas só depois da leitura do histórico, para
+        # não interferirem no cursor aberto sobre a mesma tabela
+        for chunk in _chunks(closings, batch_size):
+            movements = [
+                StockMovement(
+                    company=company,
+                    product_id=product_id,
+                    movement_type=closing_type,
+                    quantity=net,
+                    unit_price=average_cost,
+                    notes=f"Consolidação de {month:%m/%Y}",
+                )
+                for product_id, month, net, average_cost in chunk
+            ]
+            StockMovement.objects.bulk_create(movements)
+            # created_at é auto_now_add: a data de referência (fim do mês) é gravada em seguida
+            for movement, (_, month, _, _) in zip(movements, chunk):
+                movement.created_at = _month_last_instant(month)
+            StockMovement.objects.bulk_update(movements, ['created_at'])
+
+        bump_company_version(company, STOCK)
+
+    return archived, len(closings)
+
+
+def apply_fifo(movements, batch_size=1000, return_costs=None):
+    """
+    Atualiza as camadas de custo FIFO para movimentos já gravados, na ordem em
+    que são informados (cronológica): entradas abrem camadas e saídas consomem
+    as camadas abertas mais antigas. As camadas abertas dos produtos envolvidos
+    são carregadas uma única vez e as alterações gravadas em lote.
+
+    Devoluções de clientes entram pelo custo médio vigente do produto, já que o
+    preço informado nelas é o de venda; `return_costs` ({id do movimento: custo})
+    permite informar o custo de cada devolução ao reprocessar o histórico.
+    O histórico é somente de inclusão (ver StockMovement.save); para refazer
+    as camadas a partir dele, use `rebuild_cost_layers`.
+    """
+    types = StockMovement.MovementType
+    inbound = [m for m in movements if m.movement_type in (types.PURCHASE, types.ADJUSTMENT_IN, types.RETURN_IN)]
+    outbound = [m for m in movements if m.movement_type in StockMovement.OUTBOUND_TYPES]
+    if not inbound and not outbound:
+        return
+
+    open_layers = defaultdict(deque)
+    for chunk in _chunks({m.product_id for m in outbound}, 500):
+        for layer in StockCostLayer.objects.filter(product_id__in=chunk, remaining__gt=0).order_by('received_at', 'pk'):
+            open_layers[layer.product_id].append(layer)
+
+    average_costs = {}
+    if return_costs is None:
+        return_costs = {}
+        for chunk in _chunks({m.product_id for m in inbound if m.movement_type == types.RETURN_IN}, 500):
+            average_costs.update(Product.objects.filter(pk__in=chunk).values_list('pk', 'average_cost'))
+
+    new_layers, consumptions, touched = [], [], {}
+    for movement in movements:
+        layers = open_layers[movement.product_id]
+        if movement.movement_type in (types.PURCHASE, types.ADJUSTMENT_IN, types.RETURN_IN):
+            if movement.movement_type == types.RETURN_IN:
+                unit_cost = return_costs.get(movement.pk, average_costs.get(movement.product_id, 0))
+            else:
+                unit_cost = movement.unit_price
+            layer = StockCostLayer(
+                company_id=movement.company_id,
+                product_id=movement.product_id,
+                movement_id=movement.pk,
+                received_at=movement.created_at,
+                quantity=movement.quantity,
+                remaining=movement.quantity,
+                unit_cost=unit_cost,
+            )
+            new_layers.append(layer)
+            layers.append(layer)
+        elif movement.movement_type in StockMovement.OUTBOUND_TYPES:
+            pending = abs(movement.quantity)
+            while pending and layers:
+                layer = layers[0]
+                taken = min(layer.remaining, pending)
+                layer.remaining -= taken
+                pending -= taken
+                consumptions.append(StockLayerConsumption(
+                    layer=layer, movement_id=movement.pk, quantity=taken, consumed_at=movement.created_at,
+                ))
+                if layer.remaining == 0:
+                    layer.depleted_at = movement.created_at
+                    layers.popleft()
+                if layer.pk is not None:
+                    touched[layer.pk] = layer
+
+    StockCostLayer.objects.bulk_create(new_layers, batch_size=batch_size)
+    StockCostLayer.objects.bulk_update(list(touched.values()), ['remaining', 'depleted_at'], batch_size=batch_size)
+    # Camadas criadas e consumidas no mesmo lote já foram gravadas com o saldo final
+    StockLayerConsumption.objects.bulk_create(consumptions, batch_size=batch_size)
+
+
+def fifo_valuation(company, day=None):
+    """
+    Valor do estoque da empresa pelo método FIFO. Sem data, soma as camadas
+    abertas; com data, considera as camadas recebidas até o fim do dia e
+    desconta o que foi consumido delas até lá.
+    """
+    if day is None:
+        total = StockCostLayer.objects.filter(company=company, remaining__gt=0).aggregate(
+            total=Sum(F('remaining') * F('unit_cost'), output_field=DecimalField(max_digits=16, decimal_places=2))
+        )['total']
+        return Decimal(total or 0).quantize(COST_PRECISION)
+
+    limit = end_of_day(day)
+    layers = StockCostLayer.objects.filter(company=company, received_at__lt=limit).exclude(depleted_at__lt=limit)
+    received = layers.aggregate(
+        total=Sum(F('quantity') * F('unit_cost'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    )['total'] or 0
+    consumed = StockLayerConsumption.objects.filter(layer__in=layers, consumed_at__lt=limit).aggregate(
+        total=Sum(F('quantity') * F('layer__unit_cost'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    )['total'] or 0
+    return Decimal(received - consumed).quantize(COST_PRECISION)
+
+
+def rollup_totals(movements, sign=1):
+    """
+    Agrupa os movimentos em memória por (empresa, produto, tipo, dia) e
+    retorna {chave: [qtd_entrada, qtd_saída, valor_entrada, valor_saída, movimentos]}.
+    As consolidações mensais (CLOSING) não entram: os resumos guardam o detalhe.
+    """
+    totals = defaultdict(lambda: [0, 0, Decimal('0.00'), Decimal('0.00'), 0])
+    for movement in movements:
+        if movement.movement_type == StockMovement.MovementType.CLOSING:
+            continue
+        day = timezone.localtime(movement.created_at).date()
+        row = totals[(movement.company_id, movement.product_id, movement.movement_type, day)]
+        value = abs(movement.quantity) * Decimal(movement.unit_price)
+        if movement.quantity >= 0:
+            row[0] += sign * movement.quantity
+            row[2] += sign * value
+        else:
+            row[1] += sign * abs(movement.quantity)
+            row[3] += sign * value
+        row[4] += sign
+    return totals
+
+
+def ledger_rollups(querysets, model=StockDailyRollup):
+    """
+    Calcula os resumos diários de `querysets` (ver ledger_querysets) com uma
+    consulta agrupada por tabela e retorna as instâncias de `model`, ainda não
+    gravadas. `model` permite usar o modelo histórico em migrações.
+    """
+    value = F('unit_price') * Abs('quantity')
+    money = DecimalField(max_digits=14, decimal_places=2)
+    totals = {}
+    for queryset in querysets:
+        rows = (
+            queryset.order_by()
+            .annotate(day=TruncDate('created_at'))
+            .values('company_id', 'product_id', 'movement_type', 'day')
+            .annotate(
+                quantity_in=Sum(Case(When(quantity__gt=0, then='quantity'), default=Value(0), output_field=IntegerField())),
+                quantity_out=Sum(Case(When(quantity__lt=0, then=-F('quantity')), default=Value(0), output_field=IntegerField())),
+                value_in=Sum(Case(When(quantity__gt=0, then=value), default=Value(0), output_field=money)),
+                value_out=Sum(Case(When(quantity__lt=0, then=value), default=Value(0), output_field=money)),
+                movements=Count('pk'),
+            )
+        )
+        for row in rows.iterator():
+            key = (row['product_id'], row['movement_type'], row['day'])
+            rollup = totals.get(key)
+            if rollup is None:
+                totals[key] = model(
+                    company_id=row['company_id'],
+                    product_id=row['product_id'],
+                    movement_type=row['movement_type'],
+                    day=row['day'],
+                    quantity_in=row['quantity_in'],
+                    quantity_out=row['quantity_out'],
+                    value_in=row['value_in'],
+                    value_out=row['value_out'],
+                    movements=row['movements'],
+                )
+            else:
+                # Dia com movimentos nas duas tabelas (arquivamento no meio do dia)
+                rollup.quantity_in += row['quantity_in']
+                rollup.quantity_out += row['quantity_out']
+                rollup.value_in += row['value_in']
+                rollup.value_out += row['value_out']
+                rollup.movements += row['movements']
+    return list(totals.values())
+
+
+def apply_rollups(movements, sign=1):
+    """
+    Soma os movimentos (ou subtrai, com sign=-1) aos resumos diários.
+    Deve ser chamado na mesma transação da gravação dos movimentos. Os resumos
+    atingidos são lidos (e bloqueados) de uma vez, somados em memória e
+    regravados com um único upsert, qualquer que seja o tamanho do lote.
+    """
+    totals = rollup_totals(movements, sign)
+    if not totals:
+        return
+
+    StockDailyRollup.objects.bulk_create(
+        [
+            StockDailyRollup(company_id=company_id, product_id=product_id, movement_type=movement_type, day=day)
+            for company_id, product_id, movement_type, day in totals
+        ],
+        ignore_conflicts=True,
+    )
+    keys = {key[1:]: key for key in totals}
+    types = {movement_type for _, movement_type, _ in keys}
+    days = {day for _, _, day in keys}
+
+    updated, empty = [], []
+    for chunk in _chunks({product_id for product_id, _, _ in keys}, 500):
+        rollups = StockDailyRollup.objects.select_for_update().filter(
+            product_id__in=chunk, movement_type__in=types, day__in=days,
+        )
+        for rollup in rollups:
+            key = keys.get((rollup.product_id, rollup.movement_type, rollup.day))
+            if key is None:
+                continue
+            row = totals[key]
+            rollup.quantity_in += row[0]
+            rollup.quantity_out += row[1]
+            rollup.value_in += row[2]
+            rollup.value_out += row[3]
+            rollup.movements += row[4]
+            if sign < 0 and rollup.movements <= 0:
+                # Dias que ficaram sem movimentos não precisam de resumo
+                empty.append(rollup.pk)
+                continue
+            # Sem o ID: o upsert identifica o resumo pela chave (produto, tipo, dia)
+            rollup.pk = None
+            updated.append(rollup)
+
+    StockDailyRollup.objects.bulk_create(
+        updated,
+        update_conflicts=True,
+        unique_fields=['product', 'movement_type', 'day'],
+        update_fields=['quantity_in', 'quantity_out', 'value_in', 'value_out', 'movements'],
+        batch_size=500,
+    )
+    for chunk in _chunks(empty, 500):
+        StockDailyRollup.objects.filter(pk__in=chunk).delete()
+
+
+# Funções de truncamento aceitas pela série temporal
+SERIES_BUCKETS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def movement_series(company, bucket='day', product=None, movement_type=None, start=None, end=None):
+    """
+    Série temporal de entradas e saídas da empresa agrupada por dia, semana ou
+    mês, lida apenas dos resumos diários (StockDailyRollup).
+    """
+    rollups = StockDailyRollup.objects.filter(company=company)
+    if product:
+        rollups = rollups.filter(product_id=product)
+    if movement_type:
+        rollups = rollups.filter(movement_type=movement_type)
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+
+    trunc = SERIES_BUCKETS[bucket]
+    period = trunc('day') if trunc else F('day')
+    return (
+        rollups.annotate(period=period)
+        .values('period')
+        .annotate(
+            quantity_in=Sum('quantity_in'),
+            quantity_out=Sum('quantity_out'),
+            value_in=Sum('value_in'),
+            value_out=Sum('value_out'),
+            movements=Sum('movements'),
+        )
+        .order_by('period')
+    )
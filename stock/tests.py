@@ -1,3 +1,517 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db.models import QuerySet, Sum
+from django.db.models.functions import Coalesce
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Company, CompanyUser, User
+from products.models import Brand, Category, Product
+from . import services
+from .admin import StockMovementAdmin
+from .exports import EXPORT_FIELDS, ledger_rows, stream_ledger
+from .management.commands.benchmark_stock_contention import Command as ContentionBenchmark
+from .models import (
+    ArchivedStockMovement, StockBalance, StockCostLayer, StockDailyRollup, StockLayerConsumption, StockMovement,
+    StockSnapshot,
+)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Garante que as consultas principais do histórico, das compras e do
+    catálogo continuam usando os índices compostos (ver benchmark_query_plans).
+    """
+
+    def test_main_queries_use_composite_indexes(self):
+        out = StringIO()
+        call_command('benchmark_query_plans', products=200, movements=5000, invoices=500, stdout=out)
+        self.assertIn("Todas as consultas usam os índices esperados.", out.getvalue())
+
+
+class StockFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+        cls.user = User.objects.create_user(email="a@a.com", password="x")
+        CompanyUser.objects.create(user=cls.user, company=cls.company, role='admin')
+        cls.brand = Brand.objects.create(company=cls.company, name="Marca")
+        cls.category = Category.objects.create(company=cls.company, name="Categoria")
+
+    def setUp(self):
+        cache.clear()
+        self.product = self.create_product("C1")
+
+    def create_product(self, sku):
+        return Product.objects.create(
+            company=self.company, name=f"Produto {sku}", sku=sku, sale_price=Decimal('10.00'),
+            brand=self.brand, category=self.category,
+        )
+
+    def move(self, movement_type, quantity, unit_price='0.00', product=None):
+        return StockMovement.objects.create(
+            company=self.company, product=product or self.product, movement_type=movement_type,
+            quantity=quantity, unit_price=Decimal(unit_price), user=self.user,
+        )
+
+    def balance(self, product=None):
+        return StockBalance.objects.get(product=product or self.product).quantity
+
+    def ledger_sum(self, product=None):
+        return StockMovement.objects.filter(product=product or self.product).aggregate(
+            total=Coalesce(Sum('quantity'), 0),
+        )['total']
+
+
+class StockLedgerTests(StockFixtureMixin, TestCase):
+    """
+    O histórico é somente de inclusão: o saldo materializado acompanha a soma
+    dos movimentos e correções são lançadas como estorno.
+    """
+
+    def test_movements_cannot_be_changed_or_deleted(self):
+        movement = self.move(StockMovement.MovementType.PURCHASE, 7, '2.00')
+        other = self.create_product("C2")
+
+        movement.product = other
+        movement.quantity = 3
+        with self.assertRaises(ValidationError):
+            movement.save()
+        with self.assertRaises(ValidationError):
+            movement.delete()
+
+        self.assertEqual(self.balance(), 7)
+        self.assertFalse(StockBalance.objects.filter(product=other).exists())
+        self.assertEqual(self.ledger_sum(), 7)
+
+    def test_admin_does_not_allow_changes(self):
+        model_admin = StockMovementAdmin(StockMovement, admin.site)
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        self.assertFalse(model_admin.has_change_permission(request))
+        self.assertFalse(model_admin.has_delete_permission(request))
+
+        # Dados derivados do histórico ficam apenas para consulta
+        for model in (StockBalance, StockSnapshot, ArchivedStockMovement, StockCostLayer):
+            model_admin = admin.site._registry[model]
+            self.assertFalse(model_admin.has_add_permission(request), model.__name__)
+            self.assertFalse(model_admin.has_change_permission(request), model.__name__)
+            self.assertFalse(model_admin.has_delete_permission(request), model.__name__)
+
+    def test_balance_follows_the_ledger(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.SALE, 4, '5.00')
+        self.move(types.RETURN_IN, 1, '5.00')
+        self.move(types.ADJUSTMENT_OUT, 2)
+
+        self.assertEqual(self.balance(), 5)
+        self.assertEqual(self.ledger_sum(), 5)
+
+    def test_oversell_is_refused(self):
+        self.move(StockMovement.MovementType.PURCHASE, 3, '2.00')
+
+        with self.assertRaises(ValidationError):
+            self.move(StockMovement.MovementType.SALE, 4, '5.00')
+
+        self.assertEqual(self.balance(), 3)
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_bulk_ingest_keeps_balances_and_refuses_oversell(self):
+        other = self.create_product("C2")
+        rows = [
+            {'product': str(self.product.pk), 'movement_type': 'IN', 'quantity': 10, 'unit_price': '2.00'},
+            {'sku': 'C2', 'movement_type': 'IN', 'quantity': 4, 'unit_price': '3.00'},
+            {'product': str(self.product.pk), 'movement_type': 'OUT', 'quantity': 6, 'unit_price': '5.00'},
+        ]
+
+        created, errors = services.bulk_ingest_movements(self.company, rows, user=self.user)
+
+        self.assertEqual((created, errors), (3, []))
+        self.assertEqual((self.balance(), self.balance(other)), (4, 4))
+        self.assertEqual((self.ledger_sum(), self.ledger_sum(other)), (4, 4))
+
+        created, errors = services.bulk_ingest_movements(self.company, [
+            {'sku': 'C2', 'movement_type': 'OUT', 'quantity': 1, 'unit_price': '5.00'},
+            {'sku': 'C2', 'movement_type': 'OUT', 'quantity': 4, 'unit_price': '5.00'},
+        ])
+        self.assertEqual(created, 0)
+        self.assertEqual([error['row'] for error in errors], [1])
+        self.assertEqual(self.balance(other), 4)
+
+    def test_balances_survive_archive_and_rebuild(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.SALE, 3, '5.00')
+        last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=timezone.localdate().day + 1))
+        self.move(types.PURCHASE, 5, '4.00')
+
+        archived, closings = services.archive_ledger(self.company, last_month)
+
+        self.assertEqual((archived, closings), (2, 1))
+        self.assertEqual(StockMovement.objects.filter(movement_type=types.CLOSING).get().quantity, 7)
+        self.assertEqual((self.balance(), self.ledger_sum()), (12, 12))
+
+        StockBalance.objects.update(quantity=0)
+        call_command('rebuild_stock_balances', stdout=StringIO())
+        self.assertEqual(self.balance(), 12)
+
+
+class StockContentionTests(StockFixtureMixin, TestCase):
+    """
+    Vendas pelo caminho do benchmark de concorrência (save_movement) e limpeza
+    dos dados gerados por ele.
+    """
+
+    def test_sale_beyond_a_short_balance_is_refused(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 2, '2.00')
+        self.move(types.SALE, 1, '5.00')
+
+        sale = StockMovement(
+            company=self.company, product=self.product, movement_type=types.SALE, quantity=2, unit_price=1,
+        )
+        with self.assertRaises(ValidationError):
+            services.save_movement(sale)
+
+        self.assertEqual((self.balance(), self.ledger_sum()), (1, 1))
+        self.assertEqual(StockMovement.objects.filter(movement_type=types.SALE).count(), 1)
+        self.assertEqual(StockLayerConsumption.objects.count(), 1)
+
+    def test_reset_removes_the_benchmark_company_and_derived_rows(self):
+        company = Company.objects.create(
+            name="Benchmark", cnpj=ContentionBenchmark.BENCHMARK_CNPJ, address="-", city="-", state="SP",
+        )
+        product = Product.objects.create(company=company, name="Produto Benchmark", sku="BENCH-001", sale_price=1)
+        for movement_type, quantity in ((StockMovement.MovementType.PURCHASE, 3), (StockMovement.MovementType.SALE, 1)):
+            StockMovement.objects.create(
+                company=company, product=product, movement_type=movement_type, quantity=quantity, unit_price=1,
+            )
+        self.move(StockMovement.MovementType.PURCHASE, 5, '2.00')
+
+        ContentionBenchmark()._reset()
+
+        self.assertFalse(Company.objects.filter(pk=company.pk).exists())
+        self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+        for model in (StockMovement, StockBalance, StockCostLayer, StockDailyRollup):
+            self.assertEqual(model.objects.exclude(company=self.company).count(), 0, model.__name__)
+        self.assertEqual(StockLayerConsumption.objects.count(), 0)
+        # Os dados das demais empresas são preservados
+        self.assertEqual((self.balance(), self.ledger_sum()), (5, 5))
+
+
+class StockCostTests(StockFixtureMixin, TestCase):
+    """
+    Custo médio, camadas FIFO e resumos diários acompanham cada movimento e
+    coincidem com a reconstrução a partir do histórico.
+    """
+
+    def test_average_cost_and_fifo_consumption(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.PURCHASE, 10, '4.00')
+        sale = self.move(types.SALE, 12, '9.00')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.average_cost, Decimal('3.00'))
+        self.assertEqual(
+            list(StockCostLayer.objects.order_by('received_at').values_list('unit_cost', 'remaining')),
+            [(Decimal('2.00'), 0), (Decimal('4.00'), 8)],
+        )
+        self.assertEqual(
+            sorted(StockLayerConsumption.objects.filter(movement_id=sale.pk).values_list('quantity', flat=True)),
+            [2, 10],
+        )
+        self.assertEqual(services.fifo_valuation(self.company), Decimal('32.00'))
+
+        call_command('rebuild_cost_layers', stdout=StringIO())
+        self.assertEqual(services.fifo_valuation(self.company), Decimal('32.00'))
+
+    def rollups(self):
+        return sorted(StockDailyRollup.objects.values_list(
+            'product__sku', 'day', 'movement_type', 'quantity_in', 'quantity_out', 'value_in', 'value_out', 'movements',
+        ))
+
+    def assertRollupsMatchBackfill(self):
+        incremental = self.rollups()
+        call_command('backfill_stock_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_daily_rollups_match_the_ledger(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.PURCHASE, 5, '4.00')
+        self.move(types.SALE, 3, '5.00')
+
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), [
+            ('C1', today, 'IN', 15, 0, Decimal('40.00'), Decimal('0.00'), 2),
+            ('C1', today, 'OUT', 0, 3, Decimal('0.00'), Decimal('15.00'), 1),
+        ])
+        self.assertRollupsMatchBackfill()
+
+    def test_bulk_ingest_updates_daily_rollups(self):
+        self.move(StockMovement.MovementType.PURCHASE, 4, '2.00')
+        self.create_product("C2")
+
+        created, errors = services.bulk_ingest_movements(self.company, [
+            {'sku': 'C1', 'movement_type': 'IN', 'quantity': 6, 'unit_price': '3.00'},
+            {'sku': 'C2', 'movement_type': 'IN', 'quantity': 5, 'unit_price': '1.00'},
+            {'sku': 'C1', 'movement_type': 'OUT', 'quantity': 7, 'unit_price': '5.00'},
+        ])
+
+        self.assertEqual((created, errors), (3, []))
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), [
+            ('C1', today, 'IN', 10, 0, Decimal('26.00'), Decimal('0.00'), 2),
+            ('C1', today, 'OUT', 0, 7, Decimal('0.00'), Decimal('35.00'), 1),
+            ('C2', today, 'IN', 5, 0, Decimal('5.00'), Decimal('0.00'), 1),
+        ])
+        self.assertRollupsMatchBackfill()
+
+    def test_archive_keeps_daily_rollups(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.SALE, 3, '5.00')
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=timezone.localdate().day + 1))
+        # A data foi alterada por fora do histórico: recalcula os resumos antes de arquivar
+        call_command('backfill_stock_rollups', stdout=StringIO())
+        self.move(types.PURCHASE, 5, '4.00')
+        before = self.rollups()
+
+        archived, _ = services.archive_ledger(self.company, timezone.localdate().replace(day=1) - timedelta(days=1))
+
+        self.assertEqual(archived, 2)
+        # Os resumos guardam o detalhe: a consolidação mensal não entra neles
+        self.assertEqual(self.rollups(), before)
+        self.assertRollupsMatchBackfill()
+
+    def test_migration_backfills_daily_rollups(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.SALE, 3, '5.00')
+        expected = self.rollups()
+        StockDailyRollup.objects.all().delete()
+
+        migration = import_module('stock.migrations.0010_backfill_daily_rollups')
+        migration.backfill_daily_rollups(django_apps, None)
+
+        self.assertEqual(self.rollups(), expected)
+
+
+class StockAtDateTests(StockFixtureMixin, TestCase):
+    """
+    O saldo em uma data parte do fechamento (snapshot) mais próximo e soma só
+    os movimentos posteriores a ele; os fechamentos são gerados pelo comando
+    close_stock_periods.
+    """
+
+    def move_at(self, movement_type, quantity, moved_at, unit_price='2.00'):
+        movement = self.move(movement_type, quantity, unit_price)
+        StockMovement.objects.filter(pk=movement.pk).update(created_at=moved_at)
+        return movement
+
+    def at_noon(self, day):
+        return timezone.make_aware(datetime.combine(day, time(12)))
+
+    def test_snapshot_plus_partial_period_replay(self):
+        types = StockMovement.MovementType
+        today = timezone.localdate()
+        self.move_at(types.PURCHASE, 10, self.at_noon(today - timedelta(days=10)))
+        self.move_at(types.SALE, 3, self.at_noon(today - timedelta(days=5)))
+        self.move_at(types.PURCHASE, 4, self.at_noon(today - timedelta(days=1)))
+        # Fechamento diferente da soma do histórico: prova que o cálculo parte dele
+        StockSnapshot.objects.create(
+            company=self.company, product=self.product, snapshot_date=today - timedelta(days=8), quantity=100,
+        )
+
+        self.assertEqual(services.stock_at_date(self.product, today - timedelta(days=9)), 10)
+        self.assertEqual(services.stock_at_date(self.product, today - timedelta(days=8)), 100)
+        self.assertEqual(services.stock_at_date(self.product, today - timedelta(days=3)), 97)
+        self.assertEqual(services.stock_at_date(self.product, today), 101)
+
+    def test_close_stock_periods_backfills_from_the_first_movement(self):
+        types = StockMovement.MovementType
+        last_month_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+        previous_month_end = last_month_end.replace(day=1) - timedelta(days=1)
+        self.move_at(types.PURCHASE, 10, self.at_noon(previous_month_end.replace(day=15)))
+        self.move_at(types.SALE, 4, self.at_noon(last_month_end.replace(day=15)))
+
+        out = StringIO()
+        call_command('close_stock_periods', stdout=out)
+
+        self.assertIn("2 período(s) fechado(s)", out.getvalue())
+        self.assertEqual(
+            list(StockSnapshot.objects.order_by('snapshot_date').values_list('snapshot_date', 'quantity')),
+            [(previous_month_end, 10), (last_month_end, 6)],
+        )
+        self.assertEqual(services.stock_at_date(self.product, last_month_end), 6)
+
+        # Uma nova execução continua do último fechamento: nada a fechar
+        out = StringIO()
+        call_command('close_stock_periods', stdout=out)
+        self.assertIn("0 período(s) fechado(s)", out.getvalue())
+        self.assertEqual(StockSnapshot.objects.count(), 2)
+
+    def test_view_shows_the_balance_and_rejects_invalid_dates(self):
+        self.client.force_login(self.user)
+        self.move(StockMovement.MovementType.PURCHASE, 7, '2.00')
+        today = timezone.localdate()
+
+        response = self.client.get(
+            reverse('stock:stock_at_date', args=[self.product.pk, today.year, today.month, today.day]),
+        )
+        self.assertEqual(response.context['stock_balance'], 7)
+
+        response = self.client.get(reverse('stock:stock_at_date', args=[self.product.pk, 2025, 2, 30]))
+        self.assertEqual(response.status_code, 404)
+
+
+class StockExportTests(StockFixtureMixin, TestCase):
+    """
+    A exportação do histórico é gerada em fluxo, só com os movimentos da
+    empresa ativa, lidos do banco em lotes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.SALE, 4, '5.00')
+        other = Company.objects.create(name="Outra", cnpj="00.000.000/0002-00", address="-", city="-", state="SP")
+        StockMovement.objects.create(
+            company=other, movement_type=types.PURCHASE, quantity=99, unit_price=1,
+            product=Product.objects.create(company=other, name="Produto Outra", sku="O1", sale_price=1),
+        )
+
+    def export(self, **params):
+        return self.client.get(reverse('stock:export_ledger'), params)
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_streams_only_the_company_ledger(self):
+        response = self.export()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('movimentacoes.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(self.content(response))))
+        self.assertEqual(rows[0], [name for name, _ in EXPORT_FIELDS])
+        self.assertEqual([(row[2], row[3], row[5]) for row in rows[1:]], [('IN', 'C1', '10'), ('OUT', 'C1', '-4')])
+
+    def test_jsonl_with_filters(self):
+        response = self.export(format='jsonl', movement_type='OUT')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([(row['product_sku'], row['quantity'], row['user']) for row in rows], [('C1', -4, 'a@a.com')])
+
+        self.assertEqual(self.export(format='xml').status_code, 400)
+        self.assertEqual(self.export(start='ontem').status_code, 400)
+
+    def test_rows_are_read_lazily_in_chunks(self):
+        with self.assertNumQueries(0):
+            stream = stream_ledger(ledger_rows(self.company, chunk_size=1), 'csv')
+
+        # O histórico é lido por iterator(), sem carregar o resultado inteiro
+        # na memória (_fetch_all), e só quando a resposta é consumida
+        with mock.patch.object(QuerySet, '_fetch_all', side_effect=AssertionError("histórico carregado inteiro")):
+            self.assertEqual(len(list(stream)), 3)
+
+
+class CurrentStockListViewTests(StockFixtureMixin, TestCase):
+    """
+    A posição de estoque lê saldo, valor e último movimento do saldo
+    materializado na mesma consulta: o número de consultas por página não
+    depende dos produtos.
+    """
+
+    def create_products(self, count):
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            product = self.create_product(f"S{index:02d}")
+            self.move(StockMovement.MovementType.PURCHASE, 3, '2.00', product=product)
+
+    def get_list(self):
+        return self.client.get(reverse('stock:current_stock_list'))
+
+    def test_query_count_does_not_grow_with_products(self):
+        self.client.force_login(self.user)
+        self.create_products(4)
+        self.get_list()  # resolve e guarda a empresa ativa na sessão
+
+        # Sessão, usuário, empresa, total, página, categorias e marcas
+        with self.assertNumQueries(7):
+            response = self.get_list()
+        self.assertEqual(len(response.context['products']), 5)
+
+        self.create_products(5)
+        with self.assertNumQueries(7):
+            response = self.get_list()
+        self.assertEqual(len(response.context['products']), 10)
+
+        product = response.context['products'][1]
+        self.assertEqual((product.balance, product.stock_value), (3, Decimal('6.00')))
+        self.assertIsNotNone(product.last_movement_at)
+
+
+class LowStockTests(StockFixtureMixin, TestCase):
+    """
+    O indicador Product.below_minimum acompanha entradas e saídas e alimenta a
+    lista de estoque baixo e o resumo diário por e-mail.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk=self.product.pk).update(minimum_stock=5)
+        self.product.refresh_from_db()
+
+    def test_sale_below_minimum_sets_the_flag(self):
+        types = StockMovement.MovementType
+        self.move(types.PURCHASE, 10, '2.00')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.below_minimum)
+
+        self.move(types.SALE, 8, '5.00')
+        self.product.refresh_from_db()
+        self.assertEqual(self.balance(), 2)
+        self.assertTrue(self.product.below_minimum)
+
+        self.move(types.PURCHASE, 3, '2.00')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.below_minimum)
+
+    def test_low_stock_list_and_digest(self):
+        types = StockMovement.MovementType
+        stocked = self.create_product("C2")
+        self.move(types.PURCHASE, 10, '2.00')
+        self.move(types.SALE, 8, '5.00')
+        self.move(types.PURCHASE, 1, '2.00', product=stocked)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('stock:low_stock_list'))
+        self.assertEqual([product.sku for product in response.context['products']], ['C1'])
+        self.assertEqual(response.context['products'][0].suggested_quantity, 3)
+
+        call_command('send_low_stock_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertIn("Produto C1 (C1): saldo 2, mínimo 5, repor 3", mail.outbox[0].body)
+        self.assertNotIn("C2", mail.outbox[0].body)
@@ -1,11 +1,20 @@
 # stock/urls.py
 from django.urls import path
-from .views import current_stock_list, PurchaseCreateView, SaleCreateView
+from .views import (
+    CurrentStockListView, LowStockListView, stock_at_date, export_ledger, fifo_valuation, movement_series,
+    PurchaseCreateView, SaleCreateView, StockMovementBulkView,
+)
 
 app_name = 'stock'
 
 urlpatterns = [
-    path('', current_stock_list, name='current_stock_list'),
+    path('', CurrentStockListView.as_view(), name='current_stock_list'),
+    path('low/', LowStockListView.as_view(), name='low_stock_list'),
     path('purchase/add/', PurchaseCreateView.as_view(), name='add_purchase'),
     path('sale/add/', SaleCreateView.as_view(), name='add_sale'),
+    path('export/', export_ledger, name='export_ledger'),
+    path('api/valuation/', fifo_valuation, name='fifo_valuation'),
+    path('api/series/', movement_series, name='movement_series'),
+    path('api/movements/bulk/', StockMovementBulkView.as_view(), name='movement_bulk'),
+    path('product/<uuid:product_id>/at/<int:year>/<int:month>/<int:day>/', stock_at_date, name='stock_at_date'),
 ]
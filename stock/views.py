@@ -1,34 +1,97 @@
 # stock/views.py
 
-from datetime import datetime
+import json
+import uuid
+from datetime import date
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse_lazy
-from django.db.models import Sum, Q
-from django.views.generic import CreateView
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Coalesce
+from django.views.generic import CreateView, ListView, View
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 
+from . import exports, services
 from .models import StockMovement
-from products.models import Product
+from app.mixins import CompanyFilteredMixin
+from core import cache as company_cache
+from products.models import Brand, Category, Product
 from suppliers.models import Supplier
 from customers.models import Customer
 from .forms import PurchaseForm, SaleForm
 
 
-def current_stock_list(request):
+class CurrentStockListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
     """
-    Exibe a lista de todos os produtos com seu saldo de estoque atual.
+    Exibe a lista dos produtos da empresa com saldo, valor ao custo médio e
+    data do último movimento, lidos do saldo materializado (StockBalance) em
+    uma única consulta por página.
     """
-    products = Product.objects.all().annotate(
-        stock_balance=Sum('stockmovement__quantity', filter=Q(stockmovement__movement_type='IN')) -
-                      Sum('stockmovement__quantity', filter=Q(stockmovement__movement_type='OUT'))
-    )
+    model = Product
+    template_name = 'stock/current_stock_list.html'
+    context_object_name = 'products'
+    paginate_by = 20
 
-    context = {
-        'products': products
+    # Mapeia o parâmetro `sort` da URL para a ordenação do queryset
+    sort_map = {
+        'name': 'name',
+        'balance': 'balance',
+        'value': 'stock_value',
+        'last_movement': 'last_movement_at',
     }
-    
-    return render(request, 'stock/current_stock_list.html', context)
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('brand', 'category').annotate(
+            balance=Coalesce('stock_balance__quantity', Value(0)),
+            last_movement_at=F('stock_balance__last_movement_at'),
+        ).annotate(
+            stock_value=ExpressionWrapper(
+                F('balance') * F('average_cost'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+        for param in ('category', 'brand'):
+            value = self.request.GET.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{f'{param}_id': uuid.UUID(value)})
+                except ValueError:
+                    return queryset.none()
+
+        sort = self.request.GET.get('sort', 'name')
+        field = self.sort_map.get(sort.lstrip('-'), 'name')
+        if sort.startswith('-'):
+            return queryset.order_by(F(field).desc(nulls_last=True), 'pk')
+        return queryset.order_by(F(field).asc(nulls_last=True), 'pk')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        company = self.request.company
+        context['categories'] = Category.objects.filter(company=company).order_by('name')
+        context['brands'] = Brand.objects.filter(company=company).order_by('name')
+        # Preserva filtros e ordenação nos links de paginação
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['querystring'] = params.urlencode()
+        return context
+
+
+class LowStockListView(LoginRequiredMixin, ListView):
+    """
+    Lista os produtos da empresa abaixo do estoque mínimo. Lê o indicador
+    Product.below_minimum, mantido a cada movimento, em vez de calcular o
+    saldo de todo o catálogo.
+    """
+    template_name = 'stock/low_stock_list.html'
+    context_object_name = 'products'
+    paginate_by = 20
+
+    def get_queryset(self):
+        return services.low_stock_products(self.request.company)
 
 
 # --- Views para Movimentações de Estoque (CBVs) ---
@@ -47,19 +110,21 @@ class PurchaseCreateView(LoginRequiredMixin, CreateView):
         context['form_title'] = 'Registrar Compra (Entrada)'
         return context
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['company'] = self.request.company
+        return kwargs
+
     def form_valid(self, form):
         form.instance.movement_type = 'IN'
-        form.instance.company = self.request.user.company
+        form.instance.company = self.request.company
         form.instance.user = self.request.user
         
-        response = super().form_valid(form)
-        
-        product = form.instance.product
-        product.stock_quantity += form.instance.quantity
-        product.save()
+        # O saldo do produto é atualizado pelo próprio StockMovement.save()
+        self.object = services.save_movement(form.instance)
 
         messages.success(self.request, "Compra registrada e estoque atualizado!")
-        return response
+        return HttpResponseRedirect(self.get_success_url())
 
 class SaleCreateView(LoginRequiredMixin, CreateView):
     """
@@ -75,60 +140,189 @@ class SaleCreateView(LoginRequiredMixin, CreateView):
         context['form_title'] = 'Registrar Venda (Saída)'
         return context
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['company'] = self.request.company
+        return kwargs
+
     def form_valid(self, form):
         form.instance.movement_type = 'OUT'
-        form.instance.company = self.request.user.company
+        form.instance.company = self.request.company
         form.instance.user = self.request.user
 
-        product = form.cleaned_data['product']
-        quantity = form.cleaned_data['quantity']
-        
-        if quantity > product.stock_quantity:
+        # A verificação de saldo e a baixa acontecem juntas no StockMovement.save(),
+        # evitando que vendas simultâneas consumam o mesmo estoque
+        try:
+            self.object = services.save_movement(form.instance)
+        except ValidationError:
             form.add_error('quantity', 'Quantidade insuficiente em estoque.')
             messages.error(self.request, "A quantidade de saída é maior que o estoque atual!")
             return self.form_invalid(form)
 
-        response = super().form_valid(form)
+        messages.success(self.request, "Venda registrada e estoque atualizado!")
+        return HttpResponseRedirect(self.get_success_url())
 
-        product.stock_quantity -= form.instance.quantity
-        product.save()
 
-        messages.success(self.request, "Venda registrada e estoque atualizado!")
-        return response
+# --- API para ingestão de movimentações em lote ---
+
+class StockMovementBulkView(LoginRequiredMixin, View):
+    """
+    Recebe um JSON {"movements": [...], "partial": false} e grava todos os
+    movimentos em uma única transação (ver stock.services.bulk_ingest_movements).
+    Retorna a quantidade criada e os erros por linha.
+    """
+    raise_exception = True
+    max_rows = 20000
+
+    def post(self, request, *args, **kwargs):
+        company = request.company
+        if not company:
+            return JsonResponse({'error': "Usuário não associado a uma empresa ativa."}, status=403)
+
+        try:
+            payload = json.loads(request.body)
+            rows = payload['movements']
+            if not isinstance(rows, list):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': "Envie um JSON com a lista 'movements'."}, status=400)
+
+        if len(rows) > self.max_rows:
+            return JsonResponse({'error': f"Máximo de {self.max_rows} movimentos por requisição."}, status=400)
+
+        created, errors = services.bulk_ingest_movements(
+            company, rows, user=request.user, partial=bool(payload.get('partial')),
+        )
+        status = 201 if created else (400 if errors else 200)
+        return JsonResponse({'created': created, 'errors': errors}, status=status)
 
 
 # --- View para consulta de estoque em data específica (FBC) ---
 
+@login_required
 def stock_at_date(request, product_id, year, month, day):
     """
-    Calcula o saldo de estoque de um produto em uma data específica.
+    Calcula o saldo de estoque de um produto em uma data específica,
+    a partir do fechamento mais próximo (ver stock.services.stock_at_date).
     """
-    product = get_object_or_404(Product, id=product_id)
-    
-    # Crie um objeto datetime para a data final do dia especificado
-    end_of_day = datetime(year, month, day, 23, 59, 59)
-    
-    # Filtra os movimentos de estoque que ocorreram até a data final
-    historical_movements = StockMovement.objects.filter(
-        product=product,
-        timestamp__lte=end_of_day
-    )
-    
-    # Agrega a quantidade de entradas e saídas
-    historical_stock = historical_movements.aggregate(
-        in_qty=Sum('quantity', filter=Q(movement_type='IN')),
-        out_qty=Sum('quantity', filter=Q(movement_type='OUT'))
-    )
-    
-    in_qty = historical_stock['in_qty'] or 0
-    out_qty = historical_stock['out_qty'] or 0
-    
-    stock_balance = in_qty - out_qty
-    
+    product = get_object_or_404(Product, id=product_id, company=request.company)
+
+    try:
+        target_date = date(year, month, day)
+    except ValueError:
+        raise Http404("Data inválida.")
+
     context = {
         'product': product,
-        'stock_balance': stock_balance,
-        'target_date': end_of_day.date(),
+        'stock_balance': services.stock_at_date(product, target_date),
+        'target_date': target_date,
     }
-    
+
     return render(request, 'stock/stock_at_date_detail.html', context)
+
+
+# --- Exportação do histórico de movimentações (FBC) ---
+
+@login_required
+def export_ledger(request):
+    """
+    Exporta em fluxo o histórico de movimentações da empresa do usuário
+    (CSV ou JSONL), com filtros opcionais de período, produto e tipo.
+    """
+    company = request.company
+    if not company:
+        raise Http404("Usuário não associado a uma empresa ativa.")
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return HttpResponseBadRequest("Formato inválido.")
+
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+        product = uuid.UUID(request.GET['product']) if request.GET.get('product') else None
+    except ValueError:
+        return HttpResponseBadRequest("Filtros inválidos.")
+
+    movement_type = request.GET.get('movement_type') or None
+    if movement_type and movement_type not in StockMovement.MovementType.values:
+        return HttpResponseBadRequest("Tipo de movimento inválido.")
+
+    rows = exports.ledger_rows(company, start=start, end=end, product=product, movement_type=movement_type)
+    response = StreamingHttpResponse(exports.stream_ledger(rows, fmt), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="movimentacoes.{fmt}"'
+    return response
+
+
+# --- Valorização do estoque pelo método FIFO (FBC) ---
+
+@login_required
+def fifo_valuation(request):
+    """
+    Retorna em JSON o valor do estoque da empresa pelas camadas FIFO, atual ou
+    ao final da data informada em `?date=AAAA-MM-DD`.
+    """
+    company = request.company
+    if not company:
+        raise Http404("Usuário não associado a uma empresa ativa.")
+
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else None
+    except ValueError:
+        return HttpResponseBadRequest("Data inválida.")
+
+    value = company_cache.get_or_set(
+        company, 'fifo_valuation', lambda: services.fifo_valuation(company, day), day, group=company_cache.STOCK,
+    )
+    return JsonResponse({'date': day.isoformat() if day else None, 'value': str(value)})
+
+
+# --- Séries temporais de movimentação (FBC) ---
+
+@login_required
+def movement_series(request):
+    """
+    Retorna em JSON a série de entradas e saídas da empresa agrupada por
+    `bucket` (day, week ou month), lida dos resumos diários. Filtros opcionais:
+    product, movement_type, start e end (AAAA-MM-DD).
+    """
+    company = request.company
+    if not company:
+        raise Http404("Usuário não associado a uma empresa ativa.")
+
+    bucket = request.GET.get('bucket', 'day')
+    if bucket not in services.SERIES_BUCKETS:
+        return HttpResponseBadRequest("Agrupamento inválido.")
+
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+        product = uuid.UUID(request.GET['product']) if request.GET.get('product') else None
+    except ValueError:
+        return HttpResponseBadRequest("Filtros inválidos.")
+
+    movement_type = request.GET.get('movement_type') or None
+    if movement_type and movement_type not in StockMovement.MovementType.values:
+        return HttpResponseBadRequest("Tipo de movimento inválido.")
+
+    def compute():
+        series = services.movement_series(
+            company, bucket=bucket, product=product, movement_type=movement_type, start=start, end=end,
+        )
+        return [
+            {
+                'period': row['period'].isoformat(),
+                'quantity_in': row['quantity_in'],
+                'quantity_out': row['quantity_out'],
+                'value_in': f"{row['value_in']:.2f}",
+                'value_out': f"{row['value_out']:.2f}",
+                'movements': row['movements'],
+            }
+            for row in series
+        ]
+
+    # Guardado no cache da empresa, invalidado a cada alteração no estoque
+    series = company_cache.get_or_set(
+        company, 'movement_series', compute, bucket, product, movement_type, start, end, group=company_cache.STOCK,
+    )
+    return JsonResponse({'bucket': bucket, 'series': series})
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:33
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_search(text):
+    # Cópia de suppliers.search.normalize_search no momento desta migração
+    decomposed = unicodedata.normalize('NFKD', (text or '').casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def populate_search_name(apps, schema_editor):
+    Supplier = apps.get_model('suppliers', 'Supplier')
+    suppliers = list(Supplier.objects.only('pk', 'name'))
+    for supplier in suppliers:
+        supplier.search_name = normalize_search(supplier.name)
+    Supplier.objects.bulk_update(suppliers, ['search_name'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0002_company_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['company', 'search_name', 'id'], name='supplier_search_name_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_user_company_version'),
+        ('suppliers', '0003_search_name'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='supplier',
+            name='supplier_company_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['company', 'name', 'id'], name='supplier_company_name_idx'),
+        ),
+    ]
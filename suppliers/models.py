@@ -1,7 +1,50 @@
 import uuid 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinLengthValidator
 from core.models import Company # Assumindo que a classe Company está em users.models
+from .search import normalize_search
+
+
+class SupplierQuerySet(models.QuerySet):
+    """
+    Gravações em lote não chamam save(): aqui o nome normalizado (search_name)
+    acompanha o nome em bulk_create, bulk_update e update.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for supplier in objs:
+            supplier.search_name = normalize_search(supplier.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'name' in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'search_name']
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'name' not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        for supplier in objs:
+            supplier.search_name = normalize_search(supplier.name)
+        return super().bulk_update(objs, [*fields, 'search_name'], *args, **kwargs)
+
+    def update(self, **kwargs):
+        name = kwargs.get('name')
+        if 'name' not in kwargs or isinstance(name, str):
+            if 'name' in kwargs:
+                kwargs['search_name'] = normalize_search(name)
+            return super().update(**kwargs)
+
+        # Nome calculado no banco (F, Concat...): normaliza em seguida, lendo o resultado
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            suppliers = list(self.model._base_manager.using(self.db).filter(pk__in=pks).only('pk', 'name'))
+            for supplier in suppliers:
+                supplier.search_name = normalize_search(supplier.name)
+            self.model._base_manager.using(self.db).bulk_update(suppliers, ['search_name'], batch_size=1000)
+        return updated
+
 
 class Supplier(models.Model):
     """
@@ -22,11 +65,29 @@ class Supplier(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado Em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado Em")
     active = models.BooleanField(default=True, verbose_name="Ativo", help_text="Indica se o fornecedor está ativo no sistema.")
+    # Nome sem acentos e em minúsculas, mantido por save() e pelas gravações em lote
+    # de SupplierQuerySet (ver suppliers.search)
+    search_name = models.CharField(max_length=255, editable=False, default='')
+
+    objects = SupplierQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Fornecedor"
         verbose_name_plural = "Fornecedores"
         ordering = ['name']
+        indexes = [
+            # Listagem paginada por cursor (nome, pk)
+            models.Index(fields=['company', 'name', 'id'], name='supplier_company_name_idx'),
+            # Busca por início do nome sem diferenciar maiúsculas e acentos (ver suppliers.search)
+            models.Index(fields=['company', 'search_name', 'id'], name='supplier_search_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
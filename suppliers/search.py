@@ -0,0 +1,31 @@
+# suppliers/search.py
+"""
+Busca de fornecedores pelo início do nome, sem diferenciar maiúsculas nem
+acentos. O nome é gravado também normalizado (Supplier.search_name: sem
+acentos e em minúsculas, ver normalize_search) e o termo digitado é
+normalizado da mesma forma em Python, pois o UPPER/LOWER do SQLite só trata
+letras ASCII. A comparação é um intervalo [prefixo, próximo prefixo), o que
+permite ao banco percorrer o índice supplier_search_name_idx
+(company, search_name, id) em vez de varrer a tabela, e já na ordem do índice.
+"""
+import unicodedata
+
+
+def normalize_search(text):
+    """Texto para busca: sem acentos e em minúsculas ("Água Fresca" -> "agua fresca")."""
+    decomposed = unicodedata.normalize('NFKD', (text or '').casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def search_suppliers(queryset, term):
+    """
+    Filtra o queryset pelo prefixo `term` do nome e ordena por nome. Sem
+    termo, apenas ordena.
+    """
+    queryset = queryset.order_by('search_name', 'pk')
+    prefix = normalize_search(term.strip() if term else '')
+    if not prefix:
+        return queryset
+    # Menor texto maior que todos os que começam com o prefixo
+    following = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return queryset.filter(search_name__gte=prefix, search_name__lt=following)
@@ -1,3 +1,61 @@
+from django.db.models import F, Value
+from django.db.models.functions import Concat
 from django.test import TestCase
 
-# Create your tests here.
+from core.models import Company
+from .models import Supplier
+from .search import search_suppliers
+
+
+class SupplierSearchNameTests(TestCase):
+    """
+    O nome normalizado usado na busca por prefixo acompanha o nome em todas
+    as formas de gravação, inclusive as em lote, que não chamam save().
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="ACME", cnpj="00.000.000/0001-00", address="-", city="-", state="SP")
+
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            company=self.company, name="Água Fresca", cnpj="11111111111111", phone="-", email="a@f.com", address="-",
+        )
+
+    def search(self, term):
+        return [supplier.name for supplier in search_suppliers(Supplier.objects.filter(company=self.company), term)]
+
+    def test_save_and_bulk_create(self):
+        Supplier.objects.bulk_create([
+            Supplier(company=self.company, name="Óleo Bom", cnpj="22222222222222", phone="-", email="o@f.com", address="-"),
+        ])
+
+        self.assertEqual(self.search("agua"), ["Água Fresca"])
+        self.assertEqual(self.search("OLEO"), ["Óleo Bom"])
+
+    def test_bulk_create_upsert_updates_search_name(self):
+        Supplier.objects.bulk_create(
+            [Supplier(company=self.company, name="Ímã Forte", cnpj="11111111111111", phone="-", email="a@f.com", address="-")],
+            update_conflicts=True, unique_fields=['cnpj'], update_fields=['name'],
+        )
+
+        self.assertEqual(self.search("ima"), ["Ímã Forte"])
+        self.assertEqual(self.search("agua"), [])
+
+    def test_update_with_a_value(self):
+        Supplier.objects.filter(pk=self.supplier.pk).update(name="Pão Quente")
+
+        self.assertEqual(self.search("pao"), ["Pão Quente"])
+        self.assertEqual(self.search("agua"), [])
+
+    def test_update_with_an_expression(self):
+        Supplier.objects.filter(pk=self.supplier.pk).update(name=Concat(Value("Ótica "), F('name')))
+
+        self.assertEqual(self.search("otica agua"), ["Ótica Água Fresca"])
+
+    def test_bulk_update(self):
+        self.supplier.name = "Café Forte"
+        Supplier.objects.bulk_update([self.supplier], ['name'])
+
+        self.assertEqual(self.search("cafe"), ["Café Forte"])
+        self.assertEqual(self.search("agua"), [])
@@ -6,9 +6,9 @@ from django.views.generic import DeleteView, DetailView, ListView, CreateView, U
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .models import Supplier
 from .forms import SupplierForm
-from app.mixins import CompanyFilteredMixin, CompanyAssignMixin
+from app.mixins import CompanyFilteredMixin, CompanyAssignMixin, KeysetPaginationMixin
 
-class SupplierListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
+class SupplierListView(LoginRequiredMixin, CompanyFilteredMixin, KeysetPaginationMixin, ListView):
     """
     View para listar todos os fornecedores associados à empresa do usuário logado.
     """
@@ -16,6 +16,7 @@ class SupplierListView(LoginRequiredMixin, CompanyFilteredMixin, ListView):
     template_name = 'suppliers/supplier_list.html'
     context_object_name = 'suppliers'
     paginate_by = 10
+    approximate_count = True
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -52,9 +53,8 @@ class SupplierCreateView(LoginRequiredMixin, CompanyFilteredMixin, CompanyAssign
 
     def form_valid(self, form):
         # Associa o fornecedor à empresa do usuário antes de salvar
-        company_user = self.request.user.company_links.filter(active=True).first()
-        if company_user:
-            form.instance.company = company_user.company
+        if self.request.company:
+            form.instance.company = self.request.company
         return super().form_valid(form)
 
 